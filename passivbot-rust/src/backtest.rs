@@ -8,17 +8,22 @@ use crate::entries::{
 };
 use crate::types::{
     Analysis, BacktestParams, Balance, BotParams, BotParamsPair, EMABands, Equities,
-    ExchangeParams, Fill, Order, OrderBook, OrderType, Position, Positions, StateParams,
-    TrailingPriceBundle,
+    ExchangeParams, Fill, Order, OrderBook, OrderType, Position, StateParams, TrailingPriceBundle,
 };
 use crate::utils::{
     calc_auto_unstuck_allowance, calc_new_psize_pprice, calc_pnl_long, calc_pnl_short,
     calc_pprice_diff_int, calc_wallet_exposure, cost_to_qty, hysteresis_rounding, qty_to_cost,
     round_, round_dn, round_up,
 };
+use memmap::{Mmap, MmapOptions};
 use ndarray::{s, Array1, Array2, Array3, Array4, ArrayView1, ArrayView3, Axis, Dim, ViewRepr};
 use std::cmp::Ordering;
-use std::collections::{HashMap, HashSet};
+use std::collections::HashMap;
+use std::fs::{self, File, OpenOptions};
+use std::io;
+use std::ops::{Index, IndexMut};
+use std::slice;
+use std::time::UNIX_EPOCH;
 
 #[derive(Clone, Default, Copy, Debug)]
 pub struct EmaAlphas {
@@ -70,10 +75,227 @@ impl EMAs {
     }
 }
 
-#[derive(Debug, Default)]
+/// Membership set over the dense coin indices `0..n_coins`, stored as a bitset.
+/// Iteration yields indices in ascending order, so no per-step key sorting is needed.
+#[derive(Debug, Default, Clone)]
+pub struct CoinSet {
+    words: Vec<u64>,
+    len: usize,
+}
+
+impl CoinSet {
+    pub fn new(n_coins: usize) -> Self {
+        CoinSet {
+            words: vec![0; (n_coins + 63) / 64],
+            len: 0,
+        }
+    }
+
+    /// Returns true if `idx` was not already a member.
+    #[inline]
+    pub fn insert(&mut self, idx: usize) -> bool {
+        let (word, bit) = (idx / 64, 1u64 << (idx % 64));
+        if word >= self.words.len() {
+            self.words.resize(word + 1, 0);
+        }
+        if self.words[word] & bit != 0 {
+            return false;
+        }
+        self.words[word] |= bit;
+        self.len += 1;
+        true
+    }
+
+    /// Returns true if `idx` was a member.
+    #[inline]
+    pub fn remove(&mut self, idx: usize) -> bool {
+        let (word, bit) = (idx / 64, 1u64 << (idx % 64));
+        match self.words.get_mut(word) {
+            Some(w) if *w & bit != 0 => {
+                *w &= !bit;
+                self.len -= 1;
+                true
+            }
+            _ => false,
+        }
+    }
+
+    #[inline]
+    pub fn contains(&self, idx: usize) -> bool {
+        self.words
+            .get(idx / 64)
+            .map_or(false, |w| w & (1u64 << (idx % 64)) != 0)
+    }
+
+    #[inline]
+    pub fn len(&self) -> usize {
+        self.len
+    }
+
+    #[inline]
+    pub fn is_empty(&self) -> bool {
+        self.len == 0
+    }
+
+    pub fn clear(&mut self) {
+        self.words.iter_mut().for_each(|w| *w = 0);
+        self.len = 0;
+    }
+
+    /// Replaces the members with those of `other`, reusing the allocation.
+    pub fn copy_from(&mut self, other: &CoinSet) {
+        self.words.clone_from(&other.words);
+        self.len = other.len;
+    }
+
+    /// Keeps only the members that are also in `other`.
+    pub fn intersect_with(&mut self, other: &CoinSet) {
+        let mut len = 0;
+        for (i, w) in self.words.iter_mut().enumerate() {
+            *w &= other.words.get(i).copied().unwrap_or(0);
+            len += w.count_ones() as usize;
+        }
+        self.len = len;
+    }
+
+    /// Members in ascending order.
+    pub fn iter(&self) -> impl Iterator<Item = usize> + '_ {
+        self.words.iter().enumerate().flat_map(|(i, &word)| {
+            let mut remaining = word;
+            std::iter::from_fn(move || {
+                if remaining == 0 {
+                    return None;
+                }
+                let bit = remaining.trailing_zeros() as usize;
+                remaining &= remaining - 1;
+                Some(i * 64 + bit)
+            })
+        })
+    }
+
+    /// Snapshot of the members, for loops that mutate the owner while iterating.
+    pub fn to_vec(&self) -> Vec<usize> {
+        let mut out = Vec::with_capacity(self.len);
+        out.extend(self.iter());
+        out
+    }
+}
+
+/// Per-coin values in a dense `Vec` indexed by coin, with a `CoinSet` tracking which
+/// coins currently hold a value. Absent slots keep stale values and are reset on insert.
+#[derive(Debug)]
+pub struct CoinMap<T> {
+    values: Vec<T>,
+    keys: CoinSet,
+}
+
+impl<T: Default> CoinMap<T> {
+    pub fn new(n_coins: usize) -> Self {
+        CoinMap {
+            values: (0..n_coins).map(|_| T::default()).collect(),
+            keys: CoinSet::new(n_coins),
+        }
+    }
+
+    #[inline]
+    pub fn contains_key(&self, idx: usize) -> bool {
+        self.keys.contains(idx)
+    }
+
+    #[inline]
+    pub fn get(&self, idx: usize) -> Option<&T> {
+        if self.keys.contains(idx) {
+            Some(&self.values[idx])
+        } else {
+            None
+        }
+    }
+
+    #[inline]
+    pub fn get_mut(&mut self, idx: usize) -> Option<&mut T> {
+        if self.keys.contains(idx) {
+            Some(&mut self.values[idx])
+        } else {
+            None
+        }
+    }
+
+    /// Value for `idx`, inserting `T::default()` first if absent.
+    #[inline]
+    pub fn get_or_insert_default(&mut self, idx: usize) -> &mut T {
+        if self.keys.insert(idx) {
+            self.values[idx] = T::default();
+        }
+        &mut self.values[idx]
+    }
+
+    #[inline]
+    pub fn remove(&mut self, idx: usize) {
+        self.keys.remove(idx);
+    }
+
+    /// Drops every entry whose coin is not in `keep`.
+    pub fn retain_keys(&mut self, keep: &CoinSet) {
+        self.keys.intersect_with(keep);
+    }
+
+    #[inline]
+    pub fn keys(&self) -> &CoinSet {
+        &self.keys
+    }
+
+    #[inline]
+    pub fn len(&self) -> usize {
+        self.keys.len()
+    }
+}
+
+impl<T> Index<usize> for CoinMap<T> {
+    type Output = T;
+
+    #[inline]
+    fn index(&self, idx: usize) -> &T {
+        assert!(self.keys.contains(idx), "no entry for coin index {}", idx);
+        &self.values[idx]
+    }
+}
+
+impl<T> IndexMut<usize> for CoinMap<T> {
+    #[inline]
+    fn index_mut(&mut self, idx: usize) -> &mut T {
+        assert!(self.keys.contains(idx), "no entry for coin index {}", idx);
+        &mut self.values[idx]
+    }
+}
+
+#[derive(Debug)]
+pub struct Positions {
+    pub long: CoinMap<Position>,
+    pub short: CoinMap<Position>,
+}
+
+impl Positions {
+    fn new(n_coins: usize) -> Self {
+        Positions {
+            long: CoinMap::new(n_coins),
+            short: CoinMap::new(n_coins),
+        }
+    }
+}
+
+#[derive(Debug)]
 pub struct OpenOrdersNew {
-    pub long: HashMap<usize, OpenOrderBundleNew>,
-    pub short: HashMap<usize, OpenOrderBundleNew>,
+    pub long: CoinMap<OpenOrderBundleNew>,
+    pub short: CoinMap<OpenOrderBundleNew>,
+}
+
+impl OpenOrdersNew {
+    fn new(n_coins: usize) -> Self {
+        OpenOrdersNew {
+            long: CoinMap::new(n_coins),
+            short: CoinMap::new(n_coins),
+        }
+    }
 }
 
 #[derive(Debug, Default)]
@@ -82,22 +304,40 @@ pub struct OpenOrderBundleNew {
     pub closes: Vec<Order>,
 }
 
-#[derive(Default, Debug)]
+#[derive(Debug)]
 pub struct Actives {
-    long: HashSet<usize>,
-    short: HashSet<usize>,
+    long: CoinSet,
+    short: CoinSet,
 }
 
-#[derive(Default, Debug)]
+impl Actives {
+    fn new(n_coins: usize) -> Self {
+        Actives {
+            long: CoinSet::new(n_coins),
+            short: CoinSet::new(n_coins),
+        }
+    }
+}
+
+#[derive(Debug)]
 pub struct IsStuck {
-    long: HashSet<usize>,
-    short: HashSet<usize>,
+    long: CoinSet,
+    short: CoinSet,
+}
+
+impl IsStuck {
+    fn new(n_coins: usize) -> Self {
+        IsStuck {
+            long: CoinSet::new(n_coins),
+            short: CoinSet::new(n_coins),
+        }
+    }
 }
 
 #[derive(Default, Debug)]
 pub struct TrailingPrices {
-    pub long: HashMap<usize, TrailingPriceBundle>,
-    pub short: HashMap<usize, TrailingPriceBundle>,
+    pub long: Vec<TrailingPriceBundle>,
+    pub short: Vec<TrailingPriceBundle>,
 }
 
 pub struct TrailingEnabled {
@@ -110,16 +350,370 @@ pub struct TradingEnabled {
     short: bool,
 }
 
-pub struct RollingVolumeSum {
-    long: Vec<f64>,
-    short: Vec<f64>,
-    prev_k_long: usize,
-    prev_k_short: usize,
+/// Identifies the HLCV data a set of `HlcvsIndexes` was built from: its shape, the byte
+/// offset of the data in its file, and that file's size and modification time.
+#[derive(Clone, Copy, Debug, PartialEq, Eq)]
+pub struct HlcvsStamp {
+    shape: (usize, usize, usize),
+    hlcvs_offset: u64,
+    file_len: u64,
+    mtime_ns: u64,
+}
+
+const INDEXES_MAGIC: &[u8; 8] = b"PBHIDX02";
+const INDEXES_HEADER_BYTES: usize = 64;
+
+impl HlcvsStamp {
+    pub fn of_file(
+        path: &str,
+        shape: (usize, usize, usize),
+        hlcvs_offset: usize,
+    ) -> io::Result<Self> {
+        let metadata = fs::metadata(path)?;
+        let mtime_ns = metadata
+            .modified()
+            .ok()
+            .and_then(|t| t.duration_since(UNIX_EPOCH).ok())
+            .map_or(0, |d| d.as_nanos() as u64);
+        Ok(HlcvsStamp {
+            shape,
+            hlcvs_offset: hlcvs_offset as u64,
+            file_len: metadata.len(),
+            mtime_ns,
+        })
+    }
+
+    fn to_header(&self) -> [u8; INDEXES_HEADER_BYTES] {
+        let fields = [
+            self.shape.0 as u64,
+            self.shape.1 as u64,
+            self.shape.2 as u64,
+            self.hlcvs_offset,
+            self.file_len,
+            self.mtime_ns,
+        ];
+        let mut header = [0u8; INDEXES_HEADER_BYTES];
+        header[..8].copy_from_slice(INDEXES_MAGIC);
+        for (i, field) in fields.iter().enumerate() {
+            header[8 + i * 8..16 + i * 8].copy_from_slice(&field.to_le_bytes());
+        }
+        header
+    }
+
+    fn from_header(header: &[u8]) -> Option<Self> {
+        if header.len() < INDEXES_HEADER_BYTES || &header[..8] != INDEXES_MAGIC {
+            return None;
+        }
+        let field =
+            |i: usize| u64::from_le_bytes(header[8 + i * 8..16 + i * 8].try_into().unwrap());
+        Some(HlcvsStamp {
+            shape: (field(0) as usize, field(1) as usize, field(2) as usize),
+            hlcvs_offset: field(3),
+            file_len: field(4),
+            mtime_ns: field(5),
+        })
+    }
+}
+
+/// Per-coin lookup tables derived from the HLCV data alone. They do not depend on
+/// bot parameters, so a single instance can be shared by every backtest run on the
+/// same data (e.g. across optimizer evaluations).
+///
+/// The tables are stored as one f64 buffer: prefix sums of candle noisiness
+/// `(high - low) / close` and of volume, each `(n_timesteps + 1) x n_coins` with row `k`
+/// holding the sum over timesteps `0..k`, then the first and last valid candle per coin
+/// (`n_timesteps` if the coin never became valid), then per coin the sums of absolute
+/// noisiness and volume and the number of leading prefix sum rows that are exact, which
+/// bound the rounding error of window sums taken from the prefix sums (see
+/// `window_sum_error`). The buffer is either owned or mapped
+/// read-only from a file written by `HlcvsIndexes::write_file`, which lets processes
+/// backtesting the same data share one copy through the page cache.
+pub struct HlcvsIndexes {
+    n_timesteps: usize,
+    n_coins: usize,
+    data: IndexesData,
+}
+
+enum IndexesData {
+    Owned(Vec<f64>),
+    Mapped(Mmap),
+}
+
+impl HlcvsIndexes {
+    pub fn new(hlcvs: &ArrayView3<f64>) -> Self {
+        let n_timesteps = hlcvs.shape()[0];
+        let n_coins = hlcvs.shape()[1];
+        let mut words = vec![0.0; Self::n_words(n_timesteps, n_coins)];
+        Self::fill(hlcvs, &mut words);
+        HlcvsIndexes {
+            n_timesteps,
+            n_coins,
+            data: IndexesData::Owned(words),
+        }
+    }
+
+    /// Builds the indexes of `hlcvs` into the file `path` for `open_file`. The file is
+    /// written under a temporary name and renamed into place, so readers never see a
+    /// partial file.
+    pub fn write_file(hlcvs: &ArrayView3<f64>, stamp: &HlcvsStamp, path: &str) -> io::Result<()> {
+        let n_words = Self::n_words(hlcvs.shape()[0], hlcvs.shape()[1]);
+        let tmp_path = format!("{}.tmp{}", path, std::process::id());
+        let file = OpenOptions::new()
+            .read(true)
+            .write(true)
+            .create(true)
+            .truncate(true)
+            .open(&tmp_path)?;
+        file.set_len((INDEXES_HEADER_BYTES + n_words * 8) as u64)?;
+        let mut mmap = unsafe { MmapOptions::new().map_mut(&file)? };
+        mmap[..INDEXES_HEADER_BYTES].copy_from_slice(&stamp.to_header());
+        // the map is page aligned and the header a multiple of 8 bytes long
+        let words = unsafe {
+            slice::from_raw_parts_mut(
+                mmap[INDEXES_HEADER_BYTES..].as_mut_ptr() as *mut f64,
+                n_words,
+            )
+        };
+        Self::fill(hlcvs, words);
+        mmap.flush()?;
+        drop(mmap);
+        fs::rename(&tmp_path, path)
+    }
+
+    /// Maps indexes written by `write_file` read-only. Fails if they were built from
+    /// other data than `stamp` describes.
+    pub fn open_file(path: &str, stamp: &HlcvsStamp) -> io::Result<Self> {
+        let file = File::open(path)?;
+        let mmap = unsafe { MmapOptions::new().map(&file)? };
+        let (n_timesteps, n_coins) = (stamp.shape.0, stamp.shape.1);
+        let expected_len = INDEXES_HEADER_BYTES + Self::n_words(n_timesteps, n_coins) * 8;
+        if mmap.len() != expected_len || HlcvsStamp::from_header(&mmap[..]) != Some(*stamp) {
+            return Err(io::Error::new(
+                io::ErrorKind::InvalidData,
+                format!("{} holds indexes of other hlcvs data", path),
+            ));
+        }
+        Ok(HlcvsIndexes {
+            n_timesteps,
+            n_coins,
+            data: IndexesData::Mapped(mmap),
+        })
+    }
+
+    /// True if `path` holds indexes of the data described by `stamp`.
+    pub fn file_matches(path: &str, stamp: &HlcvsStamp) -> bool {
+        Self::open_file(path, stamp).is_ok()
+    }
+
+    pub fn is_mapped(&self) -> bool {
+        matches!(self.data, IndexesData::Mapped(_))
+    }
+
+    fn n_words(n_timesteps: usize, n_coins: usize) -> usize {
+        2 * (n_timesteps + 1) * n_coins + 6 * n_coins
+    }
+
+    /// Per-coin value `idx` of the per-coin array at position `array` after the tables.
+    fn per_coin(&self, array: usize, idx: usize) -> f64 {
+        self.words()[2 * (self.n_timesteps + 1) * self.n_coins + array * self.n_coins + idx]
+    }
+
+    fn fill(hlcvs: &ArrayView3<f64>, words: &mut [f64]) {
+        let n_timesteps = hlcvs.shape()[0];
+        let n_coins = hlcvs.shape()[1];
+        let table_len = (n_timesteps + 1) * n_coins;
+        let (noisiness_cumsum, rest) = words.split_at_mut(table_len);
+        let (volume_cumsum, rest) = rest.split_at_mut(table_len);
+        let (first_valid, rest) = rest.split_at_mut(n_coins);
+        let (last_valid, rest) = rest.split_at_mut(n_coins);
+        let (noisiness_abs_total, rest) = rest.split_at_mut(n_coins);
+        let (volume_abs_total, rest) = rest.split_at_mut(n_coins);
+        let (noisiness_exact_until, volume_exact_until) = rest.split_at_mut(n_coins);
+        noisiness_abs_total.fill(0.0);
+        volume_abs_total.fill(0.0);
+        // sums of integers stay exact while below 2^53; true e.g. before a coin is listed,
+        // where noisiness is 0 and volume -1
+        noisiness_exact_until.fill(0.0);
+        volume_exact_until.fill(0.0);
+        let is_exact = |x: f64, abs_total: f64| x.fract() == 0.0 && abs_total < 9007199254740992.0;
+        noisiness_cumsum[..n_coins].fill(0.0);
+        volume_cumsum[..n_coins].fill(0.0);
+        for k in 0..n_timesteps {
+            let (prev, next) = (k * n_coins, (k + 1) * n_coins);
+            for idx in 0..n_coins {
+                let noisiness =
+                    (hlcvs[[k, idx, HIGH]] - hlcvs[[k, idx, LOW]]) / hlcvs[[k, idx, CLOSE]];
+                let volume = hlcvs[[k, idx, VOLUME]];
+                noisiness_cumsum[next + idx] = noisiness_cumsum[prev + idx] + noisiness;
+                volume_cumsum[next + idx] = volume_cumsum[prev + idx] + volume;
+                noisiness_abs_total[idx] += noisiness.abs();
+                volume_abs_total[idx] += volume.abs();
+                if noisiness_exact_until[idx] == k as f64
+                    && is_exact(noisiness, noisiness_abs_total[idx])
+                {
+                    noisiness_exact_until[idx] = (k + 1) as f64;
+                }
+                if volume_exact_until[idx] == k as f64 && is_exact(volume, volume_abs_total[idx]) {
+                    volume_exact_until[idx] = (k + 1) as f64;
+                }
+            }
+        }
+        let (firsts, lasts) = find_valid_timestamp_bounds(hlcvs);
+        for idx in 0..n_coins {
+            first_valid[idx] = firsts[idx] as f64;
+            last_valid[idx] = lasts[idx] as f64;
+        }
+    }
+
+    fn words(&self) -> &[f64] {
+        match &self.data {
+            IndexesData::Owned(words) => words,
+            IndexesData::Mapped(mmap) => unsafe {
+                slice::from_raw_parts(
+                    mmap[INDEXES_HEADER_BYTES..].as_ptr() as *const f64,
+                    Self::n_words(self.n_timesteps, self.n_coins),
+                )
+            },
+        }
+    }
+
+    /// Noisiness of coin `idx` summed over timesteps `start..end`, and a bound on its
+    /// difference from summing the candles directly.
+    pub fn noisiness_sum(&self, start: usize, end: usize, idx: usize) -> (f64, f64) {
+        let words = self.words();
+        (
+            words[end * self.n_coins + idx] - words[start * self.n_coins + idx],
+            window_sum_error(end, self.per_coin(2, idx), self.per_coin(4, idx)),
+        )
+    }
+
+    /// Volume of coin `idx` summed over timesteps `start..end`, and a bound on its
+    /// difference from summing the candles directly.
+    pub fn volume_sum(&self, start: usize, end: usize, idx: usize) -> (f64, f64) {
+        let words = &self.words()[(self.n_timesteps + 1) * self.n_coins..];
+        (
+            words[end * self.n_coins + idx] - words[start * self.n_coins + idx],
+            window_sum_error(end, self.per_coin(3, idx), self.per_coin(5, idx)),
+        )
+    }
+
+    pub fn first_valid_timestamp(&self, idx: usize) -> usize {
+        self.per_coin(0, idx) as usize
+    }
+
+    pub fn last_valid_timestamp(&self, idx: usize) -> usize {
+        self.per_coin(1, idx) as usize
+    }
+}
+
+/// Bound on the difference between a window sum over `start..end` taken as a difference
+/// of prefix sums and the same window summed directly, for a coin whose terms have
+/// absolute sum `abs_total` and whose first `exact_until` prefix sum rows are exact.
+/// Within those rows both sums are exact. Otherwise both are sums of at most `end` terms,
+/// so each is within `end * EPSILON / 2 * abs_total` of the exact sum (plus one rounding
+/// for the difference); the bound doubles that for margin. Infinite if any term is not
+/// finite.
+fn window_sum_error(end: usize, abs_total: f64, exact_until: f64) -> f64 {
+    if end as f64 <= exact_until {
+        return 0.0;
+    }
+    let err = 4.0 * (end + 1) as f64 * f64::EPSILON * abs_total;
+    if err.is_finite() {
+        err
+    } else {
+        f64::INFINITY
+    }
+}
+
+/// Scratch space of `sort_window_sums_desc`.
+#[derive(Default)]
+struct WindowSortScratch {
+    exact: Vec<bool>,
+    resolve: Vec<bool>,
+    order: Vec<usize>,
+}
+
+/// Buffers of the forager rankings, which run every rebalance minute, kept on
+/// `Backtest` so the rankings do not allocate.
+#[derive(Default)]
+struct WindowSumBuffers {
+    noisinesses: Vec<(f64, usize)>,
+    errs: Vec<f64>,
+    scratch: WindowSortScratch,
+}
+
+/// Sorts `sums`, pairs of (window sum, coin index), by descending sum in exactly the
+/// order the direct window sums `direct_sum(idx)` give. `errs[i]` bounds how far
+/// `sums[i].0` may be from the direct sum. Coins whose intervals `sum +- err` overlap
+/// another coin's get their direct sum before sorting; all other sums are separated by
+/// more than their error, so every comparison, and thus the sort, has the same outcome
+/// as with direct sums alone.
+fn sort_window_sums_desc(
+    sums: &mut [(f64, usize)],
+    errs: &[f64],
+    scratch: &mut WindowSortScratch,
+    direct_sum: impl Fn(usize) -> f64,
+) {
+    let WindowSortScratch {
+        exact,
+        resolve,
+        order,
+    } = scratch;
+    exact.clear();
+    exact.resize(sums.len(), false);
+    for (i, &err) in errs.iter().enumerate() {
+        if !err.is_finite() || !sums[i].0.is_finite() {
+            sums[i].0 = direct_sum(sums[i].1);
+            exact[i] = true;
+        }
+    }
+    let bounds = |i: usize| -> (f64, f64) {
+        let err = if exact[i] { 0.0 } else { errs[i] };
+        (sums[i].0 - err, sums[i].0 + err)
+    };
+    // NaN direct sums compare equal to everything either way
+    order.clear();
+    order.extend((0..sums.len()).filter(|&i| !sums[i].0.is_nan()));
+    order.sort_unstable_by(|&a, &b| bounds(a).0.total_cmp(&bounds(b).0));
+    resolve.clear();
+    resolve.resize(sums.len(), false);
+    let mut cluster_start = 0;
+    let mut cluster_hi = f64::NEG_INFINITY;
+    for pos in 0..order.len() {
+        let (lo, hi) = bounds(order[pos]);
+        if pos > 0 && lo <= cluster_hi {
+            cluster_hi = cluster_hi.max(hi);
+        } else {
+            cluster_start = pos;
+            cluster_hi = hi;
+        }
+        if pos > cluster_start {
+            for &i in &order[cluster_start..=pos] {
+                resolve[i] = true;
+            }
+        }
+    }
+    for i in 0..sums.len() {
+        if resolve[i] && !exact[i] {
+            sums[i].0 = direct_sum(sums[i].1);
+        }
+    }
+    sums.sort_unstable_by(|a, b| b.0.partial_cmp(&a.0).unwrap_or(Ordering::Equal));
+}
+
+/// Noisiness of coin `idx` summed over timesteps `start..end` candle by candle.
+fn direct_noisiness_sum(hlcvs: &ArrayView3<f64>, start: usize, end: usize, idx: usize) -> f64 {
+    hlcvs
+        .slice(s![start..end, idx, ..])
+        .axis_iter(Axis(0))
+        .map(|row| (row[HIGH] - row[LOW]) / row[CLOSE])
+        .sum()
 }
 
 pub struct Backtest<'a> {
     hlcvs: &'a ArrayView3<'a, f64>,
     btc_usd_prices: &'a ArrayView1<'a, f64>, // Change to ArrayView1 (1D view)
+    indexes: &'a HlcvsIndexes,
     bot_params_pair: BotParamsPair,
     exchange_params_list: Vec<ExchangeParams>,
     backtest_params: BacktestParams,
@@ -138,20 +732,30 @@ pub struct Backtest<'a> {
     trading_enabled: TradingEnabled,
     trailing_enabled: TrailingEnabled,
     equities: Equities,
-    last_valid_timestamps: HashMap<usize, usize>,
-    first_valid_timestamps: HashMap<usize, usize>,
-    did_fill_long: HashSet<usize>,
-    did_fill_short: HashSet<usize>,
+    /// Minute from which a delisted coin is force-closed; `usize::MAX` if never.
+    delist_timestamps: Vec<usize>,
+    did_fill_long: CoinSet,
+    did_fill_short: CoinSet,
     n_eligible_long: usize,
     n_eligible_short: usize,
-    rolling_volume_sum: RollingVolumeSum,
     volume_indices_buffer: Option<Vec<(f64, usize)>>,
+    window_sum_buffers: WindowSumBuffers,
+    streaming_analysis: Option<StreamingAnalysis>,
+    keep_outputs: bool, // store fills and sampled equities besides the analyses
+}
+
+/// Analysis accumulators fed every fill and every minute's equity during the run, so
+/// the analyses are exact regardless of how many equities are stored.
+struct StreamingAnalysis {
+    usd: AnalysisAccumulator,
+    btc: AnalysisAccumulator,
 }
 
 impl<'a> Backtest<'a> {
     pub fn new(
         hlcvs: &'a ArrayView3<'a, f64>,
         btc_usd_prices: &'a ArrayView1<'a, f64>, // Updated parameter type
+        indexes: &'a HlcvsIndexes,
         bot_params_pair: BotParamsPair,
         exchange_params_list: Vec<ExchangeParams>,
         backtest_params: &BacktestParams,
@@ -188,6 +792,15 @@ impl<'a> Backtest<'a> {
         let mut equities = Equities::default();
         equities.usd.push(backtest_params.starting_balance);
         equities.btc.push(balance.btc); // Initial BTC equity
+        let n_equities = n_timesteps.saturating_sub(1).max(1);
+        let mut streaming_analysis = StreamingAnalysis {
+            usd: AnalysisAccumulator::new(n_equities),
+            btc: AnalysisAccumulator::new(n_equities),
+        };
+        streaming_analysis
+            .usd
+            .on_equity(backtest_params.starting_balance);
+        streaming_analysis.btc.on_equity(balance.btc);
         let mut bot_params_pair_cloned = bot_params_pair.clone();
         bot_params_pair_cloned.long.n_positions = n_coins.min(bot_params_pair.long.n_positions);
         bot_params_pair_cloned.short.n_positions = n_coins.min(bot_params_pair.short.n_positions);
@@ -201,6 +814,7 @@ impl<'a> Backtest<'a> {
         Backtest {
             hlcvs,
             btc_usd_prices,
+            indexes,
             bot_params_pair: bot_params_pair_cloned,
             exchange_params_list,
             backtest_params: backtest_params.clone(),
@@ -208,14 +822,17 @@ impl<'a> Backtest<'a> {
             n_coins,
             ema_alphas: calc_ema_alphas(&bot_params_pair),
             emas: initial_emas,
-            positions: Positions::default(),
-            open_orders: OpenOrdersNew::default(),
-            trailing_prices: TrailingPrices::default(),
-            actives: Actives::default(),
+            positions: Positions::new(n_coins),
+            open_orders: OpenOrdersNew::new(n_coins),
+            trailing_prices: TrailingPrices {
+                long: vec![TrailingPriceBundle::default(); n_coins],
+                short: vec![TrailingPriceBundle::default(); n_coins],
+            },
+            actives: Actives::new(n_coins),
             pnl_cumsum_running: 0.0,
             pnl_cumsum_max: 0.0,
             fills: Vec::new(),
-            is_stuck: IsStuck::default(),
+            is_stuck: IsStuck::new(n_coins),
             trading_enabled: TradingEnabled {
                 long: bot_params_pair.long.wallet_exposure_limit != 0.0
                     && bot_params_pair.long.n_positions > 0,
@@ -229,19 +846,19 @@ impl<'a> Backtest<'a> {
                     || bot_params_pair.short.entry_trailing_grid_ratio != 0.0,
             },
             equities: equities,
-            last_valid_timestamps: HashMap::new(),
-            first_valid_timestamps: HashMap::new(),
-            did_fill_long: HashSet::new(),
-            did_fill_short: HashSet::new(),
+            delist_timestamps: vec![usize::MAX; n_coins],
+            did_fill_long: CoinSet::new(n_coins),
+            did_fill_short: CoinSet::new(n_coins),
             n_eligible_long,
             n_eligible_short,
-            rolling_volume_sum: RollingVolumeSum {
-                long: vec![0.0; n_coins],
-                short: vec![0.0; n_coins],
-                prev_k_long: 0,
-                prev_k_short: 0,
-            },
             volume_indices_buffer: Some(vec![(0.0, 0); n_coins]), // Initialize here
+            window_sum_buffers: WindowSumBuffers {
+                noisinesses: Vec::with_capacity(n_coins),
+                errs: Vec::with_capacity(n_coins),
+                scratch: WindowSortScratch::default(),
+            },
+            streaming_analysis: Some(streaming_analysis),
+            keep_outputs: true,
         }
     }
 
@@ -271,40 +888,22 @@ impl<'a> Backtest<'a> {
             SHORT => &self.bot_params_pair.short,
             _ => panic!("Invalid pside"),
         };
-        let window = bot_params.filter_volume_rolling_window;
-        let start_k = k.saturating_sub(window);
-
-        let (rolling_volume_sum, prev_k) = match pside {
-            LONG => (
-                &mut self.rolling_volume_sum.long,
-                &mut self.rolling_volume_sum.prev_k_long,
-            ),
-            SHORT => (
-                &mut self.rolling_volume_sum.short,
-                &mut self.rolling_volume_sum.prev_k_short,
-            ),
-            _ => panic!("Invalid pside"),
-        };
+        let start_k = k.saturating_sub(bot_params.filter_volume_rolling_window);
 
+        // window sum over start_k..k as a difference of prefix sums: O(1) per coin; sums
+        // too close to tell apart are taken directly, so the order is exact
         let volume_indices = self.volume_indices_buffer.as_mut().unwrap();
-
-        if k > window && k - *prev_k < window {
-            let safe_start = (*prev_k).saturating_sub(window);
-            for idx in 0..self.n_coins {
-                rolling_volume_sum[idx] -=
-                    self.hlcvs.slice(s![safe_start..start_k, idx, VOLUME]).sum();
-                rolling_volume_sum[idx] += self.hlcvs.slice(s![*prev_k..k, idx, VOLUME]).sum();
-                volume_indices[idx] = (rolling_volume_sum[idx], idx);
-            }
-        } else {
-            for idx in 0..self.n_coins {
-                rolling_volume_sum[idx] = self.hlcvs.slice(s![start_k..k, idx, VOLUME]).sum();
-                volume_indices[idx] = (rolling_volume_sum[idx], idx);
-            }
+        let WindowSumBuffers { errs, scratch, .. } = &mut self.window_sum_buffers;
+        errs.clear();
+        for idx in 0..self.n_coins {
+            let (volume_sum, err) = self.indexes.volume_sum(start_k, k, idx);
+            volume_indices[idx] = (volume_sum, idx);
+            errs.push(err);
         }
-        *prev_k = k;
-
-        volume_indices.sort_unstable_by(|a, b| b.0.partial_cmp(&a.0).unwrap_or(Ordering::Equal));
+        let hlcvs = self.hlcvs;
+        sort_window_sums_desc(volume_indices, errs, scratch, |idx| {
+            hlcvs.slice(s![start_k..k, idx, VOLUME]).sum()
+        });
 
         let n_eligible = match pside {
             LONG => self.n_eligible_long,
@@ -318,7 +917,7 @@ impl<'a> Backtest<'a> {
             .collect()
     }
 
-    fn rank_by_noisiness(&self, k: usize, candidates: &[usize], pside: usize) -> Vec<usize> {
+    fn rank_by_noisiness(&mut self, k: usize, candidates: &[usize], pside: usize) -> Vec<usize> {
         let bot_params = match pside {
             LONG => &self.bot_params_pair.long,
             SHORT => &self.bot_params_pair.short,
@@ -326,41 +925,72 @@ impl<'a> Backtest<'a> {
         };
         let start_k = k.saturating_sub(bot_params.filter_noisiness_rolling_window);
 
-        let mut noisinesses: Vec<(f64, usize)> = candidates
-            .iter()
-            .map(|&idx| {
-                let noisiness: f64 = self
-                    .hlcvs
-                    .slice(s![start_k..k, idx, ..])
-                    .axis_iter(Axis(0))
-                    .map(|row| (row[HIGH] - row[LOW]) / row[CLOSE])
-                    .sum();
-                (noisiness, idx)
-            })
-            .collect();
+        // window sum over start_k..k as a difference of prefix sums: O(1) per coin; sums
+        // too close to tell apart are taken directly, so the order is exact
+        let WindowSumBuffers {
+            noisinesses,
+            errs,
+            scratch,
+        } = &mut self.window_sum_buffers;
+        noisinesses.clear();
+        errs.clear();
+        for &idx in candidates {
+            let (noisiness, err) = self.indexes.noisiness_sum(start_k, k, idx);
+            noisinesses.push((noisiness, idx));
+            errs.push(err);
+        }
+        let hlcvs = self.hlcvs;
+        sort_window_sums_desc(noisinesses, errs, scratch, |idx| {
+            direct_noisiness_sum(hlcvs, start_k, k, idx)
+        });
+        noisinesses.iter().map(|&(_, idx)| idx).collect()
+    }
 
-        noisinesses.sort_unstable_by(|a, b| b.0.partial_cmp(&a.0).unwrap_or(Ordering::Equal));
-        noisinesses.into_iter().map(|(_, idx)| idx).collect()
+    /// Runs the backtest. Returns the fills, the equities of every
+    /// `equity_resolution_minutes`th minute, and (analysis_usd, analysis_btc), which
+    /// are computed from every minute's equity and identical when BTC collateral is
+    /// not used.
+    pub fn run(&mut self) -> (Vec<Fill>, Equities, Analysis, Analysis) {
+        self.simulate();
+        let (analysis_usd, analysis_btc) = self.finalize_analyses();
+        (
+            std::mem::take(&mut self.fills),
+            std::mem::take(&mut self.equities),
+            analysis_usd,
+            analysis_btc,
+        )
     }
 
-    pub fn run(&mut self) -> (Vec<Fill>, Equities) {
-        let n_timesteps = self.hlcvs.shape()[0];
-        for idx in 0..self.n_coins {
-            self.trailing_prices
-                .long
-                .insert(idx, TrailingPriceBundle::default());
-            self.trailing_prices
-                .short
-                .insert(idx, TrailingPriceBundle::default());
+    /// Runs the backtest without storing fills or equities; returns only
+    /// (analysis_usd, analysis_btc).
+    pub fn run_analysis_only(&mut self) -> (Analysis, Analysis) {
+        self.keep_outputs = false;
+        self.equities = Equities::default();
+        self.simulate();
+        self.finalize_analyses()
+    }
+
+    fn finalize_analyses(&mut self) -> (Analysis, Analysis) {
+        let streaming = self
+            .streaming_analysis
+            .take()
+            .expect("backtest can only be run once");
+        let analysis_usd = streaming.usd.finalize();
+        if !self.balance.use_btc_collateral {
+            return (analysis_usd.clone(), analysis_usd);
         }
+        (analysis_usd, streaming.btc.finalize())
+    }
 
-        // --- find first & last valid candle for every coin (binary-search) ---
-        let (first_valid, last_valid) = find_valid_timestamp_bounds(&self.hlcvs);
+    fn simulate(&mut self) {
+        let n_timesteps = self.hlcvs.shape()[0];
+
+        // --- last valid candle for every coin (precomputed in indexes) ---
         for idx in 0..self.n_coins {
-            self.first_valid_timestamps.insert(idx, first_valid[idx]);
-            if n_timesteps - last_valid[idx] > 1400 {
-                // add only if delisted more than one day before last timestamp
-                self.last_valid_timestamps.insert(idx, last_valid[idx]); // keep same name for callers
+            let last_valid = self.indexes.last_valid_timestamp(idx);
+            if n_timesteps - last_valid > 1400 {
+                // set only if delisted more than one day before last timestamp
+                self.delist_timestamps[idx] = last_valid;
             }
         }
 
@@ -391,7 +1021,18 @@ impl<'a> Backtest<'a> {
             }
             self.update_equities(k);
         }
-        (self.fills.clone(), self.equities.clone())
+    }
+
+    fn record_fill(&mut self, fill: Fill) {
+        if let Some(streaming) = self.streaming_analysis.as_mut() {
+            streaming.usd.on_fill(&fill);
+            if self.balance.use_btc_collateral {
+                streaming.btc.on_fill(&to_btc_fill(&fill));
+            }
+        }
+        if self.keep_outputs {
+            self.fills.push(fill);
+        }
     }
 
     fn create_state_params(&self, k: usize, idx: usize, pside: usize) -> StateParams {
@@ -408,8 +1049,8 @@ impl<'a> Backtest<'a> {
 
     fn get_position(&self, idx: usize, pside: usize) -> Position {
         match pside {
-            LONG => self.positions.long.get(&idx).cloned().unwrap_or_default(),
-            SHORT => self.positions.short.get(&idx).cloned().unwrap_or_default(),
+            LONG => self.positions.long.get(idx).cloned().unwrap_or_default(),
+            SHORT => self.positions.short.get(idx).cloned().unwrap_or_default(),
             _ => panic!("Invalid pside"),
         }
     }
@@ -456,10 +1097,8 @@ impl<'a> Backtest<'a> {
         let mut equity_btc = self.balance.btc_total;
 
         // Add the unrealized PNL of all positions
-        let mut long_keys: Vec<usize> = self.positions.long.keys().cloned().collect();
-        long_keys.sort();
-        for idx in long_keys {
-            let position = &self.positions.long[&idx];
+        for idx in self.positions.long.keys().iter() {
+            let position = &self.positions.long[idx];
             let current_price = self.hlcvs[[k, idx, CLOSE]];
             let upnl = calc_pnl_long(
                 position.price,
@@ -471,10 +1110,8 @@ impl<'a> Backtest<'a> {
             equity_btc += upnl / self.btc_usd_prices[k];
         }
 
-        let mut short_keys: Vec<usize> = self.positions.short.keys().cloned().collect();
-        short_keys.sort();
-        for idx in short_keys {
-            let position = &self.positions.short[&idx];
+        for idx in self.positions.short.keys().iter() {
+            let position = &self.positions.short[idx];
             let current_price = self.hlcvs[[k, idx, CLOSE]];
             let upnl = calc_pnl_short(
                 position.price,
@@ -486,45 +1123,49 @@ impl<'a> Backtest<'a> {
             equity_btc += upnl / self.btc_usd_prices[k];
         }
 
-        // Finally push the results into the Equities struct
-        self.equities.usd.push(equity_usd);
-        self.equities.btc.push(equity_btc);
+        // Finally feed the analyses, and store the equity if this minute is sampled
+        if let Some(streaming) = self.streaming_analysis.as_mut() {
+            streaming.usd.on_equity(equity_usd);
+            if self.balance.use_btc_collateral {
+                streaming.btc.on_equity(equity_btc);
+            }
+        }
+        if self.keep_outputs && k % self.backtest_params.equity_resolution_minutes.max(1) == 0 {
+            self.equities.usd.push(equity_usd);
+            self.equities.btc.push(equity_btc);
+        }
     }
 
     fn update_actives(&mut self, k: usize, pside: usize) -> Vec<usize> {
         // Calculate all the information we need before borrowing
-        let (positions, n_positions) = match pside {
-            LONG => (&self.positions.long, self.bot_params_pair.long.n_positions),
+        let (n_current_positions, n_positions) = match pside {
+            LONG => (
+                self.positions.long.len(),
+                self.bot_params_pair.long.n_positions,
+            ),
             SHORT => (
-                &self.positions.short,
+                self.positions.short.len(),
                 self.bot_params_pair.short.n_positions,
             ),
             _ => panic!("Invalid pside"),
         };
 
-        // Sort positions to ensure stable iteration
-        let mut current_positions: Vec<usize> = positions.keys().cloned().collect();
-        current_positions.sort();
         let mut preferred_coins = Vec::new();
 
         // Only calculate preferred coins if there are open slots
-        if current_positions.len() < n_positions {
+        if n_current_positions < n_positions {
             preferred_coins = self.calc_preferred_coins(k, pside);
         }
 
         // Now we can mutably borrow self.actives
-        let actives = match pside {
-            LONG => &mut self.actives.long,
-            SHORT => &mut self.actives.short,
+        let (actives, positions) = match pside {
+            LONG => (&mut self.actives.long, &self.positions.long),
+            SHORT => (&mut self.actives.short, &self.positions.short),
             _ => unreachable!(),
         };
 
-        actives.clear();
-
-        // Add all markets with existing positions
-        for &market_idx in &current_positions {
-            actives.insert(market_idx);
-        }
+        // Start from all markets with existing positions
+        actives.copy_from(positions.keys());
 
         let mut actives_without_pos = Vec::new();
 
@@ -546,24 +1187,21 @@ impl<'a> Backtest<'a> {
         self.did_fill_long.clear();
         self.did_fill_short.clear();
         if self.trading_enabled.long {
-            let mut open_orders_keys_long: Vec<usize> =
-                self.open_orders.long.keys().cloned().collect();
-            open_orders_keys_long.sort();
-            for idx in open_orders_keys_long {
+            for idx in self.open_orders.long.keys().to_vec() {
                 // Process close fills long
-                if !self.open_orders.long[&idx].closes.is_empty() {
+                if !self.open_orders.long[idx].closes.is_empty() {
                     let mut closes_to_process = Vec::new();
                     {
-                        for close_order in &self.open_orders.long[&idx].closes {
+                        for close_order in &self.open_orders.long[idx].closes {
                             if self.order_filled(k, idx, close_order) {
                                 closes_to_process.push(close_order.clone());
                             }
                         }
                     }
                     for order in closes_to_process {
-                        //if order.qty != 0.0 && self.positions.long.contains_key(&idx) && self.positions.long.contains_key(&idx)
+                        //if order.qty != 0.0 && self.positions.long.contains_key(idx) && self.positions.long.contains_key(idx)
                         //if order.qty != 0.0 && self.get_position
-                        if self.positions.long.contains_key(&idx) {
+                        if self.positions.long.contains_key(idx) {
                             self.did_fill_long.insert(idx);
                             self.reset_trailing_prices(idx, LONG);
                             self.process_close_fill_long(k, idx, &order);
@@ -571,10 +1209,10 @@ impl<'a> Backtest<'a> {
                     }
                 }
                 // Process entry fills long
-                if !self.open_orders.long[&idx].entries.is_empty() {
+                if !self.open_orders.long[idx].entries.is_empty() {
                     let mut entries_to_process = Vec::new();
                     {
-                        for entry_order in &self.open_orders.long[&idx].entries {
+                        for entry_order in &self.open_orders.long[idx].entries {
                             if self.order_filled(k, idx, entry_order) {
                                 entries_to_process.push(entry_order.clone());
                             }
@@ -589,22 +1227,19 @@ impl<'a> Backtest<'a> {
             }
         }
         if self.trading_enabled.short {
-            let mut open_orders_keys_short: Vec<usize> =
-                self.open_orders.short.keys().cloned().collect();
-            open_orders_keys_short.sort();
-            for idx in open_orders_keys_short {
+            for idx in self.open_orders.short.keys().to_vec() {
                 // Process close fills short
-                if !self.open_orders.short[&idx].closes.is_empty() {
+                if !self.open_orders.short[idx].closes.is_empty() {
                     let mut closes_to_process = Vec::new();
                     {
-                        for close_order in &self.open_orders.short[&idx].closes {
+                        for close_order in &self.open_orders.short[idx].closes {
                             if self.order_filled(k, idx, close_order) {
                                 closes_to_process.push(close_order.clone());
                             }
                         }
                     }
                     for order in closes_to_process {
-                        if self.positions.short.contains_key(&idx) {
+                        if self.positions.short.contains_key(idx) {
                             self.did_fill_short.insert(idx);
                             self.reset_trailing_prices(idx, SHORT);
                             self.process_close_fill_short(k, idx, &order);
@@ -612,10 +1247,10 @@ impl<'a> Backtest<'a> {
                     }
                 }
                 // Process entry fills short
-                if !self.open_orders.short[&idx].entries.is_empty() {
+                if !self.open_orders.short[idx].entries.is_empty() {
                     let mut entries_to_process = Vec::new();
                     {
-                        for entry_order in &self.open_orders.short[&idx].entries {
+                        for entry_order in &self.open_orders.short[idx].entries {
                             if self.order_filled(k, idx, entry_order) {
                                 entries_to_process.push(entry_order.clone());
                             }
@@ -634,41 +1269,41 @@ impl<'a> Backtest<'a> {
     fn update_stuck_status(&mut self, idx: usize, pside: usize) {
         match pside {
             LONG => {
-                if self.positions.long.contains_key(&idx) {
+                if self.positions.long.contains_key(idx) {
                     let wallet_exposure = calc_wallet_exposure(
                         self.exchange_params_list[idx].c_mult,
                         self.balance.usd_total_rounded,
-                        self.positions.long[&idx].size,
-                        self.positions.long[&idx].price,
+                        self.positions.long[idx].size,
+                        self.positions.long[idx].price,
                     );
                     if wallet_exposure / self.bot_params_pair.long.wallet_exposure_limit
                         > self.bot_params_pair.long.unstuck_threshold
                     {
                         self.is_stuck.long.insert(idx);
                     } else {
-                        self.is_stuck.long.remove(&idx);
+                        self.is_stuck.long.remove(idx);
                     }
                 } else {
-                    self.is_stuck.long.remove(&idx);
+                    self.is_stuck.long.remove(idx);
                 }
             }
             SHORT => {
-                if self.positions.short.contains_key(&idx) {
+                if self.positions.short.contains_key(idx) {
                     let wallet_exposure = calc_wallet_exposure(
                         self.exchange_params_list[idx].c_mult,
                         self.balance.usd_total_rounded,
-                        self.positions.short[&idx].size.abs(),
-                        self.positions.short[&idx].price,
+                        self.positions.short[idx].size.abs(),
+                        self.positions.short[idx].price,
                     );
                     if wallet_exposure / self.bot_params_pair.short.wallet_exposure_limit
                         > self.bot_params_pair.short.unstuck_threshold
                     {
                         self.is_stuck.short.insert(idx);
                     } else {
-                        self.is_stuck.short.remove(&idx);
+                        self.is_stuck.short.remove(idx);
                     }
                 } else {
-                    self.is_stuck.short.remove(&idx);
+                    self.is_stuck.short.remove(idx);
                 }
             }
             _ => panic!("Invalid pside in update_stuck_status"),
@@ -677,7 +1312,7 @@ impl<'a> Backtest<'a> {
 
     fn process_close_fill_long(&mut self, k: usize, idx: usize, close_fill: &Order) {
         let mut new_psize = round_(
-            self.positions.long[&idx].size + close_fill.qty,
+            self.positions.long[idx].size + close_fill.qty,
             self.exchange_params_list[idx].qty_step,
         );
         let mut adjusted_close_qty = close_fill.qty;
@@ -688,7 +1323,7 @@ impl<'a> Backtest<'a> {
             println!("close order: {:?}", close_fill);
             println!("bot config: {:?}", self.bot_params_pair.long);
             new_psize = 0.0;
-            adjusted_close_qty = -self.positions.long[&idx].size;
+            adjusted_close_qty = -self.positions.long[idx].size;
         }
         let fee_paid = -qty_to_cost(
             adjusted_close_qty,
@@ -696,7 +1331,7 @@ impl<'a> Backtest<'a> {
             self.exchange_params_list[idx].c_mult,
         ) * self.backtest_params.maker_fee;
         let pnl = calc_pnl_long(
-            self.positions.long[&idx].price,
+            self.positions.long[idx].price,
             close_fill.price,
             adjusted_close_qty,
             self.exchange_params_list[idx].c_mult,
@@ -705,32 +1340,32 @@ impl<'a> Backtest<'a> {
         self.pnl_cumsum_max = self.pnl_cumsum_max.max(self.pnl_cumsum_running);
         self.update_balance(k, pnl, fee_paid);
 
-        let current_pprice = self.positions.long[&idx].price;
+        let current_pprice = self.positions.long[idx].price;
         if new_psize == 0.0 {
-            self.positions.long.remove(&idx);
+            self.positions.long.remove(idx);
         } else {
-            self.positions.long.get_mut(&idx).unwrap().size = new_psize;
-        }
-        self.fills.push(Fill {
-            index: k,                                      // index minute
-            coin: self.backtest_params.coins[idx].clone(), // coin
-            pnl,                                           // realized pnl
-            fee_paid,                                      // fee paid
-            balance_usd_total: self.balance.usd_total,     // balance after fill
-            balance_btc: self.balance.btc,                 // Added
-            balance_usd: self.balance.usd,                 // Added
-            btc_price: self.btc_usd_prices[k],             // Added
-            fill_qty: adjusted_close_qty,                  // fill qty
-            fill_price: close_fill.price,                  // fill price
-            position_size: new_psize,                      // psize after fill
-            position_price: current_pprice,                // pprice after fill
-            order_type: close_fill.order_type.clone(),     // fill type
+            self.positions.long[idx].size = new_psize;
+        }
+        self.record_fill(Fill {
+            index: k,                                  // index minute
+            coin_index: idx,                           // coin index
+            pnl,                                       // realized pnl
+            fee_paid,                                  // fee paid
+            balance_usd_total: self.balance.usd_total, // balance after fill
+            balance_btc: self.balance.btc,             // Added
+            balance_usd: self.balance.usd,             // Added
+            btc_price: self.btc_usd_prices[k],         // Added
+            fill_qty: adjusted_close_qty,              // fill qty
+            fill_price: close_fill.price,              // fill price
+            position_size: new_psize,                  // psize after fill
+            position_price: current_pprice,            // pprice after fill
+            order_type: close_fill.order_type.clone(), // fill type
         });
     }
 
     fn process_close_fill_short(&mut self, k: usize, idx: usize, order: &Order) {
         let mut new_psize = round_(
-            self.positions.short[&idx].size + order.qty,
+            self.positions.short[idx].size + order.qty,
             self.exchange_params_list[idx].qty_step,
         );
         let mut adjusted_close_qty = order.qty;
@@ -740,7 +1375,7 @@ impl<'a> Backtest<'a> {
             println!("new_psize: {}", new_psize);
             println!("close order: {:?}", order);
             new_psize = 0.0;
-            adjusted_close_qty = self.positions.short[&idx].size.abs();
+            adjusted_close_qty = self.positions.short[idx].size.abs();
         }
         let fee_paid = -qty_to_cost(
             adjusted_close_qty,
@@ -748,7 +1383,7 @@ impl<'a> Backtest<'a> {
             self.exchange_params_list[idx].c_mult,
         ) * self.backtest_params.maker_fee;
         let pnl = calc_pnl_short(
-            self.positions.short[&idx].price,
+            self.positions.short[idx].price,
             order.price,
             adjusted_close_qty,
             self.exchange_params_list[idx].c_mult,
@@ -757,26 +1392,26 @@ impl<'a> Backtest<'a> {
         self.pnl_cumsum_max = self.pnl_cumsum_max.max(self.pnl_cumsum_running);
         self.update_balance(k, pnl, fee_paid);
 
-        let current_pprice = self.positions.short[&idx].price;
+        let current_pprice = self.positions.short[idx].price;
         if new_psize == 0.0 {
-            self.positions.short.remove(&idx);
+            self.positions.short.remove(idx);
         } else {
-            self.positions.short.get_mut(&idx).unwrap().size = new_psize;
-        }
-        self.fills.push(Fill {
-            index: k,                                      // index minute
-            coin: self.backtest_params.coins[idx].clone(), // coin
-            pnl,                                           // realized pnl
-            fee_paid,                                      // fee paid
-            balance_usd_total: self.balance.usd_total,     // balance after fill
-            balance_btc: self.balance.btc,                 // Added
-            balance_usd: self.balance.usd,                 // Added
-            btc_price: self.btc_usd_prices[k],             // Added
-            fill_qty: adjusted_close_qty,                  // fill qty
-            fill_price: order.price,                       // fill price
-            position_size: new_psize,                      // psize after fill
-            position_price: current_pprice,                // pprice after fill
-            order_type: order.order_type.clone(),          // fill type
+            self.positions.short[idx].size = new_psize;
+        }
+        self.record_fill(Fill {
+            index: k,                                  // index minute
+            coin_index: idx,                           // coin index
+            pnl,                                       // realized pnl
+            fee_paid,                                  // fee paid
+            balance_usd_total: self.balance.usd_total, // balance after fill
+            balance_btc: self.balance.btc,             // Added
+            balance_usd: self.balance.usd,             // Added
+            btc_price: self.btc_usd_prices[k],         // Added
+            fill_qty: adjusted_close_qty,              // fill qty
+            fill_price: order.price,                   // fill price
+            position_size: new_psize,                  // psize after fill
+            position_price: current_pprice,            // pprice after fill
+            order_type: order.order_type.clone(),      // fill type
         });
     }
 
@@ -789,34 +1424,30 @@ impl<'a> Backtest<'a> {
         ) * self.backtest_params.maker_fee;
         self.update_balance(k, 0.0, fee_paid);
 
-        let position_entry = self
-            .positions
-            .long
-            .entry(idx)
-            .or_insert(Position::default());
+        let position_entry = self.positions.long.get_or_insert_default(idx);
         let (new_psize, new_pprice) = calc_new_psize_pprice(
             position_entry.size,
             position_entry.price,
             order.qty,
             order.price,
-            self.exchange_params_list[idx].qty_step,
-        );
-        self.positions.long.get_mut(&idx).unwrap().size = new_psize;
-        self.positions.long.get_mut(&idx).unwrap().price = new_pprice;
-        self.fills.push(Fill {
-            index: k,                                        // index minute
-            coin: self.backtest_params.coins[idx].clone(),   // coin
-            pnl: 0.0,                                        // realized pnl
-            fee_paid,                                        // fee paid
-            balance_usd_total: self.balance.usd_total,       // balance after fill
-            balance_btc: self.balance.btc,                   // Added
-            balance_usd: self.balance.usd,                   // Added
-            btc_price: self.btc_usd_prices[k],               // Added
-            fill_qty: order.qty,                             // fill qty
-            fill_price: order.price,                         // fill price
-            position_size: self.positions.long[&idx].size,   // psize after fill
-            position_price: self.positions.long[&idx].price, // pprice after fill
-            order_type: order.order_type.clone(),            // fill type
+            self.exchange_params_list[idx].qty_step,
+        );
+        self.positions.long[idx].size = new_psize;
+        self.positions.long[idx].price = new_pprice;
+        self.record_fill(Fill {
+            index: k,                                       // index minute
+            coin_index: idx,                                // coin index
+            pnl: 0.0,                                       // realized pnl
+            fee_paid,                                       // fee paid
+            balance_usd_total: self.balance.usd_total,      // balance after fill
+            balance_btc: self.balance.btc,                  // Added
+            balance_usd: self.balance.usd,                  // Added
+            btc_price: self.btc_usd_prices[k],              // Added
+            fill_qty: order.qty,                            // fill qty
+            fill_price: order.price,                        // fill price
+            position_size: self.positions.long[idx].size,   // psize after fill
+            position_price: self.positions.long[idx].price, // pprice after fill
+            order_type: order.order_type.clone(),           // fill type
         });
     }
 
@@ -828,11 +1459,7 @@ impl<'a> Backtest<'a> {
             self.exchange_params_list[idx].c_mult,
         ) * self.backtest_params.maker_fee;
         self.update_balance(k, 0.0, fee_paid);
-        let position_entry = self
-            .positions
-            .short
-            .entry(idx)
-            .or_insert(Position::default());
+        let position_entry = self.positions.short.get_or_insert_default(idx);
         let (new_psize, new_pprice) = calc_new_psize_pprice(
             position_entry.size,
             position_entry.price,
@@ -840,91 +1467,91 @@ impl<'a> Backtest<'a> {
             order.price,
             self.exchange_params_list[idx].qty_step,
         );
-        self.positions.short.get_mut(&idx).unwrap().size = new_psize;
-        self.positions.short.get_mut(&idx).unwrap().price = new_pprice;
-        self.fills.push(Fill {
-            index: k,                                         // index minute
-            coin: self.backtest_params.coins[idx].clone(),    // coin
-            pnl: 0.0,                                         // realized pnl
-            fee_paid,                                         // fee paid
-            balance_usd_total: self.balance.usd_total,        // balance after fill
-            balance_btc: self.balance.btc,                    // Added
-            balance_usd: self.balance.usd,                    // Added
-            btc_price: self.btc_usd_prices[k],                // Added
-            fill_qty: order.qty,                              // fill qty
-            fill_price: order.price,                          // fill price
-            position_size: self.positions.short[&idx].size,   // psize after fill
-            position_price: self.positions.short[&idx].price, // pprice after fill
-            order_type: order.order_type.clone(),             // fill type
+        self.positions.short[idx].size = new_psize;
+        self.positions.short[idx].price = new_pprice;
+        self.record_fill(Fill {
+            index: k,                                        // index minute
+            coin_index: idx,                                 // coin index
+            pnl: 0.0,                                        // realized pnl
+            fee_paid,                                        // fee paid
+            balance_usd_total: self.balance.usd_total,       // balance after fill
+            balance_btc: self.balance.btc,                   // Added
+            balance_usd: self.balance.usd,                   // Added
+            btc_price: self.btc_usd_prices[k],               // Added
+            fill_qty: order.qty,                             // fill qty
+            fill_price: order.price,                         // fill price
+            position_size: self.positions.short[idx].size,   // psize after fill
+            position_price: self.positions.short[idx].price, // pprice after fill
+            order_type: order.order_type.clone(),            // fill type
         });
     }
 
     fn calc_next_grid_entry_long(&self, k: usize, idx: usize) -> Order {
         let state_params = self.create_state_params(k, idx, LONG);
         let binding = Position::default();
-        let position = self.positions.long.get(&idx).unwrap_or(&binding);
+        let position = self.positions.long.get(idx).unwrap_or(&binding);
         calc_next_entry_long(
             &self.exchange_params_list[idx],
             &state_params,
             &self.bot_params_pair.long,
             position,
-            &self.trailing_prices.long[&idx],
+            &self.trailing_prices.long[idx],
         )
     }
 
     fn calc_next_grid_entry_short(&self, k: usize, idx: usize) -> Order {
         let state_params = self.create_state_params(k, idx, SHORT);
         let binding = Position::default();
-        let position = self.positions.short.get(&idx).unwrap_or(&binding);
+        let position = self.positions.short.get(idx).unwrap_or(&binding);
         calc_next_entry_short(
             &self.exchange_params_list[idx],
             &state_params,
             &self.bot_params_pair.short,
             position,
-            &self.trailing_prices.short[&idx],
+            &self.trailing_prices.short[idx],
         )
     }
 
     fn calc_grid_close_long(&self, k: usize, idx: usize) -> Order {
         let state_params = self.create_state_params(k, idx, LONG);
         let binding = Position::default();
-        let position = self.positions.long.get(&idx).unwrap_or(&binding);
+        let position = self.positions.long.get(idx).unwrap_or(&binding);
         calc_next_close_long(
             &self.exchange_params_list[idx],
             &state_params,
             &self.bot_params_pair.long,
             &position,
-            &self.trailing_prices.long[&idx],
+            &self.trailing_prices.long[idx],
         )
     }
 
     fn calc_grid_close_short(&self, k: usize, idx: usize) -> Order {
         let state_params = self.create_state_params(k, idx, SHORT);
         let binding = Position::default();
-        let position = self.positions.short.get(&idx).unwrap_or(&binding);
+        let position = self.positions.short.get(idx).unwrap_or(&binding);
         calc_next_close_short(
             &self.exchange_params_list[idx],
             &state_params,
             &self.bot_params_pair.short,
             &position,
-            &self.trailing_prices.short[&idx],
+            &self.trailing_prices.short[idx],
         )
     }
 
     fn reset_trailing_prices(&mut self, idx: usize, pside: usize) {
         let trailing_price_bundle = if pside == LONG {
-            self.trailing_prices.long.entry(idx).or_default()
+            &mut self.trailing_prices.long[idx]
         } else {
-            self.trailing_prices.short.entry(idx).or_default()
+            &mut self.trailing_prices.short[idx]
         };
         *trailing_price_bundle = TrailingPriceBundle::default();
     }
 
     fn update_trailing_prices(&mut self, k: usize, idx: usize, pside: usize) {
         let trailing_price_bundle = if pside == LONG {
-            self.trailing_prices.long.entry(idx).or_default()
+            &mut self.trailing_prices.long[idx]
         } else {
-            self.trailing_prices.short.entry(idx).or_default()
+            &mut self.trailing_prices.short[idx]
         };
         if self.hlcvs[[k, idx, LOW]] < trailing_price_bundle.min_since_open {
             trailing_price_bundle.min_since_open = self.hlcvs[[k, idx, LOW]];
@@ -977,74 +1604,67 @@ impl<'a> Backtest<'a> {
         let position = self
             .positions
             .long
-            .get(&idx)
+            .get(idx)
             .cloned()
             .unwrap_or(Position::default());
 
         // check if coin is delisted; if so, close pos as unstuck close
-        if let Some(&delist_timestamp) = self.last_valid_timestamps.get(&idx) {
-            if k >= delist_timestamp && self.positions.long.contains_key(&idx) {
-                self.open_orders.long.entry(idx).or_default().closes = vec![Order {
-                    qty: -self.positions.long[&idx].size,
-                    price: round_(
-                        f64::min(
-                            self.hlcvs[[k, idx, HIGH]] - self.exchange_params_list[idx].price_step,
-                            self.positions.long[&idx].price,
-                        ),
-                        self.exchange_params_list[idx].price_step,
+        if k >= self.delist_timestamps[idx] && self.positions.long.contains_key(idx) {
+            self.open_orders.long.get_or_insert_default(idx).closes = vec![Order {
+                qty: -self.positions.long[idx].size,
+                price: round_(
+                    f64::min(
+                        self.hlcvs[[k, idx, HIGH]] - self.exchange_params_list[idx].price_step,
+                        self.positions.long[idx].price,
                     ),
-                    order_type: OrderType::CloseUnstuckLong,
-                }];
-                self.open_orders
-                    .long
-                    .entry(idx)
-                    .or_default()
-                    .entries
-                    .clear();
-                return;
-            }
+                    self.exchange_params_list[idx].price_step,
+                ),
+                order_type: OrderType::CloseUnstuckLong,
+            }];
+            self.open_orders.long[idx].entries.clear();
+            return;
         }
         let next_entry_order = calc_next_entry_long(
             &self.exchange_params_list[idx],
             &state_params,
             &self.bot_params_pair.long,
             &position,
-            &self.trailing_prices.long[&idx],
+            &self.trailing_prices.long[idx],
         );
         // if initial entry or grid, peek next candle to see if order will fill
         if self.order_filled(k + 1, idx, &next_entry_order)
             && self.has_next_grid_order(&next_entry_order, LONG)
         {
-            self.open_orders.long.entry(idx).or_default().entries = calc_entries_long(
+            self.open_orders.long.get_or_insert_default(idx).entries = calc_entries_long(
                 &self.exchange_params_list[idx],
                 &state_params,
                 &self.bot_params_pair.long,
                 &position,
-                &self.trailing_prices.long[&idx],
+                &self.trailing_prices.long[idx],
             );
         } else {
-            self.open_orders.long.entry(idx).or_default().entries = [next_entry_order].to_vec();
+            self.open_orders.long.get_or_insert_default(idx).entries = [next_entry_order].to_vec();
         }
         let next_close_order = calc_next_close_long(
             &self.exchange_params_list[idx],
             &state_params,
             &self.bot_params_pair.long,
             &position,
-            &self.trailing_prices.long[&idx],
+            &self.trailing_prices.long[idx],
         );
         // if initial entry or grid, peek next candle to see if order will fill
         if self.order_filled(k + 1, idx, &next_close_order)
             && self.has_next_grid_order(&next_close_order, LONG)
         {
-            self.open_orders.long.entry(idx).or_default().closes = calc_closes_long(
+            self.open_orders.long.get_or_insert_default(idx).closes = calc_closes_long(
                 &self.exchange_params_list[idx],
                 &state_params,
                 &self.bot_params_pair.long,
                 &position,
-                &self.trailing_prices.long[&idx],
+                &self.trailing_prices.long[idx],
             );
         } else {
-            self.open_orders.long.entry(idx).or_default().closes = [next_close_order].to_vec();
+            self.open_orders.long.get_or_insert_default(idx).closes = [next_close_order].to_vec();
         }
     }
 
@@ -1053,53 +1673,46 @@ impl<'a> Backtest<'a> {
         let position = self
             .positions
             .short
-            .get(&idx)
+            .get(idx)
             .cloned()
             .unwrap_or(Position::default());
 
         // check if coin is delisted; if so, close pos as unstuck close
-        if let Some(&delist_timestamp) = self.last_valid_timestamps.get(&idx) {
-            if k >= delist_timestamp && self.positions.short.contains_key(&idx) {
-                self.open_orders.short.entry(idx).or_default().closes = vec![Order {
-                    qty: self.positions.short[&idx].size.abs(),
-                    price: round_(
-                        f64::max(
-                            self.hlcvs[[k, idx, LOW]] + self.exchange_params_list[idx].price_step,
-                            self.positions.short[&idx].price,
-                        ),
-                        self.exchange_params_list[idx].price_step,
+        if k >= self.delist_timestamps[idx] && self.positions.short.contains_key(idx) {
+            self.open_orders.short.get_or_insert_default(idx).closes = vec![Order {
+                qty: self.positions.short[idx].size.abs(),
+                price: round_(
+                    f64::max(
+                        self.hlcvs[[k, idx, LOW]] + self.exchange_params_list[idx].price_step,
+                        self.positions.short[idx].price,
                     ),
-                    order_type: OrderType::CloseUnstuckShort,
-                }];
-                self.open_orders
-                    .short
-                    .entry(idx)
-                    .or_default()
-                    .entries
-                    .clear();
-                return;
-            }
+                    self.exchange_params_list[idx].price_step,
+                ),
+                order_type: OrderType::CloseUnstuckShort,
+            }];
+            self.open_orders.short[idx].entries.clear();
+            return;
         }
         let next_entry_order = calc_next_entry_short(
             &self.exchange_params_list[idx],
             &state_params,
             &self.bot_params_pair.short,
             &position,
-            &self.trailing_prices.short[&idx],
+            &self.trailing_prices.short[idx],
         );
         // if initial entry or grid, peek next candle to see if order will fill
         if self.order_filled(k + 1, idx, &next_entry_order)
             && self.has_next_grid_order(&next_entry_order, SHORT)
         {
-            self.open_orders.short.entry(idx).or_default().entries = calc_entries_short(
+            self.open_orders.short.get_or_insert_default(idx).entries = calc_entries_short(
                 &self.exchange_params_list[idx],
                 &state_params,
                 &self.bot_params_pair.short,
                 &position,
-                &self.trailing_prices.short[&idx],
+                &self.trailing_prices.short[idx],
             );
         } else {
-            self.open_orders.short.entry(idx).or_default().entries = [next_entry_order].to_vec();
+            self.open_orders.short.get_or_insert_default(idx).entries = [next_entry_order].to_vec();
         }
 
         let next_close_order = calc_next_close_short(
@@ -1107,21 +1720,21 @@ impl<'a> Backtest<'a> {
             &state_params,
             &self.bot_params_pair.short,
             &position,
-            &self.trailing_prices.short[&idx],
+            &self.trailing_prices.short[idx],
         );
         // if initial entry or grid, peek next candle to see if order will fill
         if self.order_filled(k + 1, idx, &next_close_order)
             && self.has_next_grid_order(&next_close_order, SHORT)
         {
-            self.open_orders.short.entry(idx).or_default().closes = calc_closes_short(
+            self.open_orders.short.get_or_insert_default(idx).closes = calc_closes_short(
                 &self.exchange_params_list[idx],
                 &state_params,
                 &self.bot_params_pair.short,
                 &position,
-                &self.trailing_prices.short[&idx],
+                &self.trailing_prices.short[idx],
             );
         } else {
-            self.open_orders.short.entry(idx).or_default().closes = [next_close_order].to_vec()
+            self.open_orders.short.get_or_insert_default(idx).closes = [next_close_order].to_vec()
         }
     }
 
@@ -1150,11 +1763,8 @@ impl<'a> Backtest<'a> {
             );
             if unstuck_allowances.0 > 0.0 {
                 // Check long positions
-                // Sort the keys for long
-                let mut long_keys: Vec<usize> = self.positions.long.keys().cloned().collect();
-                long_keys.sort();
-                for idx in long_keys {
-                    let position = &self.positions.long[&idx];
+                for idx in self.positions.long.keys().iter() {
+                    let position = &self.positions.long[idx];
                     let wallet_exposure = calc_wallet_exposure(
                         self.exchange_params_list[idx].c_mult,
                         self.balance.usd_total_rounded,
@@ -1182,12 +1792,8 @@ impl<'a> Backtest<'a> {
             );
             if unstuck_allowances.1 > 0.0 {
                 // Check short positions
-                // Sort the keys for short
-                let mut short_keys: Vec<usize> = self.positions.short.keys().cloned().collect();
-                short_keys.sort();
-
-                for idx in short_keys {
-                    let position = &self.positions.short[&idx];
+                for idx in self.positions.short.keys().iter() {
+                    let position = &self.positions.short[idx];
                     let wallet_exposure = calc_wallet_exposure(
                         self.exchange_params_list[idx].c_mult,
                         self.balance.usd_total_rounded,
@@ -1228,14 +1834,14 @@ impl<'a> Backtest<'a> {
                             self.exchange_params_list[idx].price_step,
                         ),
                     );
-                    if self.open_orders.long[&idx].closes.is_empty()
-                        || self.open_orders.long[&idx].closes[0].qty == 0.0
-                        || close_price < self.open_orders.long[&idx].closes[0].price
+                    if self.open_orders.long[idx].closes.is_empty()
+                        || self.open_orders.long[idx].closes[0].qty == 0.0
+                        || close_price < self.open_orders.long[idx].closes[0].price
                     {
                         let min_entry_qty =
                             calc_min_entry_qty(close_price, &self.exchange_params_list[idx]);
                         let mut close_qty = -f64::min(
-                            self.positions.long[&idx].size,
+                            self.positions.long[idx].size,
                             f64::max(
                                 min_entry_qty,
                                 round_dn(
@@ -1252,7 +1858,7 @@ impl<'a> Backtest<'a> {
                         );
                         if close_qty != 0.0 {
                             let pnl_if_closed = calc_pnl_long(
-                                self.positions.long[&idx].price,
+                                self.positions.long[idx].price,
                                 close_price,
                                 close_qty,
                                 self.exchange_params_list[idx].c_mult,
@@ -1262,7 +1868,7 @@ impl<'a> Backtest<'a> {
                                 // means unstuck allowance would be exceeded
                                 // reduce qty
                                 close_qty = -f64::min(
-                                    self.positions.long[&idx].size,
+                                    self.positions.long[idx].size,
                                     f64::max(
                                         min_entry_qty,
                                         round_dn(
@@ -1294,14 +1900,14 @@ impl<'a> Backtest<'a> {
                             self.exchange_params_list[idx].price_step,
                         ),
                     );
-                    if self.open_orders.short[&idx].closes.is_empty()
-                        || self.open_orders.short[&idx].closes[0].qty == 0.0
-                        || close_price > self.open_orders.short[&idx].closes[0].price
+                    if self.open_orders.short[idx].closes.is_empty()
+                        || self.open_orders.short[idx].closes[0].qty == 0.0
+                        || close_price > self.open_orders.short[idx].closes[0].price
                     {
                         let min_entry_qty =
                             calc_min_entry_qty(close_price, &self.exchange_params_list[idx]);
                         let mut close_qty = f64::min(
-                            self.positions.short[&idx].size.abs(),
+                            self.positions.short[idx].size.abs(),
                             f64::max(
                                 min_entry_qty,
                                 round_dn(
@@ -1318,7 +1924,7 @@ impl<'a> Backtest<'a> {
                         );
                         if close_qty != 0.0 {
                             let pnl_if_closed = calc_pnl_short(
-                                self.positions.short[&idx].price,
+                                self.positions.short[idx].price,
                                 close_price,
                                 close_qty,
                                 self.exchange_params_list[idx].c_mult,
@@ -1328,7 +1934,7 @@ impl<'a> Backtest<'a> {
                                 // means unstuck allowance would be exceeded
                                 // reduce qty
                                 close_qty = f64::min(
-                                    self.positions.short[&idx].size.abs(),
+                                    self.positions.short[idx].size.abs(),
                                     f64::max(
                                         min_entry_qty,
                                         round_dn(
@@ -1360,44 +1966,30 @@ impl<'a> Backtest<'a> {
     fn update_open_orders_any_fill(&mut self, k: usize) {
         if self.trading_enabled.long {
             if self.trailing_enabled.long {
-                let mut positions_long_indices: Vec<usize> =
-                    self.positions.long.keys().cloned().collect();
-                positions_long_indices.sort();
-                for idx in &positions_long_indices {
-                    if !self.did_fill_long.contains(&idx) {
-                        self.update_trailing_prices(k, *idx, LONG);
+                for idx in self.positions.long.keys().to_vec() {
+                    if !self.did_fill_long.contains(idx) {
+                        self.update_trailing_prices(k, idx, LONG);
                     }
                 }
             }
             self.update_actives(k, LONG);
-            self.open_orders
-                .long
-                .retain(|&idx, _| self.actives.long.contains(&idx));
-            let mut active_long_indices: Vec<usize> = self.actives.long.iter().cloned().collect();
-            active_long_indices.sort(); // Ensure deterministic order
-            for &idx in &active_long_indices {
+            self.open_orders.long.retain_keys(&self.actives.long);
+            for idx in self.actives.long.to_vec() {
                 self.update_stuck_status(idx, LONG);
                 self.update_open_orders_long_single(k, idx);
             }
         }
         if self.trading_enabled.short {
             if self.trailing_enabled.short {
-                let mut positions_short_indices: Vec<usize> =
-                    self.positions.short.keys().cloned().collect();
-                positions_short_indices.sort();
-                for idx in &positions_short_indices {
-                    if !self.did_fill_short.contains(&idx) {
-                        self.update_trailing_prices(k, *idx, SHORT);
+                for idx in self.positions.short.keys().to_vec() {
+                    if !self.did_fill_short.contains(idx) {
+                        self.update_trailing_prices(k, idx, SHORT);
                     }
                 }
             }
             self.update_actives(k, SHORT);
-            self.open_orders
-                .short
-                .retain(|&idx, _| self.actives.short.contains(&idx));
-            let mut active_short_indices: Vec<usize> = self.actives.short.iter().cloned().collect();
-            active_short_indices.sort(); // Ensure deterministic order
-            for &idx in &active_short_indices {
+            self.open_orders.short.retain_keys(&self.actives.short);
+            for idx in self.actives.short.to_vec() {
                 self.update_stuck_status(idx, SHORT);
                 self.update_open_orders_short_single(k, idx);
             }
@@ -1408,15 +2000,13 @@ impl<'a> Backtest<'a> {
                 LONG => {
                     self.open_orders
                         .long
-                        .entry(unstucking_idx)
-                        .or_default()
+                        .get_or_insert_default(unstucking_idx)
                         .closes = vec![unstucking_close];
                 }
                 SHORT => {
                     self.open_orders
                         .short
-                        .entry(unstucking_idx)
-                        .or_default()
+                        .get_or_insert_default(unstucking_idx)
                         .closes = vec![unstucking_close];
                 }
                 _ => unreachable!(),
@@ -1431,29 +2021,21 @@ impl<'a> Backtest<'a> {
         // - entries for coins with open trailing entries
         // - closes for coins with open trailing closes
         if self.trading_enabled.long {
-            let mut positions_long_indices: Vec<usize> =
-                self.positions.long.keys().cloned().collect();
-            positions_long_indices.sort();
             if self.trailing_enabled.long {
-                for idx in &positions_long_indices {
+                for idx in self.positions.long.keys().to_vec() {
                     if !self.did_fill_long.contains(idx) {
-                        self.update_trailing_prices(k, *idx, LONG);
+                        self.update_trailing_prices(k, idx, LONG);
                     }
                 }
             }
             let mut actives_without_pos = Vec::<usize>::new();
-            if positions_long_indices.len() < self.bot_params_pair.long.n_positions {
+            if self.positions.long.len() < self.bot_params_pair.long.n_positions {
                 actives_without_pos = self.update_actives(k, LONG);
-                self.open_orders
-                    .long
-                    .retain(|&idx, _| self.actives.long.contains(&idx));
+                self.open_orders.long.retain_keys(&self.actives.long);
             }
-            let mut active_long_indices: Vec<usize> = self.actives.long.iter().cloned().collect();
-            active_long_indices.sort();
-
-            for idx in active_long_indices {
+            for idx in self.actives.long.to_vec() {
                 if actives_without_pos.contains(&idx)
-                    || self.open_orders.long.get(&idx).map_or(false, |orders| {
+                    || self.open_orders.long.get(idx).map_or(false, |orders| {
                         orders.closes.iter().any(|order| {
                             order.order_type == OrderType::CloseUnstuckLong
                                 || order.order_type == OrderType::CloseTrailingLong
@@ -1469,28 +2051,21 @@ impl<'a> Backtest<'a> {
         }
 
         if self.trading_enabled.short {
-            let mut positions_short_indices: Vec<usize> =
-                self.positions.short.keys().cloned().collect();
-            positions_short_indices.sort();
             if self.trailing_enabled.short {
-                for idx in &positions_short_indices {
+                for idx in self.positions.short.keys().to_vec() {
                     if !self.did_fill_short.contains(idx) {
-                        self.update_trailing_prices(k, *idx, SHORT);
+                        self.update_trailing_prices(k, idx, SHORT);
                     }
                 }
             }
             let mut actives_without_pos = Vec::<usize>::new();
-            if positions_short_indices.len() < self.bot_params_pair.short.n_positions {
+            if self.positions.short.len() < self.bot_params_pair.short.n_positions {
                 actives_without_pos = self.update_actives(k, SHORT);
-                self.open_orders
-                    .short
-                    .retain(|&idx, _| self.actives.short.contains(&idx));
+                self.open_orders.short.retain_keys(&self.actives.short);
             }
-            let mut active_short_indices: Vec<usize> = self.actives.short.iter().cloned().collect();
-            active_short_indices.sort();
-            for idx in active_short_indices {
+            for idx in self.actives.short.to_vec() {
                 if actives_without_pos.contains(&idx)
-                    || self.open_orders.short.get(&idx).map_or(false, |orders| {
+                    || self.open_orders.short.get(idx).map_or(false, |orders| {
                         orders.closes.iter().any(|order| {
                             order.order_type == OrderType::CloseUnstuckShort
                                 || order.order_type == OrderType::CloseTrailingShort
@@ -1511,12 +2086,12 @@ impl<'a> Backtest<'a> {
             if unstucking_pside != NO_POS {
                 match unstucking_pside {
                     LONG => {
-                        if let Some(orders) = self.open_orders.long.get_mut(&unstucking_idx) {
+                        if let Some(orders) = self.open_orders.long.get_mut(unstucking_idx) {
                             orders.closes = vec![unstucking_close];
                         }
                     }
                     SHORT => {
-                        if let Some(orders) = self.open_orders.short.get_mut(&unstucking_idx) {
+                        if let Some(orders) = self.open_orders.short.get_mut(unstucking_idx) {
                             orders.closes = vec![unstucking_close];
                         }
                     }
@@ -1629,37 +2204,205 @@ fn calc_ema_alphas(bot_params_pair: &BotParamsPair) -> EmaAlphas {
     }
 }
 
-fn analyze_backtest_basic(fills: &[Fill], equities: &Vec<f64>) -> Analysis {
-    if fills.len() <= 1 {
-        return Analysis::default();
-    }
-    // Calculate daily equities
-    let mut daily_eqs = Vec::new(); // stores last equity of each day
-    let mut daily_eqs_mins = Vec::new(); // stores min equity of each day
-
-    let mut current_day = 0;
-    let mut current_min = equities[0];
-    let mut last_equity = equities[0];
-
-    for (i, &equity) in equities.iter().enumerate() {
-        let day = i / 1440;
-        if day > current_day {
-            daily_eqs.push(last_equity);
-            daily_eqs_mins.push(current_min);
-            current_day = day;
-            current_min = equity;
+/// Last and minimum equity of each day of an equity series, built one minute at a time.
+/// Days are counted from the first pushed equity.
+#[derive(Default)]
+struct DailyEquities {
+    daily_eqs: Vec<f64>,      // last equity of each day
+    daily_eqs_mins: Vec<f64>, // min equity of each day
+    n_equities: usize,
+    current_day: usize,
+    current_min: f64,
+    last_equity: f64,
+}
+
+impl DailyEquities {
+    fn push(&mut self, equity: f64) {
+        let day = self.n_equities / 1440;
+        if self.n_equities == 0 {
+            self.current_min = equity;
+        } else if day > self.current_day {
+            self.daily_eqs.push(self.last_equity);
+            self.daily_eqs_mins.push(self.current_min);
+            self.current_day = day;
+            self.current_min = equity;
+        } else {
+            self.current_min = self.current_min.min(equity);
+        }
+        self.last_equity = equity;
+        self.n_equities += 1;
+    }
+
+    /// Returns (daily_eqs, daily_eqs_mins), including the final (possibly partial) day.
+    fn finish(mut self) -> (Vec<f64>, Vec<f64>) {
+        if self.n_equities > 0 {
+            self.daily_eqs.push(self.last_equity);
+            self.daily_eqs_mins.push(self.current_min);
+        }
+        (self.daily_eqs, self.daily_eqs_mins)
+    }
+}
+
+/// Running fill sums; fills must arrive in time order.
+#[derive(Default)]
+struct FillTotals {
+    n_fills: usize,
+    total_profit: f64,
+    total_loss: f64,
+    volume_pct_daily: Vec<(usize, f64)>, // (day, sum of fill cost / balance)
+}
+
+impl FillTotals {
+    fn add(&mut self, fill: &Fill) {
+        self.n_fills += 1;
+        if fill.pnl > 0.0 {
+            self.total_profit += fill.pnl;
+        } else {
+            self.total_loss += fill.pnl.abs();
+        }
+        let day = fill.index / 1440;
+        let cost_pct = (fill.fill_qty.abs() * fill.fill_price) / fill.balance_usd_total;
+        if self
+            .volume_pct_daily
+            .last()
+            .map_or(true, |&(last_day, _)| last_day != day)
+        {
+            self.volume_pct_daily.push((day, 0.0));
+        }
+        self.volume_pct_daily.last_mut().unwrap().1 += cost_pct;
+    }
+
+    fn loss_profit_ratio(&self) -> f64 {
+        if self.total_profit == 0.0 {
+            f64::INFINITY
+        } else {
+            self.total_loss / self.total_profit
+        }
+    }
+
+    /// Average volume per day as a percentage of balance, over days with fills.
+    fn volume_pct_per_day_avg(&self) -> f64 {
+        if self.volume_pct_daily.is_empty() {
+            return 0.0;
+        }
+        self.volume_pct_daily.iter().map(|&(_, x)| x).sum::<f64>()
+            / self.volume_pct_daily.len() as f64
+    }
+}
+
+/// Running stats of `(equity - balance) / balance`, split by sign.
+#[derive(Default)]
+struct EquityBalanceDiffs {
+    pos_max: f64,
+    pos_sum: f64,
+    n_pos: usize,
+    neg_max: f64,
+    neg_sum: f64,
+    n_neg: usize,
+}
+
+impl EquityBalanceDiffs {
+    fn add(&mut self, balance: f64, equity: f64) {
+        let ebd = (equity - balance) / balance;
+        if ebd > 0.0 {
+            self.pos_max = f64::max(self.pos_max, ebd);
+            self.pos_sum += ebd;
+            self.n_pos += 1;
+        } else if ebd < 0.0 {
+            self.neg_max = f64::max(self.neg_max, ebd.abs());
+            self.neg_sum += ebd.abs();
+            self.n_neg += 1;
+        }
+    }
+
+    fn apply(&self, analysis: &mut Analysis) {
+        analysis.equity_balance_diff_pos_max = self.pos_max;
+        analysis.equity_balance_diff_pos_mean = if self.n_pos > 0 {
+            self.pos_sum / self.n_pos as f64
+        } else {
+            0.0
+        };
+        analysis.equity_balance_diff_neg_max = self.neg_max;
+        analysis.equity_balance_diff_neg_mean = if self.n_neg > 0 {
+            self.neg_sum / self.n_neg as f64
         } else {
-            current_min = current_min.min(equity);
+            0.0
+        };
+    }
+}
+
+/// Tracks how long positions are held and how long they go without fills.
+#[derive(Default)]
+struct PositionDurations {
+    positions_opened: HashMap<(usize, bool), usize>, // (coin, is_long) -> open time
+    last_fill_time: HashMap<(usize, bool), usize>,   // last fill time per position
+    durations: Vec<usize>,                           // total durations of closed positions
+    unchanged_duration_max: usize,                   // longest period without fills
+    last_index: usize,                               // index of the latest fill
+}
+
+impl PositionDurations {
+    fn add(&mut self, fill: &Fill) {
+        let key = (fill.coin_index, fill.order_type.is_long());
+
+        // Record the opening time if the position is new
+        if !self.positions_opened.contains_key(&key) {
+            self.positions_opened.insert(key, fill.index);
+            self.last_fill_time.insert(key, fill.index);
+        }
+
+        // Unchanged duration since the last fill
+        if let Some(&last_time) = self.last_fill_time.get(&key) {
+            self.unchanged_duration_max = self.unchanged_duration_max.max(fill.index - last_time);
+        }
+        self.last_fill_time.insert(key, fill.index);
+
+        // If the position is fully closed, record its total duration and reset
+        if fill.position_size == 0.0 {
+            if let Some(start_idx) = self.positions_opened.remove(&key) {
+                self.durations.push(fill.index - start_idx);
+                self.last_fill_time.remove(&key);
+            }
         }
-        last_equity = equity;
+        self.last_index = fill.index;
     }
 
-    // Push final day’s values
-    if !equities.is_empty() {
-        daily_eqs.push(last_equity);
-        daily_eqs_mins.push(current_min);
+    fn apply(mut self, n_equities: usize, analysis: &mut Analysis) {
+        // Positions still open count up to the last fill
+        for (key, &start_idx) in self.positions_opened.iter() {
+            self.durations.push(self.last_index - start_idx);
+            if let Some(&last_time) = self.last_fill_time.get(key) {
+                self.unchanged_duration_max =
+                    self.unchanged_duration_max.max(self.last_index - last_time);
+            }
+        }
+        let durations = &mut self.durations;
+
+        let n_days = (n_equities as f64) / 1440.0; // Convert minutes to days
+        analysis.positions_held_per_day = durations.len() as f64 / n_days;
+        if !durations.is_empty() {
+            analysis.position_held_hours_mean =
+                durations.iter().sum::<usize>() as f64 / (durations.len() as f64 * 60.0);
+            analysis.position_held_hours_max = *durations.iter().max().unwrap() as f64 / 60.0;
+            durations.sort_unstable();
+            let mid = durations.len() / 2;
+            analysis.position_held_hours_median = if durations.len() % 2 == 0 {
+                (durations[mid - 1] + durations[mid]) as f64 / (2.0 * 60.0)
+            } else {
+                durations[mid] as f64 / 60.0
+            };
+        } else {
+            analysis.position_held_hours_mean = 0.0;
+            analysis.position_held_hours_max = 0.0;
+            analysis.position_held_hours_median = 0.0;
+        }
+        analysis.position_unchanged_hours_max = self.unchanged_duration_max as f64 / 60.0;
     }
+}
 
+/// Sets the metrics derived from the daily equity series: returns, risk ratios,
+/// drawdowns and equity curve shape.
+fn analyze_daily_equities(daily_eqs: &[f64], daily_eqs_mins: &[f64], analysis: &mut Analysis) {
     // Calculate daily percentage changes
     let daily_eqs_pct_change: Vec<f64> =
         daily_eqs.windows(2).map(|w| (w[1] - w[0]) / w[0]).collect();
@@ -1669,7 +2412,7 @@ fn analyze_backtest_basic(fills: &[Fill], equities: &Vec<f64>) -> Analysis {
         .collect();
 
     // Calculate ADG and standard metrics
-    let (gain, adg) = smoothed_terminal_geometric_gain_and_adg(&daily_eqs);
+    let (gain, adg) = smoothed_terminal_geometric_gain_and_adg(daily_eqs);
     let mdg = {
         let mut sorted_pct_change = daily_eqs_pct_change.clone();
         sorted_pct_change.sort_by(|a, b| {
@@ -1765,7 +2508,7 @@ fn analyze_backtest_basic(fills: &[Fill], equities: &Vec<f64>) -> Analysis {
     };
 
     // Calculate drawdowns
-    let drawdowns = calc_drawdowns(&daily_eqs_mins);
+    let drawdowns = calc_drawdowns(daily_eqs_mins);
     let drawdown_worst_mean_1pct = {
         let mut sorted_drawdowns = drawdowns.clone();
         sorted_drawdowns.sort_by(|a, b| {
@@ -1806,152 +2549,6 @@ fn analyze_backtest_basic(fills: &[Fill], equities: &Vec<f64>) -> Analysis {
         0.0
     };
 
-    // Calculate equity-balance differences
-    let mut bal_eq = Vec::with_capacity(equities.len());
-    let mut fill_iter = fills.iter().peekable();
-    let mut last_balance = fills[0].balance_usd_total;
-
-    for (i, &equity) in equities.iter().enumerate() {
-        while let Some(fill) = fill_iter.peek() {
-            if fill.index <= i {
-                last_balance = fill.balance_usd_total;
-                fill_iter.next();
-            } else {
-                break;
-            }
-        }
-        bal_eq.push((last_balance, equity));
-    }
-
-    // Calculate equity-balance differences with separate positive and negative tracking
-    let mut ebds_pos = Vec::new();
-    let mut ebds_neg = Vec::new();
-
-    for &(balance, equity) in bal_eq.iter() {
-        let ebd = (equity - balance) / balance;
-        if ebd > 0.0 {
-            ebds_pos.push(ebd);
-        } else if ebd < 0.0 {
-            ebds_neg.push(ebd);
-        }
-    }
-
-    let equity_balance_diff_pos_max = ebds_pos.iter().fold(0.0, |max, &x| f64::max(max, x));
-    let equity_balance_diff_pos_mean = if !ebds_pos.is_empty() {
-        ebds_pos.iter().sum::<f64>() / ebds_pos.len() as f64
-    } else {
-        0.0
-    };
-
-    let equity_balance_diff_neg_max = ebds_neg.iter().fold(0.0, |max, &x| f64::max(max, x.abs()));
-    let equity_balance_diff_neg_mean = if !ebds_neg.is_empty() {
-        ebds_neg.iter().map(|x| x.abs()).sum::<f64>() / ebds_neg.len() as f64
-    } else {
-        0.0
-    };
-
-    // Calculate profit factor
-    let (total_profit, total_loss) = fills.iter().fold((0.0, 0.0), |(profit, loss), fill| {
-        if fill.pnl > 0.0 {
-            (profit + fill.pnl, loss)
-        } else {
-            (profit, loss + fill.pnl.abs())
-        }
-    });
-    let loss_profit_ratio = if total_profit == 0.0 {
-        f64::INFINITY
-    } else {
-        total_loss / total_profit
-    };
-
-    // Calculate position durations and position_unchanged_hours_max
-    let mut positions_opened: HashMap<String, usize> = HashMap::new(); // Tracks position open time
-    let mut durations: Vec<usize> = Vec::new(); // Total position durations
-    let mut last_fill_time: HashMap<String, usize> = HashMap::new(); // Last fill time per position
-    let mut unchanged_durations: Vec<usize> = Vec::new(); // Durations of unchanged periods
-
-    for fill in fills {
-        let side = if fill.order_type.to_string().contains("long") {
-            "long"
-        } else {
-            "short"
-        };
-        let key = format!("{}_{}", fill.coin, side);
-
-        // Record the opening time if the position is new
-        if !positions_opened.contains_key(&key) {
-            positions_opened.insert(key.clone(), fill.index);
-            last_fill_time.insert(key.clone(), fill.index); // Initialize last fill time
-        }
-
-        // Calculate unchanged duration since the last fill
-        if let Some(&last_time) = last_fill_time.get(&key) {
-            let unchanged_duration = fill.index - last_time;
-            unchanged_durations.push(unchanged_duration);
-        }
-        // Update the last fill time
-        last_fill_time.insert(key.clone(), fill.index);
-
-        // If the position is fully closed, calculate total duration and reset
-        if fill.position_size == 0.0 {
-            if let Some(&start_idx) = positions_opened.get(&key) {
-                durations.push(fill.index - start_idx);
-                positions_opened.remove(&key);
-                last_fill_time.remove(&key); // Reset tracking
-            }
-        }
-    }
-
-    // Add unchanged durations and total durations for remaining open positions
-    let last_index = fills.last().map_or(0, |f| f.index);
-    for (key, &start_idx) in positions_opened.iter() {
-        durations.push(last_index - start_idx); // Total duration for open positions
-        if let Some(&last_time) = last_fill_time.get(key) {
-            unchanged_durations.push(last_index - last_time); // Unchanged duration till end
-        }
-    }
-
-    // Calculate duration statistics
-    let n_days = (equities.len() as f64) / 1440.0; // Convert minutes to days
-    let positions_held_per_day = durations.len() as f64 / n_days;
-
-    let position_held_hours_mean = if !durations.is_empty() {
-        durations.iter().sum::<usize>() as f64 / (durations.len() as f64 * 60.0)
-    } else {
-        0.0
-    };
-
-    let position_held_hours_max = if !durations.is_empty() {
-        *durations.iter().max().unwrap() as f64 / 60.0
-    } else {
-        0.0
-    };
-
-    let position_held_hours_median = if !durations.is_empty() {
-        let mut sorted_durations = durations.clone();
-        sorted_durations.sort_unstable();
-        let mid = sorted_durations.len() / 2;
-        if sorted_durations.len() % 2 == 0 {
-            (sorted_durations[mid - 1] + sorted_durations[mid]) as f64 / (2.0 * 60.0)
-        } else {
-            sorted_durations[mid] as f64 / 60.0
-        }
-    } else {
-        0.0
-    };
-
-    let position_unchanged_hours_max = if !unchanged_durations.is_empty() {
-        *unchanged_durations.iter().max().unwrap() as f64 / 60.0
-    } else {
-        0.0
-    };
-    let equity_choppiness = calc_equity_choppiness(&daily_eqs);
-    let equity_jerkiness = calc_equity_jerkiness(&daily_eqs);
-    let exponential_fit_error = calc_exponential_fit_error(&daily_eqs);
-
-    let volume_pct_per_day_avg = calc_avg_volume_pct_per_day(fills);
-
-    let mut analysis = Analysis::default();
     analysis.adg = adg;
     analysis.mdg = mdg;
     analysis.gain = gain;
@@ -1963,67 +2560,36 @@ fn analyze_backtest_basic(fills: &[Fill], equities: &Vec<f64>) -> Analysis {
     analysis.sterling_ratio = sterling_ratio;
     analysis.drawdown_worst = drawdown_worst;
     analysis.drawdown_worst_mean_1pct = drawdown_worst_mean_1pct;
-    analysis.equity_balance_diff_neg_max = equity_balance_diff_neg_max;
-    analysis.equity_balance_diff_neg_mean = equity_balance_diff_neg_mean;
-    analysis.equity_balance_diff_pos_max = equity_balance_diff_pos_max;
-    analysis.equity_balance_diff_pos_mean = equity_balance_diff_pos_mean;
-    analysis.loss_profit_ratio = loss_profit_ratio;
-    analysis.positions_held_per_day = positions_held_per_day;
-    analysis.position_held_hours_mean = position_held_hours_mean;
-    analysis.position_held_hours_max = position_held_hours_max;
-    analysis.position_held_hours_median = position_held_hours_median;
-    analysis.position_unchanged_hours_max = position_unchanged_hours_max;
-    analysis.equity_choppiness = equity_choppiness;
-    analysis.equity_jerkiness = equity_jerkiness;
-    analysis.exponential_fit_error = exponential_fit_error;
-    analysis.volume_pct_per_day_avg = volume_pct_per_day_avg;
+    analysis.equity_choppiness = calc_equity_choppiness(daily_eqs);
+    analysis.equity_jerkiness = calc_equity_jerkiness(daily_eqs);
+    analysis.exponential_fit_error = calc_exponential_fit_error(daily_eqs);
+}
 
+/// The metrics computed for every analysis window, i.e. those averaged into the
+/// `_w` metrics.
+fn analyze_window(daily: DailyEquities, totals: &FillTotals) -> Analysis {
+    let (daily_eqs, daily_eqs_mins) = daily.finish();
+    let mut analysis = Analysis::default();
+    analyze_daily_equities(&daily_eqs, &daily_eqs_mins, &mut analysis);
+    analysis.loss_profit_ratio = totals.loss_profit_ratio();
+    analysis.volume_pct_per_day_avg = totals.volume_pct_per_day_avg();
     analysis
 }
 
-pub fn analyze_backtest(fills: &[Fill], equities: &Vec<f64>) -> Analysis {
-    let mut analysis = analyze_backtest_basic(fills, equities);
-
-    if fills.len() <= 1 {
-        return analysis;
-    }
-
-    let n = equities.len();
-    let mut subset_analyses = Vec::with_capacity(10);
-    subset_analyses.push(analysis.clone());
-
-    for i in 1..10 {
-        // fraction of the data we want to keep:
-        //  i=1 => fraction = 0.5       => last half
-        //  i=2 => fraction = 0.3333    => last third
-        //  i=3 => fraction = 0.25      => last quarter
-        //  etc.
-        let fraction = 1.0 / (1.0 + i as f64);
-
-        // start index for slicing the 'last' fraction
-        let start_idx = (n as f64 - fraction * (n as f64)).round() as usize;
-
-        // slice from start_idx to the end
-        let subset_equities = &equities[start_idx..];
-        if subset_equities.len() == 0 {
-            break;
-        }
-
-        // filter fills that happened after or at start_idx
-        let subset_fills: Vec<Fill> = fills
-            .iter()
-            .filter(|fill| fill.index >= start_idx)
-            .cloned()
-            .collect();
-        if subset_fills.len() == 0 {
-            break;
-        }
-
-        let subset_analysis = analyze_backtest_basic(&subset_fills, &subset_equities.to_vec());
-        subset_analyses.push(subset_analysis);
-    }
+/// Start index of the equity subset `i` (1..10) used for the `_w` metrics: subset `i`
+/// covers the last `1 / (1 + i)` of the data.
+fn subset_start_idx(n_equities: usize, i: usize) -> usize {
+    // fraction of the data we want to keep:
+    //  i=1 => fraction = 0.5       => last half
+    //  i=2 => fraction = 0.3333    => last third
+    //  i=3 => fraction = 0.25      => last quarter
+    //  etc.
+    let fraction = 1.0 / (1.0 + i as f64);
+    (n_equities as f64 - fraction * (n_equities as f64)).round() as usize
+}
 
-    // Compute weighted metrics as the mean of subset analyses
+/// Sets the `_w` metrics as the mean over the full analysis and its subset analyses.
+fn set_weighted_metrics(analysis: &mut Analysis, subset_analyses: &[Analysis]) {
     analysis.adg_w = subset_analyses.iter().map(|a| a.adg).sum::<f64>() / 10.0;
     analysis.mdg_w = subset_analyses.iter().map(|a| a.mdg).sum::<f64>() / 10.0;
     analysis.sharpe_ratio_w = subset_analyses.iter().map(|a| a.sharpe_ratio).sum::<f64>() / 10.0;
@@ -2060,27 +2626,121 @@ pub fn analyze_backtest(fills: &[Fill], equities: &Vec<f64>) -> Analysis {
         .map(|a| a.volume_pct_per_day_avg)
         .sum::<f64>()
         / 10.0;
-    analysis
 }
 
-/// Returns (Analysis in USD, Analysis in BTC).
-/// If `balance.use_btc_collateral == false`, both are identical.
-pub fn analyze_backtest_pair(
-    fills: &[Fill],
-    equities: &Equities,
-    use_btc_collateral: bool,
-) -> (Analysis, Analysis) {
-    let analysis_usd = analyze_backtest(fills, &equities.usd);
-    if !use_btc_collateral {
-        return (analysis_usd.clone(), analysis_usd);
-    }
-    let mut btc_fills = fills.to_vec();
-    for fill in btc_fills.iter_mut() {
-        fill.balance_usd_total /= fill.btc_price; // Use actual BTC balance if available
-        fill.pnl = fill.pnl / fill.btc_price; // Convert PNL to BTC
-    }
-    let analysis_btc = analyze_backtest(&btc_fills, &equities.btc);
-    (analysis_usd, analysis_btc)
+/// Fill with balance and pnl converted to BTC, for the BTC denominated analysis.
+fn to_btc_fill(fill: &Fill) -> Fill {
+    let mut btc_fill = fill.clone();
+    btc_fill.balance_usd_total /= fill.btc_price; // Use actual BTC balance if available
+    btc_fill.pnl = fill.pnl / fill.btc_price; // Convert PNL to BTC
+    btc_fill
+}
+
+/// One window of the streaming analysis: the equities and fills from `start` onwards.
+struct AnalysisWindow {
+    start: usize,
+    daily: DailyEquities,
+    totals: FillTotals,
+}
+
+/// Computes the backtest analysis from fills and equities fed one at a time, without
+/// storing them. Equities must be fed in order, and the fills of
+/// a minute before that minute's equity, as `Backtest` does.
+///
+/// The full-range analysis and each subset analysis get their own window, since
+/// daily buckets are counted from each window's start.
+pub struct AnalysisAccumulator {
+    n_equities: usize,            // expected total number of equities
+    n_seen: usize,                // equities fed so far
+    windows: Vec<AnalysisWindow>, // full range first, then subsets by increasing start
+    equity_balance_diffs: EquityBalanceDiffs,
+    position_durations: PositionDurations,
+    last_balance: Option<f64>,  // balance after the latest fill
+    pending_equities: Vec<f64>, // equities before the first fill
+}
+
+impl AnalysisAccumulator {
+    pub fn new(n_equities: usize) -> Self {
+        let windows = (0..10)
+            .map(|i| AnalysisWindow {
+                start: if i == 0 {
+                    0
+                } else {
+                    subset_start_idx(n_equities, i)
+                },
+                daily: DailyEquities::default(),
+                totals: FillTotals::default(),
+            })
+            .collect();
+        AnalysisAccumulator {
+            n_equities,
+            n_seen: 0,
+            windows,
+            equity_balance_diffs: EquityBalanceDiffs::default(),
+            position_durations: PositionDurations::default(),
+            last_balance: None,
+            pending_equities: Vec::new(),
+        }
+    }
+
+    pub fn on_fill(&mut self, fill: &Fill) {
+        for window in self.windows.iter_mut() {
+            if fill.index < window.start {
+                break;
+            }
+            window.totals.add(fill);
+        }
+        self.position_durations.add(fill);
+        if self.last_balance.is_none() {
+            // equities before the first fill are compared with the first fill's balance
+            for equity in self.pending_equities.drain(..) {
+                self.equity_balance_diffs
+                    .add(fill.balance_usd_total, equity);
+            }
+        }
+        self.last_balance = Some(fill.balance_usd_total);
+    }
+
+    pub fn on_equity(&mut self, equity: f64) {
+        for window in self.windows.iter_mut() {
+            if self.n_seen < window.start {
+                break;
+            }
+            window.daily.push(equity);
+        }
+        match self.last_balance {
+            Some(balance) => self.equity_balance_diffs.add(balance, equity),
+            None => self.pending_equities.push(equity),
+        }
+        self.n_seen += 1;
+    }
+
+    pub fn finalize(self) -> Analysis {
+        debug_assert_eq!(self.n_seen, self.n_equities);
+        let mut windows = self.windows.into_iter();
+        let full = windows.next().unwrap();
+        if full.totals.n_fills <= 1 {
+            return Analysis::default();
+        }
+        let mut analysis = analyze_window(full.daily, &full.totals);
+        self.equity_balance_diffs.apply(&mut analysis);
+        self.position_durations.apply(self.n_seen, &mut analysis);
+
+        let mut subset_analyses = Vec::with_capacity(10);
+        subset_analyses.push(analysis.clone());
+        for window in windows {
+            if window.start >= self.n_seen || window.totals.n_fills == 0 {
+                break;
+            }
+            subset_analyses.push(if window.totals.n_fills <= 1 {
+                Analysis::default()
+            } else {
+                analyze_window(window.daily, &window.totals)
+            });
+        }
+        set_weighted_metrics(&mut analysis, &subset_analyses);
+        analysis
+    }
 }
 
 fn calc_drawdowns(equity_series: &[f64]) -> Vec<f64> {
@@ -2198,27 +2858,251 @@ pub fn smoothed_terminal_geometric_gain_and_adg(daily_eqs: &[f64]) -> (f64, f64)
     (gain, gain.powf(1.0 / n_days) - 1.0)
 }
 
-/// Calculates average volume per day as a percentage of balance.
-/// For each fill: abs(qty) * price / balance_at_fill
-pub fn calc_avg_volume_pct_per_day(fills: &[Fill]) -> f64 {
-    if fills.is_empty() {
-        return 0.0;
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    /// xorshift64; enough randomness for test data without a dependency
+    struct Rng(u64);
+
+    impl Rng {
+        fn next(&mut self) -> f64 {
+            self.0 ^= self.0 << 13;
+            self.0 ^= self.0 >> 7;
+            self.0 ^= self.0 << 17;
+            (self.0 >> 11) as f64 / (1u64 << 53) as f64
+        }
     }
 
-    // Use a HashMap to sum cost_pct per day
-    use std::collections::HashMap;
-    let mut daily_totals: HashMap<usize, f64> = HashMap::new();
+    /// Random candles with near-ties: every other coin is its neighbour with pairs of
+    /// candles swapped, so their window sums differ only by rounding. The last coins are
+    /// listed late and delisted early (volume -1, constant price), as in prepared hlcvs.
+    fn make_hlcvs(n_timesteps: usize, n_coins: usize, seed: u64) -> Array3<f64> {
+        let mut rng = Rng(seed);
+        let mut hlcvs = Array3::<f64>::zeros((n_timesteps, n_coins, 4));
+        for idx in 0..n_coins {
+            for k in 0..n_timesteps {
+                let close = 1.0 + rng.next() * 1e3;
+                hlcvs[[k, idx, HIGH]] = close * (1.0 + rng.next() * 0.01);
+                hlcvs[[k, idx, LOW]] = close * (1.0 - rng.next() * 0.01);
+                hlcvs[[k, idx, CLOSE]] = close;
+                hlcvs[[k, idx, VOLUME]] = rng.next() * 1e6;
+            }
+            if idx % 2 == 1 {
+                for k in (0..n_timesteps - 1).step_by(2) {
+                    for col in 0..4 {
+                        hlcvs[[k, idx, col]] = hlcvs[[k + 1, idx - 1, col]];
+                        hlcvs[[k + 1, idx, col]] = hlcvs[[k, idx - 1, col]];
+                    }
+                }
+            }
+        }
+        for idx in n_coins - 3..n_coins {
+            let (listed, delisted) = (n_timesteps / 3, n_timesteps * 2 / 3 + idx);
+            for k in (0..listed).chain(delisted..n_timesteps) {
+                for col in [HIGH, LOW, CLOSE] {
+                    hlcvs[[k, idx, col]] = 100.0;
+                }
+                hlcvs[[k, idx, VOLUME]] = -1.0;
+            }
+        }
+        hlcvs
+    }
 
-    for fill in fills {
-        let day = fill.index / 1440;
-        let cost_pct = (fill.fill_qty.abs() * fill.fill_price) / fill.balance_usd_total;
-        *daily_totals.entry(day).or_insert(0.0) += cost_pct;
+    fn ranked(sums: Vec<(f64, usize)>) -> Vec<usize> {
+        sums.into_iter().map(|(_, idx)| idx).collect()
     }
 
-    let total_days = daily_totals.len() as f64;
-    if total_days == 0.0 {
-        0.0
-    } else {
-        daily_totals.values().sum::<f64>() / total_days
+    #[test]
+    fn window_sum_rankings_match_direct_sums() {
+        let (n_timesteps, n_coins) = (6000, 12);
+        let hlcvs = make_hlcvs(n_timesteps, n_coins, 7);
+        let view = hlcvs.view();
+        let indexes = HlcvsIndexes::new(&view);
+        let mut rng = Rng(11);
+        let mut scratch = WindowSortScratch::default();
+        let mut n_inexact = 0;
+        for _ in 0..2000 {
+            let k = 1 + (rng.next() * (n_timesteps - 1) as f64) as usize;
+            let window = [0, 1, 2, 60, 1440, n_timesteps][(rng.next() * 6.0) as usize];
+            let start = k.saturating_sub(window);
+            let candidates: Vec<usize> = (0..n_coins).collect();
+
+            let direct_volume = |idx: usize| view.slice(s![start..k, idx, VOLUME]).sum();
+            let mut expected: Vec<(f64, usize)> = candidates
+                .iter()
+                .map(|&idx| (direct_volume(idx), idx))
+                .collect();
+            expected.sort_unstable_by(|a, b| b.0.partial_cmp(&a.0).unwrap_or(Ordering::Equal));
+            let (mut sums, errs): (Vec<(f64, usize)>, Vec<f64>) = candidates
+                .iter()
+                .map(|&idx| {
+                    let (sum, err) = indexes.volume_sum(start, k, idx);
+                    ((sum, idx), err)
+                })
+                .unzip();
+            n_inexact += sums
+                .iter()
+                .filter(|&&(sum, idx)| sum != direct_volume(idx))
+                .count();
+            sort_window_sums_desc(&mut sums, &errs, &mut scratch, direct_volume);
+            assert_eq!(
+                ranked(sums),
+                ranked(expected),
+                "volume k={} start={}",
+                k,
+                start
+            );
+
+            let direct_noisiness = |idx: usize| direct_noisiness_sum(&view, start, k, idx);
+            let mut expected: Vec<(f64, usize)> = candidates
+                .iter()
+                .map(|&idx| (direct_noisiness(idx), idx))
+                .collect();
+            expected.sort_unstable_by(|a, b| b.0.partial_cmp(&a.0).unwrap_or(Ordering::Equal));
+            let (mut sums, errs): (Vec<(f64, usize)>, Vec<f64>) = candidates
+                .iter()
+                .map(|&idx| {
+                    let (sum, err) = indexes.noisiness_sum(start, k, idx);
+                    ((sum, idx), err)
+                })
+                .unzip();
+            sort_window_sums_desc(&mut sums, &errs, &mut scratch, direct_noisiness);
+            assert_eq!(
+                ranked(sums),
+                ranked(expected),
+                "noisiness k={} start={}",
+                k,
+                start
+            );
+        }
+        // the data must actually exercise rounding differences
+        assert!(n_inexact > 0);
+    }
+
+    /// The volume ranking before prefix sums kept a running window sum per coin, adding
+    /// the minutes entering the window and subtracting those leaving it. Its rounding
+    /// drift decided the order of coins with equal window volume; exact window sums may
+    /// order those differently, and only those.
+    #[test]
+    fn window_sum_rankings_match_rolling_sums_but_at_ties() {
+        let (n_timesteps, n_coins) = (6000, 12);
+        let hlcvs = make_hlcvs(n_timesteps, n_coins, 7);
+        let view = hlcvs.view();
+        let indexes = HlcvsIndexes::new(&view);
+        let mut scratch = WindowSortScratch::default();
+        let direct_volume =
+            |start: usize, end: usize, idx: usize| view.slice(s![start..end, idx, VOLUME]).sum();
+        let mut n_tie_swaps = 0;
+        for &window in &[60, 1440] {
+            let mut rolling = vec![0.0; n_coins];
+            let mut prev_k = 0;
+            for k in 1..n_timesteps {
+                let start_k = k.saturating_sub(window);
+                if k > window && k - prev_k < window {
+                    let safe_start = prev_k.saturating_sub(window);
+                    for idx in 0..n_coins {
+                        rolling[idx] -= direct_volume(safe_start, start_k, idx);
+                        rolling[idx] += direct_volume(prev_k, k, idx);
+                    }
+                } else {
+                    for idx in 0..n_coins {
+                        rolling[idx] = direct_volume(start_k, k, idx);
+                    }
+                }
+                prev_k = k;
+                let mut expected: Vec<(f64, usize)> = rolling
+                    .iter()
+                    .enumerate()
+                    .map(|(idx, &sum)| (sum, idx))
+                    .collect();
+                expected.sort_unstable_by(|a, b| b.0.partial_cmp(&a.0).unwrap_or(Ordering::Equal));
+
+                let (mut sums, errs): (Vec<(f64, usize)>, Vec<f64>) = (0..n_coins)
+                    .map(|idx| {
+                        let (sum, err) = indexes.volume_sum(start_k, k, idx);
+                        ((sum, idx), err)
+                    })
+                    .unzip();
+                sort_window_sums_desc(&mut sums, &errs, &mut scratch, |idx| {
+                    direct_volume(start_k, k, idx)
+                });
+                for (&(_, a), &(_, b)) in expected.iter().zip(sums.iter()) {
+                    if a != b {
+                        let (sum_a, sum_b) =
+                            (direct_volume(start_k, k, a), direct_volume(start_k, k, b));
+                        assert!(
+                            (sum_a - sum_b).abs() <= 1e-12 * sum_a.abs().max(sum_b.abs()),
+                            "k={} window={}: coins {} and {} swapped",
+                            k,
+                            window,
+                            a,
+                            b
+                        );
+                        n_tie_swaps += 1;
+                    }
+                }
+            }
+        }
+        // the data must actually exercise ties
+        assert!(n_tie_swaps > 0);
+    }
+
+    #[test]
+    fn window_sum_errors_bound_the_difference() {
+        let hlcvs = make_hlcvs(5000, 8, 3);
+        let view = hlcvs.view();
+        let indexes = HlcvsIndexes::new(&view);
+        for idx in 0..8 {
+            for &(start, end) in &[(0, 5000), (0, 1), (100, 1540), (1000, 1001), (4000, 5000)] {
+                let (sum, err) = indexes.volume_sum(start, end, idx);
+                assert!((sum - view.slice(s![start..end, idx, VOLUME]).sum()).abs() <= err);
+                let (sum, err) = indexes.noisiness_sum(start, end, idx);
+                assert!((sum - direct_noisiness_sum(&view, start, end, idx)).abs() <= err);
+            }
+        }
+        // before listing, sums of -1 volumes and 0 noisiness are exact
+        assert_eq!(indexes.volume_sum(10, 1000, 7), (-990.0, 0.0));
+        assert_eq!(indexes.noisiness_sum(10, 1000, 7), (0.0, 0.0));
+        assert_eq!(indexes.first_valid_timestamp(7), 5000 / 3);
+    }
+
+    #[test]
+    fn mapped_indexes_match_owned() {
+        let hlcvs = make_hlcvs(3000, 5, 5);
+        let view = hlcvs.view();
+        let dir = std::env::temp_dir();
+        let hlcvs_path = dir.join(format!("pb_hlcvs_test_{}.bin", std::process::id()));
+        let indexes_path = dir.join(format!("pb_hlcvs_test_{}.indexes", std::process::id()));
+        let (hlcvs_path, indexes_path) = (
+            hlcvs_path.to_str().unwrap().to_string(),
+            indexes_path.to_str().unwrap().to_string(),
+        );
+        fs::write(&hlcvs_path, b"hlcvs stand-in").unwrap();
+        let stamp = HlcvsStamp::of_file(&hlcvs_path, view.dim(), 0).unwrap();
+        HlcvsIndexes::write_file(&view, &stamp, &indexes_path).unwrap();
+        let mapped = HlcvsIndexes::open_file(&indexes_path, &stamp).unwrap();
+        let owned = HlcvsIndexes::new(&view);
+        assert!(mapped.is_mapped());
+        for idx in 0..5 {
+            assert_eq!(
+                mapped.last_valid_timestamp(idx),
+                owned.last_valid_timestamp(idx)
+            );
+            for &(start, end) in &[(0, 3000), (17, 1457), (2999, 3000)] {
+                assert_eq!(
+                    mapped.volume_sum(start, end, idx),
+                    owned.volume_sum(start, end, idx)
+                );
+                assert_eq!(
+                    mapped.noisiness_sum(start, end, idx),
+                    owned.noisiness_sum(start, end, idx)
+                );
+            }
+        }
+        let other = HlcvsStamp::of_file(&hlcvs_path, view.dim(), 8).unwrap();
+        assert!(HlcvsIndexes::open_file(&indexes_path, &other).is_err());
+        fs::remove_file(&hlcvs_path).unwrap();
+        fs::remove_file(&indexes_path).unwrap();
     }
 }
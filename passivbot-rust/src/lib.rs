@@ -39,6 +39,9 @@ fn passivbot_rust(m: &Bound<'_, PyModule>) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(calc_closes_long_py, m)?)?;
     m.add_function(wrap_pyfunction!(calc_closes_short_py, m)?)?;
     m.add_function(wrap_pyfunction!(run_backtest, m)?)?;
+    m.add_function(wrap_pyfunction!(run_backtests_batch, m)?)?;
+    m.add_function(wrap_pyfunction!(build_hlcvs_indexes, m)?)?;
+    m.add_function(wrap_pyfunction!(order_type_names, m)?)?;
     m.add_function(wrap_pyfunction!(calc_auto_unstuck_allowance, m)?)?;
     m.add_function(wrap_pyfunction!(hysteresis_rounding, m)?)?;
     m.add_function(wrap_pyfunction!(calc_pprice_diff_int, m)?)?;
@@ -1,4 +1,4 @@
-use crate::backtest::{analyze_backtest_pair, Backtest};
+use crate::backtest::{Backtest, HlcvsIndexes, HlcvsStamp};
 use crate::closes::{
     calc_closes_long, calc_closes_short, calc_next_close_long, calc_next_close_short,
 };
@@ -6,24 +6,161 @@ use crate::entries::{
     calc_entries_long, calc_entries_short, calc_next_entry_long, calc_next_entry_short,
 };
 use crate::types::{
-    Analysis, BacktestParams, BotParams, BotParamsPair, EMABands, Equities, ExchangeParams, Order,
-    OrderBook, Position, StateParams, TrailingPriceBundle,
+    Analysis, BacktestParams, BotParams, BotParamsPair, EMABands, Equities, ExchangeParams, Fill,
+    Order, OrderBook, OrderType, Position, StateParams, TrailingPriceBundle,
+};
+use memmap::{Mmap, MmapOptions};
+use ndarray::{
+    Array1, Array2, Array3, Array4, ArrayBase, ArrayD, ArrayView, ArrayView1, ArrayView3,
+    ShapeBuilder,
 };
-use memmap::MmapOptions;
-use ndarray::{Array1, Array2, Array3, Array4, ArrayBase, ArrayD, ArrayView, ShapeBuilder};
 use numpy::{
     IntoPyArray, PyArray1, PyArray2, PyArray3, PyArray4, PyReadonlyArray2, PyReadonlyArray3,
     PyReadonlyArray4,
 };
-use pyo3::exceptions::PyValueError;
+use pyo3::exceptions::{PyRuntimeError, PyValueError};
 use pyo3::prelude::*;
 use pyo3::types::{PyDict, PyList};
 use pyo3::wrap_pyfunction;
-use serde::Serialize;
+use rayon::prelude::*;
+use std::collections::HashMap;
+use std::sync::{Arc, Mutex, OnceLock};
 use std::{fs::File, slice};
 
+/// Most recently used HLCV indexes (last is newest), keyed by shared memory file path
+/// and indexes file, each with the stamp of the data it was built from so a re-created
+/// file is never matched against stale indexes. Repeated evaluations on the same file
+/// (e.g. optimizer workers) get the indexes once per process.
+static HLCVS_INDEXES_CACHE: OnceLock<Mutex<Vec<(String, HlcvsStamp, Arc<HlcvsIndexes>)>>> =
+    OnceLock::new();
+const HLCVS_INDEXES_CACHE_SIZE: usize = 4;
+
+/// Rayon pools of `run_backtests_batch` by number of threads, built on first use and
+/// kept for the life of the process, so repeated calls do not spawn new threads.
+static THREAD_POOLS: OnceLock<Mutex<HashMap<usize, Arc<rayon::ThreadPool>>>> = OnceLock::new();
+
+/// Rayon pool of `n_threads` threads, or None for the global pool (all cores).
+fn get_thread_pool(n_threads: Option<usize>) -> PyResult<Option<Arc<rayon::ThreadPool>>> {
+    let n = match n_threads {
+        Some(n) => n,
+        None => return Ok(None),
+    };
+    let mut pools = THREAD_POOLS
+        .get_or_init(|| Mutex::new(HashMap::new()))
+        .lock()
+        .unwrap_or_else(|e| e.into_inner());
+    if let Some(pool) = pools.get(&n) {
+        return Ok(Some(Arc::clone(pool)));
+    }
+    let pool = rayon::ThreadPoolBuilder::new()
+        .num_threads(n)
+        .build()
+        .map_err(|e| PyRuntimeError::new_err(format!("Unable to build thread pool: {}", e)))?;
+    let pool = Arc::new(pool);
+    pools.insert(n, Arc::clone(&pool));
+    Ok(Some(pool))
+}
+
+/// Indexes of the HLCV data in `shared_memory_file`: mapped from `indexes_file` (see
+/// `build_hlcvs_indexes`) if given, else built in memory. Indexes built in memory take
+/// two (n_timesteps + 1) x n_coins f64 tables, so at most one such entry is cached.
+fn get_hlcvs_indexes(
+    shared_memory_file: &str,
+    hlcvs_offset: usize,
+    hlcvs: &ArrayView3<f64>,
+    indexes_file: Option<&str>,
+) -> PyResult<Arc<HlcvsIndexes>> {
+    let stamp = HlcvsStamp::of_file(shared_memory_file, hlcvs.dim(), hlcvs_offset)
+        .map_err(|e| PyValueError::new_err(format!("Unable to stat shared memory file: {}", e)))?;
+    let key = format!("{}|{}", shared_memory_file, indexes_file.unwrap_or(""));
+    let mut cache = HLCVS_INDEXES_CACHE
+        .get_or_init(|| Mutex::new(Vec::new()))
+        .lock()
+        .unwrap_or_else(|e| e.into_inner());
+    if let Some(pos) = cache.iter().position(|(k, s, _)| *k == key && *s == stamp) {
+        let entry = cache.remove(pos);
+        let indexes = Arc::clone(&entry.2);
+        cache.push(entry);
+        return Ok(indexes);
+    }
+    cache.retain(|(k, _, _)| *k != key);
+    let indexes = match indexes_file {
+        Some(path) => HlcvsIndexes::open_file(path, &stamp).map_err(|e| {
+            PyValueError::new_err(format!("Unable to map HLCV indexes file: {}", e))
+        })?,
+        None => {
+            cache.retain(|(_, _, indexes)| indexes.is_mapped());
+            HlcvsIndexes::new(hlcvs)
+        }
+    };
+    let indexes = Arc::new(indexes);
+    cache.push((key, stamp, Arc::clone(&indexes)));
+    if cache.len() > HLCVS_INDEXES_CACHE_SIZE {
+        cache.remove(0);
+    }
+    Ok(indexes)
+}
+
+/// Builds the indexes of the HLCV data in `shared_memory_file` (prefix sums of noisiness
+/// and volume, valid candle bounds) into `indexes_file`, for `run_backtest(...,
+/// hlcvs_indexes_file=indexes_file)`. Every process passing that file maps it read-only,
+/// so the indexes exist once instead of once per process. Returns False without writing
+/// if `indexes_file` already holds the indexes of this data.
+#[pyfunction]
+#[pyo3(signature = (shared_memory_file, hlcvs_shape, hlcvs_dtype, indexes_file, hlcvs_offset=0))]
+pub fn build_hlcvs_indexes(
+    py: Python<'_>,
+    shared_memory_file: &str,
+    hlcvs_shape: (usize, usize, usize),
+    hlcvs_dtype: &str,
+    indexes_file: &str,
+    hlcvs_offset: usize,
+) -> PyResult<bool> {
+    let hlcvs_mmap = map_hlcvs(shared_memory_file, hlcvs_shape, hlcvs_dtype, hlcvs_offset)?;
+    let stamp = HlcvsStamp::of_file(shared_memory_file, hlcvs_shape, hlcvs_offset)
+        .map_err(|e| PyValueError::new_err(format!("Unable to stat shared memory file: {}", e)))?;
+    if HlcvsIndexes::file_matches(indexes_file, &stamp) {
+        return Ok(false);
+    }
+    let hlcvs: ArrayView3<f64> =
+        unsafe { ArrayView::from_shape_ptr(hlcvs_shape, hlcvs_mmap.as_ptr() as *const f64) };
+    py.allow_threads(|| HlcvsIndexes::write_file(&hlcvs, &stamp, indexes_file))
+        .map_err(|e| PyValueError::new_err(format!("Unable to write HLCV indexes file: {}", e)))?;
+    Ok(true)
+}
+
+/// Runs a single backtest. Fills are returned as a dict of typed numpy columns (see
+/// `fills_to_py_dict`); with `skip_fills=True` the columns are left empty, which saves
+/// the conversion when only the analyses are needed.
+///
+/// Equities are returned for every `backtest_params_dict["equity_resolution_minutes"]`th
+/// minute (default 1, i.e. every minute); the analyses always use every minute.
+///
+/// With `analysis_only=True` the analyses are computed while the backtest runs and
+/// neither fills nor equities are kept; both are returned empty.
+///
+/// `hlcvs_offset` is the byte offset of the HLCV data in `shared_memory_file`, so an
+/// uncompressed `.npy` file can be mapped directly, skipping its header.
+///
+/// `hlcvs_indexes_file` is a file written by `build_hlcvs_indexes` for the same data;
+/// without it the indexes are built in memory.
 #[pyfunction]
+#[pyo3(signature = (
+    shared_memory_file,
+    hlcvs_shape,
+    hlcvs_dtype,
+    btc_usd_shared_memory_file,
+    btc_usd_dtype,
+    bot_params_pair_dict,
+    exchange_params_list,
+    backtest_params_dict,
+    skip_fills=false,
+    analysis_only=false,
+    hlcvs_offset=0,
+    hlcvs_indexes_file=None
+))]
 pub fn run_backtest(
+    py: Python<'_>,
     shared_memory_file: &str,           // Existing HLCV shared memory file
     hlcvs_shape: (usize, usize, usize), // Shape of HLCV data
     hlcvs_dtype: &str,                  // Dtype of HLCV data
@@ -32,141 +169,346 @@ pub fn run_backtest(
     bot_params_pair_dict: &PyDict,      // Bot parameters
     exchange_params_list: &PyAny,       // Exchange parameters
     backtest_params_dict: &PyDict,      // Backtest parameters
+    skip_fills: bool,                   // Return empty fill columns
+    analysis_only: bool,                // Return only the analyses
+    hlcvs_offset: usize,                // Byte offset of the HLCV data in its file
+    hlcvs_indexes_file: Option<&str>,   // Indexes from build_hlcvs_indexes
 ) -> PyResult<(
-    Py<PyArray2<PyObject>>,
+    Py<PyDict>,
     Py<PyArray1<f64>>,
     Py<PyArray1<f64>>,
     Py<PyDict>,
     Py<PyDict>,
 )> {
-    // Open and map the HLCV shared memory file
-    let file = File::open(shared_memory_file)
-        .map_err(|e| PyValueError::new_err(format!("Unable to open shared memory file: {}", e)))?;
-    let mmap = unsafe {
-        MmapOptions::new()
-            .map(&file)
-            .map_err(|e| PyValueError::new_err(format!("Unable to map HLCV file: {}", e)))?
-    };
-    let hlcvs_rust = unsafe {
-        match hlcvs_dtype {
-            "<f8" => ArrayView::from_shape_ptr(hlcvs_shape, mmap.as_ptr() as *const f64),
-            _ => return Err(PyValueError::new_err("Unsupported dtype for HLCV data")),
-        }
-    };
-
-    // Open and map the BTC/USD shared memory file
-    let btc_usd_file = File::open(btc_usd_shared_memory_file).map_err(|e| {
-        PyValueError::new_err(format!("Unable to open BTC/USD shared memory file: {}", e))
-    })?;
-    let btc_usd_mmap = unsafe {
-        MmapOptions::new()
-            .map(&btc_usd_file)
-            .map_err(|e| PyValueError::new_err(format!("Unable to map BTC/USD file: {}", e)))?
-    };
-    let n_timesteps = hlcvs_shape.0; // Number of timesteps from HLCV shape
-    let btc_usd_rust = unsafe {
-        match btc_usd_dtype {
-            "<f8" => ArrayView::from_shape_ptr((n_timesteps,), btc_usd_mmap.as_ptr() as *const f64),
-            _ => return Err(PyValueError::new_err("Unsupported dtype for BTC/USD data")),
-        }
-    };
-
-    // Ensure BTC/USD data length matches HLCV timesteps
-    if btc_usd_rust.len() != n_timesteps {
-        return Err(PyValueError::new_err(format!(
-            "BTC/USD data length ({}) does not match HLCV timesteps ({})",
-            btc_usd_rust.len(),
-            n_timesteps
-        )));
-    }
+    let mapped = MappedHlcvs::open(
+        shared_memory_file,
+        hlcvs_shape,
+        hlcvs_dtype,
+        hlcvs_offset,
+        btc_usd_shared_memory_file,
+        btc_usd_dtype,
+    )?;
+    let hlcvs_rust = mapped.hlcvs();
+    let btc_usd_rust = mapped.btc_usd_prices();
 
     // Prepare bot, exchange, and backtest parameters
     let bot_params_pair = bot_params_pair_from_dict(bot_params_pair_dict)?;
-    let exchange_params = {
-        let mut params_vec = Vec::new();
-        if let Ok(py_list) = exchange_params_list.downcast::<PyList>() {
-            for py_dict in py_list.iter() {
-                if let Ok(dict) = py_dict.downcast::<PyDict>() {
-                    let params = exchange_params_from_dict(dict)?;
-                    params_vec.push(params);
-                } else {
-                    return Err(PyValueError::new_err(
-                        "Unsupported data type in exchange_params_list",
-                    ));
-                }
-            }
-        } else {
-            return Err(PyValueError::new_err(
-                "Unsupported data type for exchange_params_list",
-            ));
-        }
-        params_vec
-    };
+    let exchange_params = exchange_params_list_from_py(exchange_params_list)?;
 
     let backtest_params = backtest_params_from_dict(backtest_params_dict)?;
+    let indexes = get_hlcvs_indexes(
+        shared_memory_file,
+        hlcvs_offset,
+        &hlcvs_rust,
+        hlcvs_indexes_file,
+    )?;
     let mut backtest = Backtest::new(
         &hlcvs_rust,
         &btc_usd_rust,
+        &indexes,
         bot_params_pair,
         exchange_params,
         &backtest_params,
     );
 
-    // Run the backtest and process results
-    Python::with_gil(|py| {
-        let (fills, equities) = backtest.run();
-        let (analysis_usd, analysis_btc) =
-            analyze_backtest_pair(&fills, &equities, backtest.balance.use_btc_collateral);
-
-        // Create a dictionary to store analysis results using a more concise approach
-        let py_analysis_usd = struct_to_py_dict(py, &analysis_usd)?;
-        let py_analysis_btc = struct_to_py_dict(py, &analysis_btc)?;
-        let mut py_fills = Array2::from_elem((fills.len(), 13), py.None());
-        for (i, fill) in fills.iter().enumerate() {
-            py_fills[(i, 0)] = fill.index.into_py(py);
-            py_fills[(i, 1)] = <String as Clone>::clone(&fill.coin).into_py(py);
-            py_fills[(i, 2)] = fill.pnl.into_py(py);
-            py_fills[(i, 3)] = fill.fee_paid.into_py(py);
-            py_fills[(i, 4)] = fill.balance_usd_total.into_py(py);
-            py_fills[(i, 5)] = fill.balance_btc.into_py(py);
-            py_fills[(i, 6)] = fill.balance_usd.into_py(py);
-            py_fills[(i, 7)] = fill.btc_price.into_py(py);
-            py_fills[(i, 8)] = fill.fill_qty.into_py(py);
-            py_fills[(i, 9)] = fill.fill_price.into_py(py);
-            py_fills[(i, 10)] = fill.position_size.into_py(py);
-            py_fills[(i, 11)] = fill.position_price.into_py(py);
-            py_fills[(i, 12)] = fill.order_type.to_string().into_py(py);
+    // Run the backtest with the GIL released; it is only needed to build the outputs
+    let (fills, equities, analysis_usd, analysis_btc) = py.allow_threads(|| {
+        if analysis_only {
+            let (analysis_usd, analysis_btc) = backtest.run_analysis_only();
+            return (Vec::new(), Equities::default(), analysis_usd, analysis_btc);
         }
+        backtest.run()
+    });
 
-        let py_equities_usd = Array1::from_vec(equities.usd).into_pyarray(py).to_owned();
-        let py_equities_btc = Array1::from_vec(equities.btc).into_pyarray(py).to_owned();
-        Ok((
-            py_fills.into_pyarray(py).to_owned(),
-            py_equities_usd,
-            py_equities_btc,
-            py_analysis_usd.into(),
-            py_analysis_btc.into(),
-        ))
-    })
+    // Build the outputs: analyses as dicts, fills as typed columns
+    let py_analysis_usd = analysis_to_py_dict(py, &analysis_usd)?;
+    let py_analysis_btc = analysis_to_py_dict(py, &analysis_btc)?;
+    let returned_fills: &[Fill] = if skip_fills { &[] } else { &fills };
+    let py_fills = fills_to_py_dict(py, returned_fills)?;
+    let py_equities_usd = Array1::from_vec(equities.usd).into_pyarray(py).to_owned();
+    let py_equities_btc = Array1::from_vec(equities.btc).into_pyarray(py).to_owned();
+    Ok((
+        py_fills.into(),
+        py_equities_usd,
+        py_equities_btc,
+        py_analysis_usd.into(),
+        py_analysis_btc.into(),
+    ))
 }
 
-fn struct_to_py_dict<'py, T: Serialize + ?Sized>(
-    py: Python<'py>,
-    obj: &T,
-) -> PyResult<&'py PyDict> {
-    // Convert struct to JSON string
-    let json_str = serde_json::to_string(obj).map_err(|e| {
-        PyErr::new::<pyo3::exceptions::PyValueError, _>(format!("JSON serialization error: {}", e))
-    })?;
-
-    // Use Python's json module to convert to a Python dict
-    let json = py.import("json")?;
-    let py_obj = json.call_method1("loads", (json_str,))?;
-
-    // Convert to PyDict
-    py_obj.downcast::<PyDict>().map_err(|_| {
-        PyErr::new::<pyo3::exceptions::PyTypeError, _>("Failed to convert to Python dict")
-    })
+/// Converts fills into a dict of numpy columns named like the fills DataFrame. `coin`
+/// holds indexes into the backtest's coin list and `type` holds `OrderType` codes,
+/// which `order_type_names()` maps back to names.
+fn fills_to_py_dict<'py>(py: Python<'py>, fills: &[Fill]) -> PyResult<&'py PyDict> {
+    let dict = PyDict::new(py);
+    let int_column = |f: fn(&Fill) -> i64| -> Vec<i64> { fills.iter().map(f).collect() };
+    let float_column = |f: fn(&Fill) -> f64| -> Vec<f64> { fills.iter().map(f).collect() };
+    dict.set_item("minute", int_column(|x| x.index as i64).into_pyarray(py))?;
+    dict.set_item("coin", int_column(|x| x.coin_index as i64).into_pyarray(py))?;
+    dict.set_item("pnl", float_column(|x| x.pnl).into_pyarray(py))?;
+    dict.set_item("fee_paid", float_column(|x| x.fee_paid).into_pyarray(py))?;
+    dict.set_item(
+        "balance",
+        float_column(|x| x.balance_usd_total).into_pyarray(py),
+    )?;
+    dict.set_item(
+        "balance_btc",
+        float_column(|x| x.balance_btc).into_pyarray(py),
+    )?;
+    dict.set_item(
+        "balance_usd",
+        float_column(|x| x.balance_usd).into_pyarray(py),
+    )?;
+    dict.set_item("btc_price", float_column(|x| x.btc_price).into_pyarray(py))?;
+    dict.set_item("qty", float_column(|x| x.fill_qty).into_pyarray(py))?;
+    dict.set_item("price", float_column(|x| x.fill_price).into_pyarray(py))?;
+    dict.set_item("psize", float_column(|x| x.position_size).into_pyarray(py))?;
+    dict.set_item(
+        "pprice",
+        float_column(|x| x.position_price).into_pyarray(py),
+    )?;
+    let order_type_codes: Vec<u8> = fills.iter().map(|x| x.order_type.code()).collect();
+    dict.set_item("type", order_type_codes.into_pyarray(py))?;
+    Ok(dict)
+}
+
+/// Order type names indexed by the codes in the `type` column of run_backtest's fills.
+#[pyfunction]
+pub fn order_type_names() -> Vec<String> {
+    OrderType::ALL.iter().map(|x| x.to_string()).collect()
+}
+
+/// Runs one backtest per entry of `bot_params_pair_dicts` on the same HLCV data and
+/// returns a list of `(analysis_usd, analysis_btc)` tuples in input order.
+///
+/// The data files are mapped once and the HLCV indexes are shared by all runs. The
+/// backtests run on a cached Rayon pool of `n_threads` threads (the global pool, all
+/// cores, if None) with the GIL released; fills and equities are not stored (see
+/// `Backtest::run_analysis_only`). `hlcvs_offset` and `hlcvs_indexes_file` are as in `run_backtest`.
+#[pyfunction]
+#[pyo3(signature = (
+    shared_memory_file,
+    hlcvs_shape,
+    hlcvs_dtype,
+    btc_usd_shared_memory_file,
+    btc_usd_dtype,
+    bot_params_pair_dicts,
+    exchange_params_list,
+    backtest_params_dict,
+    n_threads=None,
+    hlcvs_offset=0,
+    hlcvs_indexes_file=None
+))]
+pub fn run_backtests_batch(
+    py: Python<'_>,
+    shared_memory_file: &str,
+    hlcvs_shape: (usize, usize, usize),
+    hlcvs_dtype: &str,
+    btc_usd_shared_memory_file: &str,
+    btc_usd_dtype: &str,
+    bot_params_pair_dicts: &PyList, // One bot params pair per backtest
+    exchange_params_list: &PyAny,
+    backtest_params_dict: &PyDict,
+    n_threads: Option<usize>,
+    hlcvs_offset: usize,
+    hlcvs_indexes_file: Option<&str>,
+) -> PyResult<Vec<(Py<PyDict>, Py<PyDict>)>> {
+    let mapped = MappedHlcvs::open(
+        shared_memory_file,
+        hlcvs_shape,
+        hlcvs_dtype,
+        hlcvs_offset,
+        btc_usd_shared_memory_file,
+        btc_usd_dtype,
+    )?;
+    let hlcvs_rust = mapped.hlcvs();
+    let btc_usd_rust = mapped.btc_usd_prices();
+
+    // Parse all parameters while holding the GIL
+    let bot_params_pairs = bot_params_pair_dicts
+        .iter()
+        .map(|item| {
+            let dict = item.downcast::<PyDict>().map_err(|_| {
+                PyValueError::new_err("Unsupported data type in bot_params_pair_dicts")
+            })?;
+            bot_params_pair_from_dict(dict)
+        })
+        .collect::<PyResult<Vec<BotParamsPair>>>()?;
+    let exchange_params = exchange_params_list_from_py(exchange_params_list)?;
+    let backtest_params = backtest_params_from_dict(backtest_params_dict)?;
+    let indexes = get_hlcvs_indexes(
+        shared_memory_file,
+        hlcvs_offset,
+        &hlcvs_rust,
+        hlcvs_indexes_file,
+    )?;
+
+    let pool = get_thread_pool(n_threads)?;
+    let run = || -> Vec<(Analysis, Analysis)> {
+        bot_params_pairs
+            .par_iter()
+            .map(|bot_params_pair| {
+                let mut backtest = Backtest::new(
+                    &hlcvs_rust,
+                    &btc_usd_rust,
+                    &indexes,
+                    bot_params_pair.clone(),
+                    exchange_params.clone(),
+                    &backtest_params,
+                );
+                backtest.run_analysis_only()
+            })
+            .collect()
+    };
+    let analyses = py.allow_threads(|| match pool {
+        Some(pool) => pool.install(run),
+        None => run(),
+    });
+
+    analyses
+        .iter()
+        .map(|(analysis_usd, analysis_btc)| {
+            Ok((
+                analysis_to_py_dict(py, analysis_usd)?.into(),
+                analysis_to_py_dict(py, analysis_btc)?.into(),
+            ))
+        })
+        .collect()
+}
+
+/// Maps the HLCV data of `shared_memory_file` read-only. `hlcvs_offset` is the byte
+/// offset of the data in the file, e.g. the header length of an uncompressed `.npy` file.
+fn map_hlcvs(
+    shared_memory_file: &str,
+    hlcvs_shape: (usize, usize, usize),
+    hlcvs_dtype: &str,
+    hlcvs_offset: usize,
+) -> PyResult<Mmap> {
+    if hlcvs_dtype != "<f8" {
+        return Err(PyValueError::new_err("Unsupported dtype for HLCV data"));
+    }
+    if hlcvs_offset % std::mem::align_of::<f64>() != 0 {
+        return Err(PyValueError::new_err(format!(
+            "HLCV data offset {} is not aligned to f64",
+            hlcvs_offset
+        )));
+    }
+    let file = File::open(shared_memory_file)
+        .map_err(|e| PyValueError::new_err(format!("Unable to open shared memory file: {}", e)))?;
+    let hlcvs_mmap = unsafe {
+        MmapOptions::new()
+            .offset(hlcvs_offset as u64)
+            .map(&file)
+            .map_err(|e| PyValueError::new_err(format!("Unable to map HLCV file: {}", e)))?
+    };
+    let hlcvs_len = hlcvs_shape.0 * hlcvs_shape.1 * hlcvs_shape.2;
+    if hlcvs_mmap.len() / std::mem::size_of::<f64>() < hlcvs_len {
+        return Err(PyValueError::new_err(format!(
+            "HLCV file is smaller than shape {:?}",
+            hlcvs_shape
+        )));
+    }
+    Ok(hlcvs_mmap)
+}
+
+/// Memory maps of the HLCV and BTC/USD shared memory files.
+struct MappedHlcvs {
+    hlcvs_mmap: Mmap,
+    hlcvs_shape: (usize, usize, usize),
+    btc_usd_mmap: Mmap,
+}
+
+impl MappedHlcvs {
+    /// `hlcvs_offset` is the byte offset of the HLCV data in `shared_memory_file`, e.g.
+    /// the header length of an uncompressed `.npy` file.
+    fn open(
+        shared_memory_file: &str,
+        hlcvs_shape: (usize, usize, usize),
+        hlcvs_dtype: &str,
+        hlcvs_offset: usize,
+        btc_usd_shared_memory_file: &str,
+        btc_usd_dtype: &str,
+    ) -> PyResult<Self> {
+        if btc_usd_dtype != "<f8" {
+            return Err(PyValueError::new_err("Unsupported dtype for BTC/USD data"));
+        }
+        let hlcvs_mmap = map_hlcvs(shared_memory_file, hlcvs_shape, hlcvs_dtype, hlcvs_offset)?;
+
+        // Open and map the BTC/USD shared memory file
+        let btc_usd_file = File::open(btc_usd_shared_memory_file).map_err(|e| {
+            PyValueError::new_err(format!("Unable to open BTC/USD shared memory file: {}", e))
+        })?;
+        let btc_usd_mmap = unsafe {
+            MmapOptions::new()
+                .map(&btc_usd_file)
+                .map_err(|e| PyValueError::new_err(format!("Unable to map BTC/USD file: {}", e)))?
+        };
+
+        // Ensure BTC/USD data length matches HLCV timesteps
+        let n_timesteps = hlcvs_shape.0;
+        let btc_usd_len = btc_usd_mmap.len() / std::mem::size_of::<f64>();
+        if btc_usd_len < n_timesteps {
+            return Err(PyValueError::new_err(format!(
+                "BTC/USD data length ({}) does not match HLCV timesteps ({})",
+                btc_usd_len, n_timesteps
+            )));
+        }
+        Ok(MappedHlcvs {
+            hlcvs_mmap,
+            hlcvs_shape,
+            btc_usd_mmap,
+        })
+    }
+
+    fn hlcvs(&self) -> ArrayView3<'_, f64> {
+        unsafe {
+            ArrayView::from_shape_ptr(self.hlcvs_shape, self.hlcvs_mmap.as_ptr() as *const f64)
+        }
+    }
+
+    fn btc_usd_prices(&self) -> ArrayView1<'_, f64> {
+        unsafe {
+            ArrayView::from_shape_ptr(
+                (self.hlcvs_shape.0,),
+                self.btc_usd_mmap.as_ptr() as *const f64,
+            )
+        }
+    }
+}
+
+fn exchange_params_list_from_py(exchange_params_list: &PyAny) -> PyResult<Vec<ExchangeParams>> {
+    let mut params_vec = Vec::new();
+    if let Ok(py_list) = exchange_params_list.downcast::<PyList>() {
+        for py_dict in py_list.iter() {
+            if let Ok(dict) = py_dict.downcast::<PyDict>() {
+                let params = exchange_params_from_dict(dict)?;
+                params_vec.push(params);
+            } else {
+                return Err(PyValueError::new_err(
+                    "Unsupported data type in exchange_params_list",
+                ));
+            }
+        }
+    } else {
+        return Err(PyValueError::new_err(
+            "Unsupported data type for exchange_params_list",
+        ));
+    }
+    Ok(params_vec)
+}
+
+/// Builds the analysis dict directly. Non-finite values become None, as they did when
+/// analyses were converted through JSON.
+fn analysis_to_py_dict<'py>(py: Python<'py>, analysis: &Analysis) -> PyResult<&'py PyDict> {
+    let dict = PyDict::new(py);
+    for (name, value) in analysis.fields() {
+        if value.is_finite() {
+            dict.set_item(name, value)?;
+        } else {
+            dict.set_item(name, py.None())?;
+        }
+    }
+    Ok(dict)
 }
 
 fn backtest_params_from_dict(dict: &PyDict) -> PyResult<BacktestParams> {
@@ -174,6 +516,7 @@ fn backtest_params_from_dict(dict: &PyDict) -> PyResult<BacktestParams> {
         starting_balance: extract_value(dict, "starting_balance").unwrap_or_default(),
         maker_fee: extract_value(dict, "maker_fee").unwrap_or_default(),
         coins: extract_value(dict, "coins").unwrap_or_default(),
+        equity_resolution_minutes: extract_value(dict, "equity_resolution_minutes").unwrap_or(1),
     })
 }
 
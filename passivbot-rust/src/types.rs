@@ -2,7 +2,7 @@ use serde::Serialize;
 use std::collections::HashMap;
 use std::fmt;
 
-#[derive(Debug)]
+#[derive(Debug, Clone)]
 pub struct ExchangeParams {
     pub qty_step: f64,
     pub price_step: f64,
@@ -28,6 +28,7 @@ pub struct BacktestParams {
     pub starting_balance: f64,
     pub maker_fee: f64,
     pub coins: Vec<String>,
+    pub equity_resolution_minutes: usize, // keep every nth minute's equity; analysis uses all
 }
 
 #[derive(Default, Debug, Clone, Copy)]
@@ -176,6 +177,57 @@ pub enum OrderType {
     Empty,
 }
 
+impl OrderType {
+    /// All order types, ordered by their numeric code.
+    pub const ALL: [OrderType; 23] = [
+        OrderType::EntryInitialNormalLong,
+        OrderType::EntryInitialPartialLong,
+        OrderType::EntryTrailingNormalLong,
+        OrderType::EntryTrailingCroppedLong,
+        OrderType::EntryGridNormalLong,
+        OrderType::EntryGridCroppedLong,
+        OrderType::EntryGridInflatedLong,
+        OrderType::CloseGridLong,
+        OrderType::CloseTrailingLong,
+        OrderType::CloseUnstuckLong,
+        OrderType::CloseAutoReduceLong,
+        OrderType::EntryInitialNormalShort,
+        OrderType::EntryInitialPartialShort,
+        OrderType::EntryTrailingNormalShort,
+        OrderType::EntryTrailingCroppedShort,
+        OrderType::EntryGridNormalShort,
+        OrderType::EntryGridCroppedShort,
+        OrderType::EntryGridInflatedShort,
+        OrderType::CloseGridShort,
+        OrderType::CloseTrailingShort,
+        OrderType::CloseUnstuckShort,
+        OrderType::CloseAutoReduceShort,
+        OrderType::Empty,
+    ];
+
+    /// Compact numeric code; `OrderType::ALL[code]` maps it back.
+    pub fn code(&self) -> u8 {
+        *self as u8
+    }
+
+    pub fn is_long(&self) -> bool {
+        matches!(
+            self,
+            OrderType::EntryInitialNormalLong
+                | OrderType::EntryInitialPartialLong
+                | OrderType::EntryTrailingNormalLong
+                | OrderType::EntryTrailingCroppedLong
+                | OrderType::EntryGridNormalLong
+                | OrderType::EntryGridCroppedLong
+                | OrderType::EntryGridInflatedLong
+                | OrderType::CloseGridLong
+                | OrderType::CloseTrailingLong
+                | OrderType::CloseUnstuckLong
+                | OrderType::CloseAutoReduceLong
+        )
+    }
+}
+
 impl fmt::Display for OrderType {
     fn fmt(&self, f: &mut fmt::Formatter) -> fmt::Result {
         match self {
@@ -225,7 +277,7 @@ pub struct Equities {
 #[derive(Debug, Clone)]
 pub struct Fill {
     pub index: usize,
-    pub coin: String,
+    pub coin_index: usize,
     pub pnl: f64,
     pub fee_paid: f64,
     pub balance_usd_total: f64,
@@ -239,50 +291,64 @@ pub struct Fill {
     pub order_type: OrderType,
 }
 
-#[derive(Debug, Clone, Serialize)]
-pub struct Analysis {
-    pub adg: f64,
-    pub mdg: f64,
-    pub gain: f64,
-    pub sharpe_ratio: f64,
-    pub sortino_ratio: f64,
-    pub omega_ratio: f64,
-    pub expected_shortfall_1pct: f64,
-    pub calmar_ratio: f64,
-    pub sterling_ratio: f64,
-    pub drawdown_worst: f64,
-    pub drawdown_worst_mean_1pct: f64,
-    pub equity_balance_diff_neg_max: f64,
-    pub equity_balance_diff_neg_mean: f64,
-    pub equity_balance_diff_pos_max: f64,
-    pub equity_balance_diff_pos_mean: f64,
-    pub loss_profit_ratio: f64,
-
-    pub equity_choppiness: f64,
-    pub equity_jerkiness: f64,
-    pub exponential_fit_error: f64,
-    pub equity_choppiness_w: f64,
-    pub equity_jerkiness_w: f64,
-    pub exponential_fit_error_w: f64,
-
-    pub positions_held_per_day: f64,
-    pub position_held_hours_mean: f64,
-    pub position_held_hours_max: f64,
-    pub position_held_hours_median: f64,
-    pub position_unchanged_hours_max: f64,
+/// Defines `Analysis` together with `Analysis::fields`, so the field list used to build
+/// Python dicts cannot drift from the struct.
+macro_rules! analysis_struct {
+    ($($field:ident),* $(,)?) => {
+        #[derive(Debug, Clone, Serialize)]
+        pub struct Analysis {
+            $(pub $field: f64,)*
+        }
 
-    pub adg_w: f64,
-    pub mdg_w: f64,
-    pub sharpe_ratio_w: f64,
-    pub sortino_ratio_w: f64,
-    pub omega_ratio_w: f64,
-    pub calmar_ratio_w: f64,
-    pub sterling_ratio_w: f64,
-    pub loss_profit_ratio_w: f64,
-    pub volume_pct_per_day_avg: f64,
-    pub volume_pct_per_day_avg_w: f64,
+        impl Analysis {
+            /// (name, value) of every field, in declaration order.
+            pub fn fields(&self) -> Vec<(&'static str, f64)> {
+                vec![$((stringify!($field), self.$field)),*]
+            }
+        }
+    };
 }
 
+analysis_struct!(
+    adg,
+    mdg,
+    gain,
+    sharpe_ratio,
+    sortino_ratio,
+    omega_ratio,
+    expected_shortfall_1pct,
+    calmar_ratio,
+    sterling_ratio,
+    drawdown_worst,
+    drawdown_worst_mean_1pct,
+    equity_balance_diff_neg_max,
+    equity_balance_diff_neg_mean,
+    equity_balance_diff_pos_max,
+    equity_balance_diff_pos_mean,
+    loss_profit_ratio,
+    equity_choppiness,
+    equity_jerkiness,
+    exponential_fit_error,
+    equity_choppiness_w,
+    equity_jerkiness_w,
+    exponential_fit_error_w,
+    positions_held_per_day,
+    position_held_hours_mean,
+    position_held_hours_max,
+    position_held_hours_median,
+    position_unchanged_hours_max,
+    adg_w,
+    mdg_w,
+    sharpe_ratio_w,
+    sortino_ratio_w,
+    omega_ratio_w,
+    calmar_ratio_w,
+    sterling_ratio_w,
+    loss_profit_ratio_w,
+    volume_pct_per_day_avg,
+    volume_pct_per_day_avg_w,
+);
+
 impl Default for Analysis {
     fn default() -> Self {
         Analysis {
@@ -24,12 +24,19 @@ from procedures import (
 from pure_funcs import (
     get_template_live_config,
     ts_to_date,
+    ts_to_date_utc,
+    date_to_ts,
     sort_dict_keys,
     calc_hash,
 )
 import pprint
 from copy import deepcopy
-from downloader import prepare_hlcvs, prepare_hlcvs_combined, add_all_eligible_coins_to_config
+from downloader import (
+    prepare_hlcvs,
+    prepare_hlcvs_combined,
+    prepare_hlcvs_extension,
+    add_all_eligible_coins_to_config,
+)
 from pathlib import Path
 from plotting import plot_fills_forager
 from collections import defaultdict
@@ -37,10 +44,12 @@ import matplotlib.pyplot as plt
 import logging
 from main import manage_rust_compilation
 import gzip
+import shutil
 import traceback
 
 import tempfile
 from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 logging.basicConfig(
     format="%(asctime)s %(levelname)-8s %(message)s",
@@ -78,24 +87,29 @@ def oj(*x):
     return os.path.join(*x)
 
 
-def process_forager_fills(fills, coins, hlcvs, equities, equities_btc):
+def process_forager_fills(fills, coins, hlcvs, equities, equities_btc, equity_resolution_minutes=1):
+    # fills are numpy columns; coin and type are integer codes
     fdf = pd.DataFrame(
-        fills,
-        columns=[
-            "minute",
-            "coin",
-            "pnl",
-            "fee_paid",
-            "balance",
-            "balance_btc",
-            "balance_usd",
-            "btc_price",
-            "qty",
-            "price",
-            "psize",
-            "pprice",
-            "type",
-        ],
+        {
+            "minute": fills["minute"],
+            "coin": pd.Categorical.from_codes(fills["coin"], categories=coins),
+            **{
+                k: fills[k]
+                for k in [
+                    "pnl",
+                    "fee_paid",
+                    "balance",
+                    "balance_btc",
+                    "balance_usd",
+                    "btc_price",
+                    "qty",
+                    "price",
+                    "psize",
+                    "pprice",
+                ]
+            },
+            "type": pd.Categorical.from_codes(fills["type"], categories=pbr.order_type_names()),
+        }
     )
     analysis_appendix = {}
     pnls = {}
@@ -110,12 +124,14 @@ def process_forager_fills(fills, coins, hlcvs, equities, equities_btc):
         pnls[pside] = profit + loss
         analysis_appendix[f"loss_profit_ratio_{pside}"] = abs(loss / profit)
 
-    div_by = 60  # save some disk space. Set to 1 to dump uncropped
+    # equities are already sampled every equity_resolution_minutes by the backtester
+    div_by = max(1, int(equity_resolution_minutes))
     analysis_appendix["pnl_ratio_long_short"] = pnls["long"] / (pnls["long"] + pnls["short"])
     bdf = fdf.groupby((fdf.minute // div_by) * div_by).balance.last()
     bbdf = fdf.groupby((fdf.minute // div_by) * div_by).balance_btc.last()
-    edf = pd.Series(equities).iloc[::div_by]
-    ebdf = pd.Series(equities_btc).iloc[::div_by]
+    equity_minutes = np.arange(len(equities)) * div_by
+    edf = pd.Series(np.asarray(equities), index=equity_minutes)
+    ebdf = pd.Series(np.asarray(equities_btc), index=equity_minutes)
     nidx = np.arange(min(bdf.index[0], edf.index[0]), max(bdf.index[-1], edf.index[-1]), div_by)
     bal_eq = (
         pd.DataFrame(
@@ -166,7 +182,11 @@ def check_keys(dict0, dict1):
     return check_nested(dict0, dict1)
 
 
-def get_cache_hash(config, exchange):
+def get_cache_hash(config, exchange, include_end_date=True):
+    """
+    Hash identifying cached hlcvs. Without end_date, it identifies caches that may be
+    extended to a later end_date.
+    """
     to_hash = {
         "coins": config["live"]["approved_coins"],
         "end_date": format_end_date(config["backtest"]["end_date"]),
@@ -176,20 +196,101 @@ def get_cache_hash(config, exchange):
         "gap_tolerance_ohlcvs_minutes": config["backtest"]["gap_tolerance_ohlcvs_minutes"],
         "config_has_mimic_backtest_1m_delay": "mimic_backtest_1m_delay" in config["live"],
     }
+    if not include_end_date:
+        del to_hash["end_date"]
     return calc_hash(to_hash)
 
 
-def load_coins_hlcvs_from_cache(config, exchange):
+CACHE_META_FILENAME = "cache_meta.json"
+
+
+def load_cache_meta(cache_dir):
+    fpath = Path(cache_dir) / CACHE_META_FILENAME
+    if os.path.exists(fpath):
+        return json.load(open(fpath))
+    return None
+
+
+def dump_cache_meta(cache_dir, meta):
+    fpath = Path(cache_dir) / CACHE_META_FILENAME
+    tmp = fpath.with_name(fpath.name + ".tmp")
+    json.dump(meta, open(tmp, "w"))
+    os.replace(tmp, fpath)
+
+
+def make_cache_meta(config, exchange, hlcvs, btc_usd_prices, timestamps, hlcvs_parts=()):
+    """
+    Metadata needed to extend cached hlcvs to a later end_date without reading them:
+    the last timestamp and the last row of hlcvs and BTC/USD prices.
+    """
+    return {
+        "base_hash": get_cache_hash(config, exchange, include_end_date=False),
+        "last_timestamp": float(timestamps[-1]),
+        "n_timesteps": int(hlcvs.shape[0]),
+        "last_hlcvs": np.asarray(hlcvs[-1]).tolist(),
+        "last_btc_usd_price": float(btc_usd_prices[-1]),
+        "hlcvs_parts": list(hlcvs_parts),
+    }
+
+
+def append_rows_to_npy(fpath, rows, n_rows):
+    """
+    Append rows to a C-ordered .npy file holding n_rows rows, rewriting the shape in its
+    header in place. Anything past n_rows rows is overwritten. Returns False, without
+    modifying the file, if the header has no room for the new shape.
+    """
+    with open(fpath, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            header_len_size = 2
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            header_len_size = 4
+        data_offset = f.tell()
+        if fortran_order or dtype != rows.dtype or shape[1:] != rows.shape[1:]:
+            raise ValueError(f"{fpath} is incompatible with the rows to append")
+        new_shape = (n_rows + len(rows),) + tuple(shape[1:])
+        header = repr(
+            {
+                "descr": np.lib.format.dtype_to_descr(dtype),
+                "fortran_order": False,
+                "shape": new_shape,
+            }
+        )
+        header_space = data_offset - np.lib.format.MAGIC_LEN - header_len_size
+        if len(header) + 1 > header_space:
+            return False
+        row_bytes = dtype.itemsize * int(np.prod(shape[1:]))
+        f.seek(data_offset + n_rows * row_bytes)
+        f.write(np.ascontiguousarray(rows).tobytes())
+        f.truncate()
+        f.flush()
+        # header padded with spaces and terminated by a newline, as written by numpy
+        f.seek(np.lib.format.MAGIC_LEN + header_len_size)
+        f.write((header + " " * (header_space - len(header) - 1) + "\n").encode("latin1"))
+    return True
+
+
+def load_coins_hlcvs_from_cache(config, exchange, mmap_hlcvs=False):
     cache_hash = get_cache_hash(config, exchange)
     cache_dir = Path("caches") / "hlcvs_data" / cache_hash[:16]
     if os.path.exists(cache_dir):
         coins = json.load(open(cache_dir / "coins.json"))
         mss = json.load(open(cache_dir / "market_specific_settings.json"))
+        meta = load_cache_meta(cache_dir)
         if config["backtest"]["compress_cache"]:
             fname = cache_dir / "hlcvs.npy.gz"
             logging.info(f"{exchange} Attempting to load hlcvs data from cache {fname}...")
             with gzip.open(fname, "rb") as f:
                 hlcvs = np.load(f)
+            if meta and meta.get("hlcvs_parts"):
+                # minutes appended by extend_coins_hlcvs_cache
+                parts = [hlcvs]
+                for part in meta["hlcvs_parts"]:
+                    with gzip.open(cache_dir / part, "rb") as f:
+                        parts.append(np.load(f))
+                hlcvs = np.concatenate(parts)
             btc_fname = cache_dir / "btc_usd_prices.npy.gz"
             if os.path.exists(btc_fname):
                 logging.info(
@@ -204,7 +305,8 @@ def load_coins_hlcvs_from_cache(config, exchange):
         else:
             fname = cache_dir / "hlcvs.npy"
             logging.info(f"{exchange} Attempting to load hlcvs data from cache {fname}...")
-            hlcvs = np.load(fname)
+            # with mmap_hlcvs, the data stays on disk and is paged in on access
+            hlcvs = np.load(fname, mmap_mode="r" if mmap_hlcvs else None)
             btc_fname = cache_dir / "btc_usd_prices.npy"
             if os.path.exists(btc_fname):
                 logging.info(
@@ -215,12 +317,170 @@ def load_coins_hlcvs_from_cache(config, exchange):
                 # Backward compatibility: default to 1.0s if not cached
                 logging.info(f"{exchange} No BTC/USD prices in cache, using default array of 1.0s")
                 btc_usd_prices = np.ones(hlcvs.shape[0], dtype=np.float64)
+        if meta:
+            # rows past n_timesteps are from an interrupted cache extension
+            hlcvs = hlcvs[: meta["n_timesteps"]]
+            btc_usd_prices = btc_usd_prices[: meta["n_timesteps"]]
         results_path = oj(config["backtest"]["base_dir"], exchange, "")
         return cache_dir, coins, hlcvs, mss, results_path, btc_usd_prices
     return None
 
 
-def save_coins_hlcvs_to_cache(config, coins, hlcvs, exchange, mss, btc_usd_prices):
+def find_extendable_hlcvs_cache(config, exchange):
+    """
+    Cache dir and metadata of the cached hlcvs with the latest end that match config in
+    everything but an earlier end_date, or None.
+    """
+    base_hash = get_cache_hash(config, exchange, include_end_date=False)
+    end_ts = date_to_ts(format_end_date(config["backtest"]["end_date"]))
+    hlcvs_fname = "hlcvs.npy.gz" if config["backtest"]["compress_cache"] else "hlcvs.npy"
+    best = None
+    root = Path("caches") / "hlcvs_data"
+    if not os.path.exists(root):
+        return None
+    for dirname in os.listdir(root):
+        if ".tmp" in dirname:
+            continue  # being built by extend_coins_hlcvs_cache
+        cache_dir = root / dirname
+        try:
+            meta = load_cache_meta(cache_dir)
+        except Exception:
+            continue
+        if (
+            meta is None
+            or meta["base_hash"] != base_hash
+            or meta["last_timestamp"] >= end_ts
+            or not all(
+                os.path.exists(cache_dir / x)
+                for x in [hlcvs_fname, "coins.json", "market_specific_settings.json"]
+            )
+        ):
+            continue
+        if best is None or meta["last_timestamp"] > best[1]["last_timestamp"]:
+            best = (cache_dir, meta)
+    return best
+
+
+def clone_file(src, dst):
+    """
+    Copy src to dst as a reflink where the filesystem supports it (btrfs, xfs), else as
+    a plain copy. dst never shares data with src once written to.
+    """
+    try:
+        import fcntl
+
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), 0x40049409, fsrc.fileno())  # FICLONE
+        return
+    except Exception:
+        pass
+    shutil.copyfile(src, dst)
+
+
+def link_or_copy_file(src, dst):
+    """Hardlink src to dst, falling back to a copy. Only for files never modified in place."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+async def extend_coins_hlcvs_cache(config, exchange, mmap_hlcvs=False):
+    """
+    Extend the latest cached hlcvs matching config except for an earlier end_date (e.g.
+    end_date "now" on a later day) by appending only the new minutes, written as a new
+    cache under this config's cache dir. The source cache is left untouched, as other
+    processes may have it mapped or pin its end_date. Coins, their exchanges and volume
+    scaling are kept from the cached run. Returns the same as load_coins_hlcvs_from_cache,
+    or None.
+    """
+    found = find_extendable_hlcvs_cache(config, exchange)
+    if found is None:
+        return None
+    src_dir, meta = found
+    coins = json.load(open(src_dir / "coins.json"))
+    mss = json.load(open(src_dir / "market_specific_settings.json"))
+    logging.info(
+        f"{exchange} Extending cached hlcvs {src_dir} from {ts_to_date_utc(meta['last_timestamp'])}"
+    )
+    extension = await prepare_hlcvs_extension(
+        config,
+        exchange,
+        coins,
+        mss,
+        meta["last_timestamp"],
+        np.array(meta["last_hlcvs"]),
+        meta["last_btc_usd_price"],
+    )
+    if extension is None:
+        return None
+    timestamps, new_hlcvs, new_btc_usd_prices = extension
+    n_timesteps = meta["n_timesteps"]
+
+    cache_dir = Path("caches") / "hlcvs_data" / get_cache_hash(config, exchange)[:16]
+    # built beside the final dir and renamed into place once complete
+    tmp_dir = cache_dir.with_name(f"{cache_dir.name}.tmp{os.getpid()}")
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+    try:
+        for fname in ["coins.json", "market_specific_settings.json"]:
+            shutil.copyfile(src_dir / fname, tmp_dir / fname)
+        if config["backtest"]["compress_cache"]:
+            # compressed files are never modified once written, so they are shared by
+            # hardlink; new minutes go to a separate part and nothing is recompressed
+            for fname in ["hlcvs.npy.gz"] + meta["hlcvs_parts"]:
+                link_or_copy_file(src_dir / fname, tmp_dir / fname)
+            part = f"hlcvs_part_{len(meta['hlcvs_parts']) + 1:04d}.npy.gz"
+            with gzip.open(tmp_dir / part, "wb", compresslevel=1) as f:
+                np.save(f, new_hlcvs)
+            with gzip.open(src_dir / "btc_usd_prices.npy.gz", "rb") as f:
+                btc_usd_prices = np.load(f)[:n_timesteps]
+            with gzip.open(tmp_dir / "btc_usd_prices.npy.gz", "wb", compresslevel=1) as f:
+                np.save(f, np.concatenate([btc_usd_prices, new_btc_usd_prices]))
+            meta["hlcvs_parts"].append(part)
+        else:
+            for fname, rows in [
+                ("btc_usd_prices.npy", new_btc_usd_prices),
+                ("hlcvs.npy", new_hlcvs),
+            ]:
+                fpath = tmp_dir / fname
+                clone_file(src_dir / fname, fpath)
+                if not append_rows_to_npy(fpath, rows, n_timesteps):
+                    # no room in the header for the new shape
+                    data = np.load(src_dir / fname, mmap_mode="r")[:n_timesteps]
+                    out = np.lib.format.open_memmap(
+                        fpath,
+                        mode="w+",
+                        dtype=data.dtype,
+                        shape=(n_timesteps + len(rows),) + rows.shape[1:],
+                    )
+                    out[:n_timesteps] = data
+                    out[n_timesteps:] = rows
+                    out.flush()
+                    del out, data
+
+        meta["last_timestamp"] = float(timestamps[-1])
+        meta["n_timesteps"] = n_timesteps + len(timestamps)
+        meta["last_hlcvs"] = new_hlcvs[-1].tolist()
+        meta["last_btc_usd_price"] = float(new_btc_usd_prices[-1])
+        dump_cache_meta(tmp_dir, meta)
+
+        if os.path.exists(cache_dir):
+            # left over from an unfinished build for this config
+            shutil.rmtree(cache_dir)
+        os.replace(tmp_dir, cache_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    logging.info(
+        f"{exchange} Appended {len(timestamps)} minutes to cached hlcvs {src_dir}, "
+        f"saved as {cache_dir}"
+    )
+    return load_coins_hlcvs_from_cache(config, exchange, mmap_hlcvs=mmap_hlcvs)
+
+
+def save_coins_hlcvs_to_cache(config, coins, hlcvs, exchange, mss, btc_usd_prices, timestamps=None):
     cache_hash = get_cache_hash(config, exchange)
     cache_dir = Path("caches") / "hlcvs_data" / cache_hash[:16]
     cache_dir.mkdir(parents=True, exist_ok=True)
@@ -251,8 +511,11 @@ def save_coins_hlcvs_to_cache(config, coins, hlcvs, exchange, mss, btc_usd_price
         )
     else:
         fpath = cache_dir / "hlcvs.npy"
-        logging.info(f"Attempting to save hlcvs data to cache {fpath}...")
-        np.save(fpath, hlcvs)
+        if isinstance(hlcvs, np.memmap) and os.path.samefile(hlcvs.filename, fpath):
+            logging.info(f"hlcvs data was built directly in cache {fpath}")
+        else:
+            logging.info(f"Attempting to save hlcvs data to cache {fpath}...")
+            np.save(fpath, hlcvs)
         btc_fpath = cache_dir / "btc_usd_prices.npy"
         logging.info(f"Attempting to save BTC/USD prices to cache {btc_fpath}...")
         np.save(btc_fpath, btc_usd_prices)
@@ -262,15 +525,19 @@ def save_coins_hlcvs_to_cache(config, coins, hlcvs, exchange, mss, btc_usd_price
         f"{uncompressed_size/(1024**3):.2f} GB uncompressed, "
         f"{line}"
     )
+    if timestamps is not None:
+        dump_cache_meta(
+            cache_dir, make_cache_meta(config, exchange, hlcvs, btc_usd_prices, timestamps)
+        )
     logging.info(f"Seconds to dump cache: {(utc_ms() - sts) / 1000:.4f}")
     return cache_dir
 
 
-async def prepare_hlcvs_mss(config, exchange):
+async def prepare_hlcvs_mss(config, exchange, mmap_hlcvs=False):
     results_path = oj(config["backtest"]["base_dir"], exchange, "")
     try:
         sts = utc_ms()
-        result = load_coins_hlcvs_from_cache(config, exchange)
+        result = load_coins_hlcvs_from_cache(config, exchange, mmap_hlcvs=mmap_hlcvs)
         if result:
             logging.info(f"Seconds to load cache: {(utc_ms() - sts) / 1000:.4f}")
             cache_dir, coins, hlcvs, mss, results_path, btc_usd_prices = result
@@ -278,14 +545,39 @@ async def prepare_hlcvs_mss(config, exchange):
             return coins, hlcvs, mss, results_path, cache_dir, btc_usd_prices
     except Exception as e:
         logging.info(f"Unable to load hlcvs data from cache: {e}. Fetching...")
+    try:
+        sts = utc_ms()
+        result = await extend_coins_hlcvs_cache(config, exchange, mmap_hlcvs=mmap_hlcvs)
+        if result:
+            logging.info(f"Seconds to extend cache: {(utc_ms() - sts) / 1000:.4f}")
+            cache_dir, coins, hlcvs, mss, results_path, btc_usd_prices = result
+            return coins, hlcvs, mss, results_path, cache_dir, btc_usd_prices
+    except Exception as e:
+        logging.info(f"Unable to extend cached hlcvs data: {e}. Fetching...")
+        traceback.print_exc()
+    hlcvs_path = None
+    if config["backtest"].get("stream_hlcvs", False):
+        if config["backtest"]["compress_cache"]:
+            logging.info(f"stream_hlcvs requires compress_cache: false. Building hlcvs in RAM")
+        else:
+            # build hlcvs coin by coin directly into the uncompressed cache file
+            cache_dir = Path("caches") / "hlcvs_data" / get_cache_hash(config, exchange)[:16]
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            hlcvs_path = cache_dir / "hlcvs.npy"
     if exchange == "combined":
-        mss, timestamps, hlcvs, btc_usd_prices = await prepare_hlcvs_combined(config)
+        mss, timestamps, hlcvs, btc_usd_prices = await prepare_hlcvs_combined(
+            config, hlcvs_path=hlcvs_path
+        )
     else:
-        mss, timestamps, hlcvs, btc_usd_prices = await prepare_hlcvs(config, exchange)
+        mss, timestamps, hlcvs, btc_usd_prices = await prepare_hlcvs(
+            config, exchange, hlcvs_path=hlcvs_path
+        )
     coins = sorted(mss)
     logging.info(f"Finished preparing hlcvs data for {exchange}. Shape: {hlcvs.shape}")
     try:
-        cache_dir = save_coins_hlcvs_to_cache(config, coins, hlcvs, exchange, mss, btc_usd_prices)
+        cache_dir = save_coins_hlcvs_to_cache(
+            config, coins, hlcvs, exchange, mss, btc_usd_prices, timestamps=timestamps
+        )
     except Exception as e:
         logging.error(f"Failed to save hlcvs to cache: {e}")
         traceback.print_exc()
@@ -312,6 +604,7 @@ def prep_backtest_args(config, mss, exchange, exchange_params=None, backtest_par
             "maker_fee": mss[coins[0]]["maker"],
             "coins": coins,
             "use_btc_collateral": config["backtest"].get("use_btc_collateral", False),
+            "equity_resolution_minutes": config["backtest"].get("equity_resolution_minutes", 60),
         }
     return bot_params, exchange_params, backtest_params
 
@@ -389,7 +682,12 @@ def post_process(
     equities = pd.Series(equities)
     equities_btc = pd.Series(equities_btc)
     fdf, analysis_py, bal_eq = process_forager_fills(
-        fills, config["backtest"]["coins"][exchange], hlcvs, equities, equities_btc
+        fills,
+        config["backtest"]["coins"][exchange],
+        hlcvs,
+        equities,
+        equities_btc,
+        config["backtest"].get("equity_resolution_minutes", 60),
     )
     for k in analysis_py:
         if k not in analysis:
@@ -515,13 +813,22 @@ async def main():
         tasks = {}
         for exchange in config["backtest"]["exchanges"]:
             tasks[exchange] = asyncio.create_task(prepare_hlcvs_mss(configs[exchange], exchange))
+        prepared = {}
         for exchange in tasks:
             coins, hlcvs, mss, results_path, cache_dir, btc_usd_prices = await tasks[exchange]
             configs[exchange]["backtest"]["coins"][exchange] = coins
             configs[exchange]["backtest"]["cache_dir"][exchange] = str(cache_dir)
-            fills, equities, equities_btc, analysis = run_backtest(
-                hlcvs, mss, configs[exchange], exchange, btc_usd_prices
-            )
+            prepared[exchange] = (hlcvs, mss, results_path, btc_usd_prices)
+        # pbr.run_backtest releases the GIL, so exchanges are backtested concurrently
+        with ThreadPoolExecutor(max_workers=max(1, len(prepared))) as executor:
+            futures = {
+                exchange: executor.submit(
+                    run_backtest, hlcvs, mss, configs[exchange], exchange, btc_usd_prices
+                )
+                for exchange, (hlcvs, mss, results_path, btc_usd_prices) in prepared.items()
+            }
+        for exchange, (hlcvs, mss, results_path, btc_usd_prices) in prepared.items():
+            fills, equities, equities_btc, analysis = futures[exchange].result()
             post_process(
                 configs[exchange],
                 hlcvs,
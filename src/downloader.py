@@ -1,22 +1,20 @@
 import argparse
 import asyncio
+import copy
 import datetime
 import gzip
 import json
 import logging
 import inspect
 import os
-import shutil
 import sys
 import traceback
 import zipfile
 from collections import deque
 from functools import wraps
 from io import BytesIO
-from pathlib import Path
 from time import time
 from typing import List, Dict, Any, Tuple
-from uuid import uuid4
 from urllib.request import urlopen
 from collections import defaultdict
 
@@ -44,6 +42,7 @@ from procedures import (
     add_arguments_recursively,
     load_config,
 )
+from ohlcv_store import OHLCVStore, is_day_filename
 
 # ========================= CONFIGURABLES & GLOBALS =========================
 
@@ -92,6 +91,30 @@ def deduplicate_rows(arr):
     Returns:
     numpy.ndarray: Array with duplicate rows removed, maintaining original order
     """
+    arr = np.asarray(arr)
+    if arr.ndim != 2 or arr.dtype.kind not in "biuf" or len(arr) < 2:
+        return deduplicate_rows_py(arr)
+    # sorted 1m candles: strictly increasing timestamps means no duplicate rows
+    if (np.diff(arr[:, 0]) > 0).all():
+        return arr.copy()
+    # only rows sharing a timestamp with another row can be duplicates
+    _, inverse, counts = np.unique(arr[:, 0], return_inverse=True, return_counts=True)
+    candidates = np.flatnonzero(counts[inverse] > 1)
+    # compare candidate rows as raw bytes; +0 maps -0.0 to 0.0 so both compare equal
+    normalized = np.ascontiguousarray(arr[candidates] + arr.dtype.type(0))
+    rows = normalized.view(np.dtype((np.void, normalized.dtype.itemsize * arr.shape[1]))).ravel()
+    _, first_idxs = np.unique(rows, return_index=True)
+    keep = np.ones(len(arr), dtype=bool)
+    keep[candidates] = False
+    keep[candidates[first_idxs]] = True
+    if arr.dtype.kind == "f":
+        # NaN != NaN, so rows containing NaN are never duplicates
+        keep |= np.isnan(arr).any(axis=1)
+    return arr[keep]
+
+
+def deduplicate_rows_py(arr):
+    """Pure Python version of deduplicate_rows, for non-numeric arrays."""
     # Convert rows to tuples for hashing
     rows_as_tuples = map(tuple, arr)
 
@@ -267,6 +290,16 @@ class OHLCVManager:
         self.max_requests_per_minute = {"": 120, "gateio": 60}
         self.request_timestamps = deque(maxlen=1000)  # for rate-limiting checks
         self.gap_tolerance_ohlcvs_minutes = gap_tolerance_ohlcvs_minutes
+        self.max_n_concurrent_coins = 8
+
+    def copy_with_date_range(self, new_start_date=None, new_end_date=None):
+        """
+        Shallow copy with its own date range. Markets, the ccxt client and the rate limiter
+        are shared, so copies may fetch different coins concurrently.
+        """
+        om = copy.copy(self)
+        om.update_date_range(new_start_date, new_end_date)
+        return om
 
     def update_date_range(self, new_start_date=None, new_end_date=None):
         if new_start_date:
@@ -377,6 +410,8 @@ class OHLCVManager:
         if missing_days:
             await self.download_ohlcvs(coin)
         ohlcvs = await self.load_ohlcvs_from_cache(coin)
+        if ohlcvs.empty:
+            return pd.DataFrame(columns=["timestamp", "open", "high", "low", "close", "volume"])
         ohlcvs.volume = ohlcvs.volume * ohlcvs.close  # use quote volume
         return ohlcvs
 
@@ -390,8 +425,10 @@ class OHLCVManager:
         dirpath = os.path.join(self.cache_filepaths["ohlcvs"], coin)
         if not os.path.exists(dirpath):
             return days
-        all_files = os.listdir(dirpath)
-        return sorted([x for x in days if x + ".npy" not in all_files])
+        # days already in the store, plus any per-day files not yet consolidated
+        cached = set(OHLCVStore(dirpath).days)
+        cached.update(f[:10] for f in os.listdir(dirpath) if is_day_filename(f))
+        return sorted([x for x in days if x not in cached])
 
     async def download_ohlcvs(self, coin):
         if not self.markets:
@@ -408,12 +445,19 @@ class OHLCVManager:
             if self.cc is None:
                 self.load_cc()
             await self.download_ohlcvs_gateio(coin)
+        self.dump_ohlcvs_to_cache(coin)
 
     def dump_ohlcvs_to_cache(self, coin):
         """
-        Dumps new ohlcv data to cache if not already existing. Only whole days are dumped.
+        Moves downloaded per-day .npy files into the coin's consolidated OHLCVStore.
         """
-        pass
+        dirpath = os.path.join(self.cache_filepaths["ohlcvs"], coin)
+        try:
+            n_days = OHLCVStore(dirpath).ingest_npy_files()
+            if n_days and self.verbose:
+                logging.info(f"{self.exchange} consolidated {n_days} days of {coin} ohlcvs")
+        except Exception as e:
+            logging.error(f"{self.exchange} error consolidating ohlcvs for {coin} {e}")
 
     async def get_first_timestamp(self, coin):
         """
@@ -491,41 +535,28 @@ class OHLCVManager:
         """
         Loads any cached ohlcv data for exchange, coin and date range from cache
         and *strictly* enforces no gaps. If any gap is found, return empty.
+        Runs in a worker thread so several coins can be loaded concurrently.
         """
-        dirpath = os.path.join(self.cache_filepaths["ohlcvs"], coin, "")
+        return await asyncio.to_thread(self._load_ohlcvs_from_cache, coin)
+
+    def _load_ohlcvs_from_cache(self, coin):
+        dirpath = os.path.join(self.cache_filepaths["ohlcvs"], coin)
         if not os.path.exists(dirpath):
             return pd.DataFrame()
 
-        all_files = sorted([f for f in os.listdir(dirpath) if f.endswith(".npy")])
-        all_days = get_days_in_between(self.start_date, self.end_date)
-        all_months = sorted(set([x[:7] for x in all_days]))
-
-        # Load month files first
-        files_to_load = [x for x in all_files if x.replace(".npy", "") in all_months]
-        # Add day files (exclude if they were loaded already as a month)
-        files_to_load += [
-            x for x in all_files if x.replace(".npy", "") in all_days and x not in files_to_load
-        ]
-
-        dfs = []
-        for f in files_to_load:
-            try:
-                filepath = os.path.join(dirpath, f)
-                df_part = load_ohlcv_data(filepath)
-                dfs.append(df_part)
-            except Exception as e:
-                logging.error(f"Error loading file {f}: {e}")
-
-        if not dfs:
+        # consolidate any per-day files left over from older versions or downloads
+        self.dump_ohlcvs_to_cache(coin)
+        store = OHLCVStore(dirpath)
+        # start_date may carry a time of day; whole days are read and clipped below
+        arr = store.read_range(format_end_date(self.start_date), format_end_date(self.end_date))
+        if len(arr) == 0:
             return pd.DataFrame()
 
-        # Concatenate, drop duplicates, sort by timestamp
-        df = (
-            pd.concat(dfs)
-            .drop_duplicates("timestamp")
-            .sort_values("timestamp")
-            .reset_index(drop=True)
-        )
+        # each day is sorted and deduplicated on write; only day boundaries need checking
+        if not (np.diff(arr[:, 0]) > 0).all():
+            _, first_idxs = np.unique(arr[:, 0], return_index=True)
+            arr = arr[first_idxs]
+        df = pd.DataFrame(arr, columns=["timestamp", "open", "high", "low", "close", "volume"])
         # ----------------------------------------------------------------------
         # 1) Clip to [start_ts, end_ts] and return
         # ----------------------------------------------------------------------
@@ -548,23 +579,29 @@ class OHLCVManager:
         return df
 
     def copy_ohlcvs_from_old_dir(self, new_dirpath, old_dirpath, missing_days, coin):
-        symbolf = self.get_symbol(coin).replace("/USDT:", "")
-        files_copied = 0
+        day_arrays = {}
         if os.path.exists(old_dirpath):
+            missing_days = set(missing_days)
+            # old dir may already have been migrated to a store
+            old_store = OHLCVStore(old_dirpath)
+            for day in missing_days:
+                if day in old_store:
+                    day_arrays[day] = old_store.read_days([day])
             for d0 in os.listdir(old_dirpath):
-                if d0.endswith(".npy") and d0[:10] in missing_days:
+                if d0.endswith(".npy") and d0[:10] in missing_days and d0[:10] not in day_arrays:
                     src = os.path.join(old_dirpath, d0)
-                    dst = os.path.join(new_dirpath, d0)
-                    if os.path.exists(dst):
-                        continue
                     try:
-                        shutil.copy(src, dst)
-                        files_copied += 1
+                        day_arrays[d0[:10]] = np.load(src, allow_pickle=True)
                     except Exception as e:
-                        logging.error(f"{self.exchange} error copying {src} -> {dst} {e}")
-        if files_copied:
+                        logging.error(f"{self.exchange} error loading {src} {e}")
+        if day_arrays:
+            try:
+                OHLCVStore(new_dirpath).write_days(day_arrays)
+            except Exception as e:
+                logging.error(f"{self.exchange} error copying {old_dirpath} -> {new_dirpath} {e}")
+                return False
             logging.info(
-                f"{self.exchange} copied {files_copied} files from {old_dirpath} to {new_dirpath}"
+                f"{self.exchange} copied {len(day_arrays)} days from {old_dirpath} to {new_dirpath}"
             )
             return True
         else:
@@ -913,7 +950,151 @@ class OHLCVManager:
             logging.error(f"Error with {get_function_name()} {e}")
 
 
-async def prepare_hlcvs(config: dict, exchange: str):
+class HLCVsBuilder:
+    """
+    Builds the unified hlcvs array of shape (n_timesteps, n_coins, 4), [high, low, close,
+    volume], coin by coin over the 1m grid start_ts + i * 60000, i < n_timesteps.
+    Rows and coins left unused are dropped by finalize().
+
+    Without a path, coins are written straight into a time-major array in RAM.
+
+    With a path, the result is a .npy file at that path, returned memory-mapped, and RAM
+    use stays bounded regardless of the number of coins and timesteps. Coins are staged
+    in a coin-major memmap next to it, so each coin is one contiguous write, and the
+    staging file is transposed into the time-major file in row blocks by finalize().
+    """
+
+    def __init__(self, start_ts, n_timesteps, n_coins, path=None, block_bytes=2**28):
+        self.start_ts = start_ts
+        self.n_timesteps = n_timesteps
+        self.n_coins = n_coins
+        self.path = None if path is None else str(path)
+        self.block_bytes = block_bytes
+        self.spans = {}  # col -> (start_idx, end_idx)
+        if self.path is None:
+            self.data = np.full((n_timesteps, n_coins, 4), -1.0, dtype=np.float64)
+        else:
+            self.staging_path = self.path + ".staging"
+            # rows outside of each coin's span are set by fill_coin()
+            self.data = np.memmap(
+                self.staging_path,
+                dtype=np.float64,
+                mode="w+",
+                shape=(n_coins, n_timesteps, 4),
+            )
+
+    def coin_view(self, col):
+        """(n_timesteps, 4) view of one coin's column."""
+        return self.data[:, col] if self.path is None else self.data[col]
+
+    def set_coin(self, col, data):
+        """
+        Write one coin's hlcvs. data has columns [timestamp, high, low, close, volume]
+        with consecutive 1m timestamps inside the grid. NaN volume marks missing bars.
+        """
+        start_idx = int((data[0, 0] - self.start_ts) / 60000)
+        end_idx = start_idx + len(data)
+        if start_idx < 0 or end_idx > self.n_timesteps:
+            raise ValueError(f"hlcvs for column {col} fall outside of the timestamp grid")
+        self.coin_view(col)[start_idx:end_idx] = data[:, 1:]
+        self.spans[col] = (start_idx, end_idx)
+
+    def fill_coin(self, col, volume_scale=1.0):
+        """
+        Front-fill and back-fill high, low and close with the coin's first and last close,
+        scale its volume, and set volume to -1.0 for missing bars and outside of its span.
+        """
+        start_idx, end_idx = self.spans[col]
+        view = self.coin_view(col)
+        if start_idx > 0:
+            view[:start_idx, :3] = view[start_idx, 2]
+            view[:start_idx, 3] = -1.0
+        if end_idx < self.n_timesteps:
+            view[end_idx:, :3] = view[end_idx - 1, 2]
+            view[end_idx:, 3] = -1.0
+        volume = view[start_idx:end_idx, 3]
+        if volume_scale != 1.0:
+            volume *= volume_scale
+        volume[np.isnan(volume)] = -1.0
+
+    def finalize(self, volume_scales=None):
+        """
+        Fill every written coin, then drop rows outside of the written range and columns
+        never written. Returns (timestamps, hlcvs); columns keep their order.
+        """
+        if not self.spans:
+            self.discard()
+            raise ValueError("No valid coins found with data")
+        volume_scales = volume_scales or {}
+        cols = sorted(self.spans)
+        global_start_idx = min(start_idx for start_idx, _ in self.spans.values())
+        global_end_idx = max(end_idx for _, end_idx in self.spans.values())
+        global_start_time = float(self.start_ts + global_start_idx * 60000)
+        global_end_time = float(self.start_ts + (global_end_idx - 1) * 60000)
+        timestamps = np.arange(global_start_time, global_end_time + 60000, 60000)
+        trimmed = (
+            global_start_idx > 0 or global_end_idx < self.n_timesteps or len(cols) < self.n_coins
+        )
+
+        if self.path is None:
+            # trim first, so only kept rows are filled
+            if trimmed:
+                self._compact(global_start_idx, len(timestamps), cols)
+                self.n_timesteps = len(timestamps)
+                self.spans = {
+                    i: tuple(idx - global_start_idx for idx in self.spans[col])
+                    for i, col in enumerate(cols)
+                }
+                volume_scales = {i: volume_scales.get(col, 1.0) for i, col in enumerate(cols)}
+            for col in self.spans:
+                self.fill_coin(col, volume_scales.get(col, 1.0))
+            return timestamps, self.data
+
+        # staged on disk: fill coin-major, then transpose into the time-major file
+        for col in cols:
+            self.fill_coin(col, volume_scales.get(col, 1.0))
+        self.data.flush()
+        out = np.lib.format.open_memmap(
+            self.path, mode="w+", dtype=np.float64, shape=(len(timestamps), len(cols), 4)
+        )
+        block = max(1, self.block_bytes // (len(cols) * 4 * 8))
+        for i in range(0, len(timestamps), block):
+            j = min(i + block, len(timestamps))
+            src = self.data[cols, global_start_idx + i : global_start_idx + j]
+            out[i:j] = src.transpose(1, 0, 2)
+        out.flush()
+        del out
+        self.discard()
+        return timestamps, np.load(self.path, mmap_mode="r")
+
+    def _compact(self, start_idx, n_rows, cols):
+        """
+        Trim the in-RAM array to rows start_idx:start_idx + n_rows and columns cols, in
+        place. Rows are packed towards the front of the buffer a block at a time, which
+        never overwrites rows not yet moved, and the buffer is then shrunk, so RAM use
+        never exceeds the untrimmed array plus one block.
+        """
+        flat = self.data.reshape(-1)
+        row_size = len(cols) * 4
+        block = max(1, self.block_bytes // (row_size * 8))
+        for i in range(0, n_rows, block):
+            j = min(i + block, n_rows)
+            block_data = np.take(self.data[start_idx + i : start_idx + j], cols, axis=1)
+            flat[i * row_size : j * row_size] = block_data.reshape(-1)
+        del flat
+        self.data.resize((n_rows, len(cols), 4), refcheck=False)
+
+    def discard(self):
+        """Release the array and delete the staging file, if any."""
+        self.data = None
+        if self.path is not None and os.path.exists(self.staging_path):
+            try:
+                os.remove(self.staging_path)
+            except Exception as e:
+                logging.error(f"Failed to delete staging file {self.staging_path}: {e}")
+
+
+async def prepare_hlcvs(config: dict, exchange: str, hlcvs_path=None):
     coins = sorted(
         set([symbol_to_coin(c) for c in config["live"]["approved_coins"]["long"]])
         | set([symbol_to_coin(c) for c in config["live"]["approved_coins"]["short"]])
@@ -934,7 +1115,7 @@ async def prepare_hlcvs(config: dict, exchange: str):
     try:
         # Prepare HLCV data
         mss, timestamps, hlcvs = await prepare_hlcvs_internal(
-            config, coins, exchange, start_date, end_date, om
+            config, coins, exchange, start_date, end_date, om, hlcvs_path=hlcvs_path
         )
 
         om.update_date_range(timestamps[0], timestamps[-1])
@@ -952,138 +1133,120 @@ async def prepare_hlcvs(config: dict, exchange: str):
             await om.cc.close()
 
 
-async def prepare_hlcvs_internal(config, coins, exchange, start_date, end_date, om):
+async def get_coin_start_ts(
+    om, coin, start_date, end_ts, minimum_coin_age_days, first_timestamps_unified
+):
+    """
+    Start timestamp for a coin's backtest data, adjusted for minimum_coin_age_days.
+    Returns None if the coin is to be skipped.
+    """
+    adjusted_start_ts = date_to_ts(start_date)
+    if minimum_coin_age_days > 0.0:
+        exchange = om.exchange
+        min_coin_age_ms = 1000 * 60 * 60 * 24 * minimum_coin_age_days
+        first_ts = await om.get_first_timestamp(coin)
+        if first_ts >= end_ts:
+            logging.info(
+                f"{exchange} Coin {coin} too young, start date {ts_to_date_utc(first_ts)}. Skipping"
+            )
+            return None
+        coin_age_days = int(
+            round(utc_ms() - first_timestamps_unified[coin]) / (1000 * 60 * 60 * 24)
+        )
+        if coin_age_days < minimum_coin_age_days:
+            logging.info(
+                f"{exchange} Coin {coin}: Not traded due to min_coin_age {int(minimum_coin_age_days)} days. "
+                f"{coin} is {coin_age_days} days old. Skipping"
+            )
+            return None
+        new_adjusted_start_ts = max(first_timestamps_unified[coin] + min_coin_age_ms, first_ts)
+        if new_adjusted_start_ts > adjusted_start_ts:
+            logging.info(
+                f"{exchange} Coin {coin}: Adjusting start date from {start_date} "
+                f"to {ts_to_date_utc(new_adjusted_start_ts)}"
+            )
+            adjusted_start_ts = new_adjusted_start_ts
+    return adjusted_start_ts
+
+
+async def prepare_hlcvs_internal(
+    config, coins, exchange, start_date, end_date, om, hlcvs_path=None
+):
+    start_ts = date_to_ts(start_date)
     end_ts = date_to_ts(end_date)
     minimum_coin_age_days = config["live"]["minimum_coin_age_days"]
     interval_ms = 60000
 
     first_timestamps_unified = await get_first_timestamps_unified(coins)
-
-    # Create cache directory if it doesn't exist
-    cache_dir = Path(f"./caches/hlcvs_data/{uuid4().hex[:16]}")
-    cache_dir.mkdir(parents=True, exist_ok=True)
-
-    # First pass: Download data and store metadata
-    coin_metadata = {}
-
-    valid_coins = {}
-    global_start_time = float("inf")
-    global_end_time = float("-inf")
     await om.load_markets()
-    min_coin_age_ms = 1000 * 60 * 60 * 24 * minimum_coin_age_days
 
-    # First pass: Download and save data, collect metadata
+    candidates = []
     for coin in coins:
-        adjusted_start_ts = date_to_ts(start_date)
         if not om.has_coin(coin):
             logging.info(f"{exchange} coin {coin} missing, skipping")
             continue
         if coin not in first_timestamps_unified:
             logging.info(f"coin {coin} missing from first_timestamps_unified, skipping")
             continue
-        if minimum_coin_age_days > 0.0:
-            first_ts = await om.get_first_timestamp(coin)
-            if first_ts >= end_ts:
-                logging.info(
-                    f"{exchange} Coin {coin} too young, start date {ts_to_date_utc(first_ts)}. Skipping"
-                )
-                continue
-            coin_age_days = int(
-                round(utc_ms() - first_timestamps_unified[coin]) / (1000 * 60 * 60 * 24)
-            )
-            if coin_age_days < minimum_coin_age_days:
-                logging.info(
-                    f"{exchange} Coin {coin}: Not traded due to min_coin_age {int(minimum_coin_age_days)} days. "
-                    f"{coin} is {coin_age_days} days old. Skipping"
-                )
-                continue
-            new_adjusted_start_ts = max(first_timestamps_unified[coin] + min_coin_age_ms, first_ts)
-            if new_adjusted_start_ts > adjusted_start_ts:
-                logging.info(
-                    f"{exchange} Coin {coin}: Adjusting start date from {start_date} "
-                    f"to {ts_to_date_utc(new_adjusted_start_ts)}"
-                )
-                adjusted_start_ts = new_adjusted_start_ts
-        try:
-            om.update_date_range(adjusted_start_ts)
-            df = await om.get_ohlcvs(coin)
-            data = df[["timestamp", "high", "low", "close", "volume"]].values
-        except Exception as e:
-            logging.error(f"error with get_ohlcvs for {coin} {e}. Skipping")
-            traceback.print_exc()
-            continue
-        if len(data) == 0:
-            continue
-
-        assert (np.diff(data[:, 0]) == interval_ms).all(), f"gaps in hlcv data {coin}"
-
-        # Save data to disk
-        file_path = cache_dir / f"{coin}.npy"
-        dump_ohlcv_data(data, file_path)
+        candidates.append(coin)
+    if not candidates:
+        raise ValueError("No valid coins found with data")
 
-        # Update metadata
-        coin_metadata[coin] = {
-            "start_time": int(data[0, 0]),
-            "end_time": int(data[-1, 0]),
-            "length": len(data),
-        }
+    # Each coin is written into its column of an array spanning the whole date range,
+    # in RAM or, with hlcvs_path, on disk. Unused rows and coins are dropped afterwards.
+    n_timesteps_max = int((end_ts - start_ts) / interval_ms) + 1
+    builder = HLCVsBuilder(start_ts, n_timesteps_max, len(candidates), path=hlcvs_path)
 
-        valid_coins[coin] = file_path
-        global_start_time = min(global_start_time, data[0, 0])
-        global_end_time = max(global_end_time, data[-1, 0])
+    # Fetch coins concurrently. Copies of om share its rate limiter, and loading
+    # from cache (parsing, gap filling) runs in worker threads.
+    semaphore = asyncio.Semaphore(om.max_n_concurrent_coins)
+    pbar = tqdm(total=len(candidates), desc="Fetching coins", unit="coin")
 
-    if not valid_coins:
-        raise ValueError("No valid coins found with data")
+    async def fetch_coin(col, coin):
+        async with semaphore:
+            try:
+                adjusted_start_ts = await get_coin_start_ts(
+                    om, coin, start_date, end_ts, minimum_coin_age_days, first_timestamps_unified
+                )
+                if adjusted_start_ts is None:
+                    return
+                try:
+                    df = await om.copy_with_date_range(adjusted_start_ts).get_ohlcvs(coin)
+                    data = df[["timestamp", "high", "low", "close", "volume"]].values
+                    del df
+                except Exception as e:
+                    logging.error(f"error with get_ohlcvs for {coin} {e}. Skipping")
+                    traceback.print_exc()
+                    return
+            finally:
+                pbar.update(1)
+        data = data[(data[:, 0] >= start_ts) & (data[:, 0] <= end_ts)]
+        if len(data) == 0:
+            return
 
-    # Calculate dimensions for the unified array
-    n_timesteps = int((global_end_time - global_start_time) / interval_ms) + 1
-    n_coins = len(valid_coins)
+        assert (np.diff(data[:, 0]) == interval_ms).all(), f"gaps in hlcv data {coin}"
 
-    # Create the timestamp array
-    timestamps = np.arange(global_start_time, global_end_time + interval_ms, interval_ms)
+        builder.set_coin(col, data)
 
-    # Pre-allocate the unified array
-    unified_array = np.full((n_timesteps, n_coins, 4), -1.0, dtype=np.float64)
+    try:
+        await asyncio.gather(*[fetch_coin(col, coin) for col, coin in enumerate(candidates)])
+    except Exception:
+        builder.discard()
+        raise
+    finally:
+        pbar.close()
 
-    # Second pass: Load data from disk and populate the unified array
+    valid_coins = [coin for col, coin in enumerate(candidates) if col in builder.spans]
+    timestamps, unified_array = builder.finalize()
     logging.info(
-        f"{exchange} Unifying data for {len(valid_coins)} coin{'s' if len(valid_coins) > 1 else ''} into single numpy array..."
+        f"{exchange} Unified data for {len(valid_coins)} coin{'s' if len(valid_coins) > 1 else ''} into single numpy array"
     )
-    for i, coin in enumerate(tqdm(valid_coins, desc="Processing coins", unit="coin")):
-        file_path = valid_coins[coin]
-        ohlcv = np.load(file_path)
-
-        # Calculate indices
-        start_idx = int((ohlcv[0, 0] - global_start_time) / interval_ms)
-        end_idx = start_idx + len(ohlcv)
-
-        # Extract and process data
-        coin_data = ohlcv[:, 1:]
 
-        # Place the data in the unified array
-        unified_array[start_idx:end_idx, i, :] = coin_data
-
-        # Front-fill
-        if start_idx > 0:
-            unified_array[:start_idx, i, :3] = coin_data[0, 2]
-
-        # Back-fill
-        if end_idx < n_timesteps:
-            unified_array[end_idx:, i, :3] = coin_data[-1, 2]
-
-        # Clean up temporary file
-        os.remove(file_path)
-
-    # Clean up cache directory if empty
-    try:
-        os.rmdir(cache_dir)
-    except OSError:
-        pass
     mss = {coin: om.get_market_specific_settings(coin) for coin in sorted(valid_coins)}
     return mss, timestamps, unified_array
 
 
-async def prepare_hlcvs_combined(config):
+async def prepare_hlcvs_combined(config, hlcvs_path=None):
     exchanges_to_consider = [
         "binanceusdm" if e == "binance" else e for e in config["backtest"]["exchanges"]
     ]
@@ -1098,7 +1261,9 @@ async def prepare_hlcvs_combined(config):
     btc_om = None
 
     try:
-        mss, timestamps, unified_array = await _prepare_hlcvs_combined_impl(config, om_dict)
+        mss, timestamps, unified_array = await _prepare_hlcvs_combined_impl(
+            config, om_dict, hlcvs_path=hlcvs_path
+        )
 
         # Always fetch BTC/USD prices
         btc_exchange = exchanges_to_consider[0] if len(exchanges_to_consider) == 1 else "binanceusdm"
@@ -1125,7 +1290,7 @@ async def prepare_hlcvs_combined(config):
             await btc_om.cc.close()
 
 
-async def _prepare_hlcvs_combined_impl(config, om_dict):
+async def _prepare_hlcvs_combined_impl(config, om_dict, hlcvs_path=None):
     """
     Amalgamates data from different exchanges for each coin in config, then unifies them into a single
     numpy array with shape (n_timestamps, n_coins, 4). The final data per coin is chosen using:
@@ -1172,11 +1337,9 @@ async def _prepare_hlcvs_combined_impl(config, om_dict):
         await om_dict[ex].load_markets()
 
     # ---------------------------------------------------------------
-    # 2) For each coin, gather 1m data from all exchanges, filter/choose best
+    # 1) Skip coins without data or too young for the date range
     # ---------------------------------------------------------------
-    chosen_data_per_coin = {}  # coin -> pd.DataFrame of final chosen data
-    chosen_mss_per_coin = {}  # coin -> market_specific_settings from chosen exchange
-
+    effective_start_ts_per_coin = {}  # coin -> earliest timestamp to backtest from
     for coin in coins:
         # If the global "first_timestamps_unified" says we have no data for coin, skip immediately
         coin_fts = first_timestamps_unified.get(coin, 0.0)
@@ -1198,6 +1361,22 @@ async def _prepare_hlcvs_combined_impl(config, om_dict):
         if effective_start_ts >= end_ts:
             # No coverage needed or possible
             continue
+        effective_start_ts_per_coin[coin] = effective_start_ts
+    candidates = list(effective_start_ts_per_coin)
+    if not candidates:
+        raise ValueError("No coin data found on any exchange for the requested date range.")
+
+    # ---------------------------------------------------------------
+    # 2) For each coin, gather 1m data from all exchanges, filter/choose best.
+    #    The chosen data is written into the coin's column of an array spanning
+    #    [start_ts, end_ts], in RAM or, with hlcvs_path, on disk, and released.
+    # ---------------------------------------------------------------
+    n_timesteps_max = int((end_ts - start_ts) / 60000) + 1
+    builder = HLCVsBuilder(start_ts, n_timesteps_max, len(candidates), path=hlcvs_path)
+    chosen_mss_per_coin = {}  # coin -> market_specific_settings from chosen exchange
+
+    for col, coin in enumerate(candidates):
+        effective_start_ts = effective_start_ts_per_coin[coin]
 
         # >>> Instead of a normal for-loop over exchanges, do concurrent tasks:
         tasks = []
@@ -1219,6 +1398,7 @@ async def _prepare_hlcvs_combined_impl(config, om_dict):
                 continue
             ex, df, coverage_count, gap_count, total_volume = r
             exchange_candidates.append((ex, df, coverage_count, gap_count, total_volume))
+        del results
 
         if not exchange_candidates:
             logging.info(f"No exchange data found at all for coin {coin}. Skipping.")
@@ -1232,27 +1412,36 @@ async def _prepare_hlcvs_combined_impl(config, om_dict):
             exchange_candidates.sort(key=lambda x: (x[2], -x[3], x[4]), reverse=True)
             best_exchange, best_df, best_cov, best_gaps, best_vol = exchange_candidates[0]
         logging.info(f"{coin} exchange preference: {[x[0] for x in exchange_candidates]}")
+        del exchange_candidates
+
+        if best_gaps:
+            # missing bars: close is forward-filled, H/L take the close, volume is NaN
+            span = np.arange(best_df.timestamp.iloc[0], best_df.timestamp.iloc[-1] + 60000, 60000)
+            best_df = best_df.set_index("timestamp").reindex(span)
+            best_df["close"] = best_df["close"].ffill()
+            best_df["high"] = best_df["high"].fillna(best_df["close"])
+            best_df["low"] = best_df["low"].fillna(best_df["close"])
+            best_df = best_df.reset_index(names="timestamp")
+        builder.set_coin(col, best_df[["timestamp", "high", "low", "close", "volume"]].values)
+        del best_df
 
-        chosen_data_per_coin[coin] = best_df
         chosen_mss_per_coin[coin] = om_dict[best_exchange].get_market_specific_settings(coin)
         chosen_mss_per_coin[coin]["exchange"] = best_exchange
     # ---------------------------------------------------------------
     # If no coins survived, raise error
     # ---------------------------------------------------------------
-    if not chosen_data_per_coin:
+    if not chosen_mss_per_coin:
+        builder.discard()
         raise ValueError("No coin data found on any exchange for the requested date range.")
 
     # ---------------------------------------------------------------
     # 6) Unify across coins into a single (n_timestamps, n_coins, 4) array
     #    We'll unify on 1m timestamps from the earliest to latest across all chosen coins
     # ---------------------------------------------------------------
-    global_start_time = min(df.timestamp.iloc[0] for df in chosen_data_per_coin.values())
-    global_end_time = max(df.timestamp.iloc[-1] for df in chosen_data_per_coin.values())
+    global_start_time = start_ts + min(s for s, _ in builder.spans.values()) * 60000
+    global_end_time = start_ts + (max(e for _, e in builder.spans.values()) - 1) * 60000
 
-    timestamps = np.arange(global_start_time, global_end_time + 60000, 60000)
-    n_timesteps = len(timestamps)
-    valid_coins = sorted(chosen_data_per_coin.keys())
-    n_coins = len(valid_coins)
+    valid_coins = sorted(chosen_mss_per_coin.keys())
     # use at most last 60 days of date range to compute volume ratios
     start_date_for_volume_ratios = ts_to_date_utc(
         max(global_start_time, global_end_time - 1000 * 60 * 60 * 24 * 60)
@@ -1283,33 +1472,18 @@ async def _prepare_hlcvs_combined_impl(config, om_dict):
 
     pprint.pprint(dict(exchange_volume_ratios_mapped))
 
-    # We'll store [high, low, close, volume] in the last dimension
-    unified_array = np.full((n_timesteps, n_coins, 4), -1.0, dtype=np.float64)
-
-    # For each coin i, reindex its DataFrame onto the full timestamps
-    for i, coin in enumerate(valid_coins):
-        df = chosen_data_per_coin[coin].copy()
-
-        # Reindex on the global minute timestamps
-        df = df.set_index("timestamp").reindex(timestamps)
-
-        # Forward fill 'close' for all missing rows, then backward fill any leading edge
-        df["close"] = df["close"].ffill().bfill()
-
-        # For O/H/L, fill with whatever the 'close' ended up being
-        df["open"] = df["open"].fillna(df["close"])
-        df["high"] = df["high"].fillna(df["close"])
-        df["low"] = df["low"].fillna(df["close"])
-
-        # Apply scaling factor, then fill volume with -1.0 for missing bars
-        exchange_for_this_coin = chosen_mss_per_coin[coin]["exchange"]
-        scaling_factor = exchange_volume_ratios_mapped[exchange_for_this_coin][reference_exchange]
-        df["volume"] *= scaling_factor
-        df["volume"] = df["volume"].fillna(-1.0)
-
-        # Now extract columns in correct order
-        coin_data = df[["high", "low", "close", "volume"]].values
-        unified_array[:, i, :] = coin_data
+    # Price fields are front/back-filled with the close and volume is scaled to the
+    # reference exchange; missing bars get volume -1.0
+    volume_scales = {}
+    for col, coin in enumerate(candidates):
+        if coin in chosen_mss_per_coin:
+            exchange_for_this_coin = chosen_mss_per_coin[coin]["exchange"]
+            volume_scales[col] = exchange_volume_ratios_mapped[exchange_for_this_coin][
+                reference_exchange
+            ]
+            # kept so that cached hlcvs can be extended with the same scaling
+            chosen_mss_per_coin[coin]["volume_scale"] = volume_scales[col]
+    timestamps, unified_array = builder.finalize(volume_scales)
 
     # ---------------------------------------------------------------
     # 7) Cleanup: close all ccxt clients if needed
@@ -1327,6 +1501,108 @@ async def _prepare_hlcvs_combined_impl(config, om_dict):
     return chosen_mss_per_coin, timestamps, unified_array
 
 
+async def prepare_hlcvs_extension(
+    config, exchange, coins, mss, last_ts, last_hlcvs, last_btc_usd_price
+):
+    """
+    New minutes after last_ts, up to the config's end_date, for cached hlcvs of the given
+    coins. Each coin is fetched from the exchange it was cached from (mss[coin]["exchange"]
+    for combined caches) and its volume scaled by mss[coin]["volume_scale"], if any.
+    last_hlcvs is the cached array's last row, shape (n_coins, 4).
+
+    Returns (timestamps, hlcvs, btc_usd_prices) of the new minutes, or None if the new
+    data doesn't continue the cached data seamlessly and the cache must be rebuilt.
+    """
+    interval_ms = 60000
+    end_date = format_end_date(config["backtest"]["end_date"])
+    end_ts = date_to_ts(end_date)
+    if end_ts <= last_ts:
+        return None
+    start_date = ts_to_date_utc(last_ts)[:10]
+    coin_exchanges = {
+        coin: (
+            mss[coin]["exchange"]
+            if exchange == "combined"
+            else ("binanceusdm" if exchange == "binance" else exchange)
+        )
+        for coin in coins
+    }
+    oms = {}
+    for ex in sorted(set(coin_exchanges.values())):
+        oms[ex] = OHLCVManager(
+            ex,
+            start_date,
+            end_date,
+            gap_tolerance_ohlcvs_minutes=config["backtest"]["gap_tolerance_ohlcvs_minutes"],
+        )
+    # same choice of BTC/USD source as prepare_hlcvs and prepare_hlcvs_combined
+    if exchange == "combined":
+        exchanges = config["backtest"]["exchanges"]
+        btc_exchange = exchanges[0] if len(exchanges) == 1 else "binanceusdm"
+        btc_exchange = "binanceusdm" if btc_exchange == "binance" else btc_exchange
+    else:
+        btc_exchange = "binanceusdm" if exchange == "binance" else exchange
+    if btc_exchange not in oms:
+        oms[btc_exchange] = OHLCVManager(
+            btc_exchange,
+            start_date,
+            end_date,
+            gap_tolerance_ohlcvs_minutes=config["backtest"]["gap_tolerance_ohlcvs_minutes"],
+        )
+    try:
+        await asyncio.gather(*[om.load_markets() for om in oms.values()])
+        semaphore = asyncio.Semaphore(max(om.max_n_concurrent_coins for om in oms.values()))
+
+        async def fetch_coin(coin):
+            async with semaphore:
+                om = oms[coin_exchanges[coin]].copy_with_date_range(start_date, end_date)
+                df = await om.get_ohlcvs(coin)
+            if df.empty:
+                return np.empty((0, 5))
+            data = df[["timestamp", "high", "low", "close", "volume"]].values
+            return data[data[:, 0] > last_ts]
+
+        new_data = await asyncio.gather(*[fetch_coin(coin) for coin in coins])
+        btc_df = await oms[btc_exchange].copy_with_date_range(start_date, end_date).get_ohlcvs(
+            "BTC"
+        )
+    finally:
+        for om in oms.values():
+            if om.cc:
+                await om.cc.close()
+
+    for i, (coin, data) in enumerate(zip(coins, new_data)):
+        if len(data) == 0:
+            continue
+        if last_hlcvs[i, 3] == -1.0:
+            logging.info(f"{coin} has new data after having been back-filled, not extending cache")
+            return None
+        if data[0, 0] != last_ts + interval_ms or (np.diff(data[:, 0]) != interval_ms).any():
+            logging.info(f"{coin} new data doesn't continue cached data, not extending cache")
+            return None
+    n_timesteps = max(len(data) for data in new_data)
+    if n_timesteps == 0:
+        return None
+
+    timestamps = np.arange(
+        last_ts + interval_ms, last_ts + (n_timesteps + 1) * interval_ms, interval_ms
+    ).astype(float)
+    hlcvs = np.full((n_timesteps, len(coins), 4), -1.0, dtype=np.float64)
+    for i, (coin, data) in enumerate(zip(coins, new_data)):
+        n = len(data)
+        if n:
+            hlcvs[:n, i, :] = data[:, 1:]
+            hlcvs[:n, i, 3] *= mss[coin].get("volume_scale", 1.0)
+        # Back-fill with the last close
+        hlcvs[n:, i, :3] = data[-1, 3] if n else last_hlcvs[i, 2]
+
+    if btc_df.empty:
+        raise ValueError(f"Failed to fetch BTC/USD prices from {btc_exchange}")
+    btc_df = btc_df.set_index("timestamp").reindex(timestamps, method="ffill")
+    btc_usd_prices = btc_df["close"].fillna(last_btc_usd_price).values
+    return timestamps, hlcvs, btc_usd_prices
+
+
 async def fetch_data_for_coin_and_exchange(
     coin: str, ex: str, om: OHLCVManager, effective_start_ts: int, end_ts: int
 ):
@@ -0,0 +1,177 @@
+from __future__ import annotations
+import os
+import json
+import sqlite3
+from hashlib import sha256
+from importlib.machinery import EXTENSION_SUFFIXES
+from typing import Sequence, Tuple
+
+from pure_funcs import calc_hash
+
+# Bump whenever backtest or scoring semantics change (expand_analysis, combine_analyses,
+# calc_fitness, ...) so cached objectives computed by older code are not reused.
+EVAL_CACHE_VERSION = 1
+
+
+class EvalCache:
+    """
+    Persistent optimizer evaluation cache backed by SQLite.
+
+    Rows are keyed by (fingerprint, individual hash). The fingerprint identifies the
+    backtest data and the settings that affect the objectives, so results are only
+    reused for identical backtests. A row with NULL objectives is a claim: the
+    individual is being evaluated by some worker.
+
+    The database is shared by all worker processes (WAL mode) and outlives the run,
+    so restarted optimizations reuse earlier results. Connections are opened lazily
+    per process; instances can be pickled to pool workers.
+    """
+
+    def __init__(self, path: str, fingerprint: str, timeout: float = 60.0):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.timeout = timeout
+        self._conn = None
+        self._pid = None
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS evals ("
+                "fingerprint TEXT NOT NULL, "
+                "individual_hash TEXT NOT NULL, "
+                "objectives TEXT, "
+                "PRIMARY KEY (fingerprint, individual_hash))"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # a connection must not be shared across fork(), so reopen in each process
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._pid = os.getpid()
+        return self._conn
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        state["_pid"] = None
+        return state
+
+    @staticmethod
+    def key(individual: Sequence[float]) -> str:
+        return calc_hash(list(individual))
+
+    def claim(self, individual_hash: str) -> Tuple[bool, tuple | None]:
+        """
+        Atomically mark an individual as being evaluated.
+        Returns (True, None) if it was new, else (False, cached objectives or None if
+        still being evaluated).
+        """
+        conn = self._connection()
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO evals (fingerprint, individual_hash, objectives) "
+            "VALUES (?, ?, NULL)",
+            (self.fingerprint, individual_hash),
+        )
+        if cur.rowcount == 1:
+            return True, None
+        return False, self.get(individual_hash)
+
+    def get(self, individual_hash: str) -> tuple | None:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT objectives FROM evals WHERE fingerprint = ? AND individual_hash = ?",
+                (self.fingerprint, individual_hash),
+            )
+            .fetchone()
+        )
+        if row is None or row[0] is None:
+            return None
+        return tuple(json.loads(row[0]))
+
+    def contains(self, individual_hash: str) -> bool:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT 1 FROM evals WHERE fingerprint = ? AND individual_hash = ?",
+                (self.fingerprint, individual_hash),
+            )
+            .fetchone()
+        )
+        return row is not None
+
+    def set(self, individual_hash: str, objectives: Sequence[float]) -> None:
+        self._connection().execute(
+            "INSERT OR REPLACE INTO evals (fingerprint, individual_hash, objectives) "
+            "VALUES (?, ?, ?)",
+            (self.fingerprint, individual_hash, json.dumps([float(x) for x in objectives])),
+        )
+
+    def clear_claims(self) -> int:
+        """Drop claims left by runs that ended before finishing their evaluations."""
+        cur = self._connection().execute(
+            "DELETE FROM evals WHERE fingerprint = ? AND objectives IS NULL",
+            (self.fingerprint,),
+        )
+        return cur.rowcount
+
+    def count(self) -> int:
+        return (
+            self._connection()
+            .execute(
+                "SELECT COUNT(*) FROM evals WHERE fingerprint = ? AND objectives IS NOT NULL",
+                (self.fingerprint,),
+            )
+            .fetchone()[0]
+        )
+
+
+def calc_extension_hash(module) -> str:
+    """
+    sha256 of a compiled extension module's binary. For a package built by maturin,
+    whose __init__ re-exports the extension, the extension files next to it are hashed.
+    """
+    path = module.__file__
+    if os.path.basename(path).startswith("__init__."):
+        dirname = os.path.dirname(path)
+        paths = sorted(
+            os.path.join(dirname, fname)
+            for fname in os.listdir(dirname)
+            if fname.endswith(tuple(EXTENSION_SUFFIXES))
+        )
+    else:
+        paths = [path]
+    h = sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def calc_eval_fingerprint(config: dict, data_hashes: Sequence[str], backtester_hash: str) -> str:
+    """
+    Fingerprint of everything besides the individual that determines its objectives:
+    the backtest data (one `get_cache_hash` per exchange), the backtest, bot and
+    scoring settings, and the code computing the objectives (EVAL_CACHE_VERSION and
+    `backtester_hash`, the hash of the compiled backtester).
+    """
+    to_hash = {
+        "version": EVAL_CACHE_VERSION,
+        "backtester": backtester_hash,
+        "data": sorted(data_hashes),
+        "backtest": {
+            k: config["backtest"].get(k)
+            for k in ["combine_ohlcvs", "exchanges", "starting_balance", "use_btc_collateral"]
+        },
+        "bot": config["bot"],
+        "optimize": {
+            k: config["optimize"].get(k)
+            for k in ["bounds", "enable_overrides", "limits", "scoring"]
+        },
+    }
+    return calc_hash(to_hash)
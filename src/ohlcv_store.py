@@ -0,0 +1,360 @@
+from __future__ import annotations
+import os
+import json
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process locking
+    fcntl = None
+
+DATA_FILENAME = "ohlcvs.bin"
+INDEX_FILENAME = "index.json"
+LOCK_FILENAME = ".lock"
+FORMAT_VERSION = 1
+COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+ROW_BYTES = len(COLUMNS) * 8
+
+
+def is_day_filename(fname: str) -> bool:
+    """True for legacy per-day cache files named YYYY-MM-DD.npy."""
+    return len(fname) == 14 and fname.endswith(".npy") and fname[4] == "-" and fname[7] == "-"
+
+
+def normalize_ohlcvs(arr: np.ndarray) -> np.ndarray:
+    """
+    Cast to a float64 (n, 6) array with timestamps in milliseconds, sorted by timestamp
+    with duplicate timestamps dropped (first occurrence is kept).
+    """
+    arr = np.asarray(arr, dtype=np.float64).reshape(-1, len(COLUMNS))
+    if len(arr) == 0:
+        return arr
+    if arr[0, 0] > 1e14:  # is microseconds
+        arr[:, 0] /= 1000
+    elif arr[0, 0] <= 1e11:  # is seconds
+        arr[:, 0] *= 1000
+    ts = arr[:, 0]
+    if len(ts) > 1 and not (np.diff(ts) > 0).all():
+        _, first_idxs = np.unique(ts, return_index=True)
+        arr = arr[first_idxs]
+    return arr
+
+
+class OHLCVStore:
+    """
+    Append-only consolidated 1m OHLCV store for one coin on one exchange, replacing
+    the one-`YYYY-MM-DD.npy`-per-day cache layout.
+
+    All candles live in a single raw float64 file `ohlcvs.bin` of shape (n_rows, 6) with
+    columns timestamp, open, high, low, close, volume. `index.json` maps each cached day
+    to its (row offset, n rows) in that file. New days are appended and the index is
+    replaced atomically afterwards, so an interrupted write leaves the store consistent.
+    Rewriting a day appends fresh rows and orphans the old ones; `compact()` rewrites
+    the file in day order and drops orphaned rows.
+
+    Reads memory-map the data file. Days appended in chronological order are contiguous,
+    so a date range is read with a single slice.
+
+    Several processes may share a store: writes hold an exclusive `fcntl` lock on
+    `.lock` in the store directory and reload the index before appending, reads hold a
+    shared lock. No locking is done where `fcntl` is unavailable.
+    """
+
+    def __init__(self, dirpath: str):
+        self.dirpath = dirpath
+        self.data_path = os.path.join(dirpath, DATA_FILENAME)
+        self.index_path = os.path.join(dirpath, INDEX_FILENAME)
+        self.lock_path = os.path.join(dirpath, LOCK_FILENAME)
+        self._days: Dict[str, Tuple[int, int]] = {}
+        self._n_rows = 0
+        self._mmap = None
+        self._lock_depth = 0
+        if os.path.exists(self.index_path):
+            self._load_index()
+
+    # --- locking ------------------------------------------------------------
+
+    @contextmanager
+    def _locked(self, shared: bool = False):
+        """
+        Hold the store lock and reload the index, which another process may have changed.
+        Re-entrant within one instance; nested calls keep the outer lock.
+        """
+        if self._lock_depth:
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+            return
+        if not shared:
+            os.makedirs(self.dirpath, exist_ok=True)
+        elif not os.path.isdir(self.dirpath):
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            self._lock_depth = 1
+            try:
+                self._reload_index()
+                yield
+            finally:
+                self._lock_depth = 0
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    # --- index --------------------------------------------------------------
+
+    def _reload_index(self) -> None:
+        self._mmap = None
+        if os.path.exists(self.index_path):
+            self._load_index()
+        else:
+            self._days, self._n_rows = {}, 0
+
+    def _load_index(self) -> None:
+        with open(self.index_path) as f:
+            index = json.load(f)
+        if index.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported ohlcv store version {index.get('version')}")
+        self._n_rows = index["n_rows"]
+        self._days = {day: tuple(v) for day, v in index["days"].items()}
+
+    def _write_index(self) -> None:
+        index = {
+            "version": FORMAT_VERSION,
+            "columns": COLUMNS,
+            "n_rows": self._n_rows,
+            "days": {day: list(self._days[day]) for day in sorted(self._days)},
+        }
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, self.index_path)
+
+    @property
+    def days(self) -> List[str]:
+        return sorted(self._days)
+
+    def __contains__(self, day: str) -> bool:
+        return day in self._days
+
+    def __len__(self) -> int:
+        return sum(n for _, n in self._days.values())
+
+    # --- writing ------------------------------------------------------------
+
+    def write_days(self, day_arrays: Dict[str, np.ndarray]) -> int:
+        """
+        Append candles for several days, in chronological order, and update the index
+        once. Days already in the store are replaced. Returns the number of rows written.
+        """
+        if not day_arrays:
+            return 0
+        arrays = [(day, normalize_ohlcvs(day_arrays[day])) for day in sorted(day_arrays)]
+        with self._locked():
+            offset = self._n_rows
+            mode = "r+b" if os.path.exists(self.data_path) else "wb"
+            with open(self.data_path, mode) as f:
+                # anything past n_rows is left over from an interrupted write
+                f.seek(offset * ROW_BYTES)
+                for day, arr in arrays:
+                    f.write(np.ascontiguousarray(arr).tobytes())
+                    self._days[day] = (offset, len(arr))
+                    offset += len(arr)
+                f.truncate()
+            n_written = offset - self._n_rows
+            self._n_rows = offset
+            self._mmap = None
+            self._write_index()
+        return n_written
+
+    def write_day(self, day: str, arr: np.ndarray) -> int:
+        return self.write_days({day: arr})
+
+    def compact(self) -> int:
+        """
+        Rewrite the data file in day order without orphaned rows.
+        Returns the number of rows dropped.
+        """
+        with self._locked():
+            n_before = self._n_rows
+            if not self._days:
+                return 0
+            days = self.days
+            data = self._data()
+            tmp = self.data_path + ".tmp"
+            new_days = {}
+            offset = 0
+            with open(tmp, "wb") as f:
+                for day in days:
+                    start, n = self._days[day]
+                    f.write(np.ascontiguousarray(data[start : start + n]).tobytes())
+                    new_days[day] = (offset, n)
+                    offset += n
+            self._mmap = None
+            del data
+            os.replace(tmp, self.data_path)
+            self._days = new_days
+            self._n_rows = offset
+            self._write_index()
+        return n_before - offset
+
+    def n_orphaned_rows(self) -> int:
+        return self._n_rows - len(self)
+
+    def is_sorted(self) -> bool:
+        """True if days are laid out contiguously in chronological order."""
+        expected = 0
+        for day in self.days:
+            start, n = self._days[day]
+            if start != expected:
+                return False
+            expected += n
+        return True
+
+    def ingest_npy_files(self, remove: bool = True) -> int:
+        """
+        Move legacy per-day `YYYY-MM-DD.npy` files in the store directory into the store.
+        Returns the number of days ingested.
+        """
+        if not os.path.isdir(self.dirpath):
+            return 0
+        if not any(is_day_filename(f) for f in os.listdir(self.dirpath)):
+            return 0
+        with self._locked():
+            # list again under the lock; another process may have ingested them meanwhile
+            fnames = sorted(f for f in os.listdir(self.dirpath) if is_day_filename(f))
+            day_arrays = {}
+            for fname in fnames:
+                fpath = os.path.join(self.dirpath, fname)
+                try:
+                    day_arrays[fname[:10]] = np.load(fpath, allow_pickle=True)
+                except Exception as e:
+                    logging.error(f"Error loading file {fpath}: {e}")
+            self.write_days(day_arrays)
+            if remove:
+                for day in day_arrays:
+                    os.remove(os.path.join(self.dirpath, day + ".npy"))
+            if self.n_orphaned_rows() > len(self) // 4:
+                self.compact()
+        return len(day_arrays)
+
+    # --- reading ------------------------------------------------------------
+
+    def _data(self) -> np.ndarray:
+        if self._n_rows == 0:
+            return np.empty((0, len(COLUMNS)))
+        if self._mmap is None:
+            self._mmap = np.memmap(
+                self.data_path, dtype=np.float64, mode="r", shape=(self._n_rows, len(COLUMNS))
+            )
+        return self._mmap
+
+    def read_days(self, days: Iterable[str]) -> np.ndarray:
+        """
+        Candles of the given days as a (n, 6) float64 array in day order.
+        Days not in the store are skipped.
+        """
+        days = sorted(set(days))
+        with self._locked(shared=True):
+            spans = [self._days[day] for day in days if day in self._days]
+            spans = [(start, n) for start, n in spans if n]
+            if not spans:
+                return np.empty((0, len(COLUMNS)))
+            data = self._data()
+            # merge spans that are adjacent on disk, typically leaving a single slice
+            merged = [list(spans[0])]
+            for start, n in spans[1:]:
+                if start == merged[-1][0] + merged[-1][1]:
+                    merged[-1][1] += n
+                else:
+                    merged.append([start, n])
+            if len(merged) == 1:
+                start, n = merged[0]
+                return np.array(data[start : start + n])
+            return np.concatenate([data[start : start + n] for start, n in merged])
+
+    def read_range(self, start_day: str, end_day: str) -> np.ndarray:
+        """
+        Candles of all cached days in [start_day, end_day], inclusive. Dates are compared
+        by their YYYY-MM-DD part, so "2021-04-01T12:00:00" selects the whole of 2021-04-01.
+        """
+        start_day, end_day = start_day[:10], end_day[:10]
+        with self._locked(shared=True):
+            return self.read_days(day for day in self._days if start_day <= day <= end_day)
+
+
+def migrate_ohlcvs_dir(dirpath: str, remove: bool = True) -> Tuple[int, int]:
+    """
+    Migrate every coin directory below an `ohlcvs_<exchange>` directory (or a single
+    coin directory) from per-day .npy files into an OHLCVStore.
+    Returns (number of coins, number of days) migrated.
+    """
+    if any(is_day_filename(f) for f in os.listdir(dirpath)):
+        coin_dirs = [dirpath]
+    else:
+        coin_dirs = [
+            os.path.join(dirpath, d)
+            for d in sorted(os.listdir(dirpath))
+            if os.path.isdir(os.path.join(dirpath, d))
+        ]
+    n_coins, n_days = 0, 0
+    for coin_dir in coin_dirs:
+        store = OHLCVStore(coin_dir)
+        n = store.ingest_npy_files(remove=remove)
+        if not store.is_sorted():
+            store.compact()
+        if n:
+            n_coins += 1
+            n_days += n
+            logging.info(f"migrated {n} days in {coin_dir}")
+    return n_coins, n_days
+
+
+def main():
+    import argparse
+
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%dT%H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(
+        description="Migrate per-day .npy ohlcv caches into consolidated per-coin stores"
+    )
+    parser.add_argument(
+        "dirpaths",
+        type=str,
+        nargs="*",
+        default=None,
+        help="ohlcvs_<exchange> or coin directories. Default: all historical_data/ohlcvs_*",
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="Keep the .npy files after migrating them"
+    )
+    args = parser.parse_args()
+    dirpaths = args.dirpaths
+    if not dirpaths:
+        root = "historical_data"
+        dirpaths = (
+            [
+                os.path.join(root, d)
+                for d in sorted(os.listdir(root))
+                if d.startswith("ohlcvs_") and os.path.isdir(os.path.join(root, d))
+            ]
+            if os.path.isdir(root)
+            else []
+        )
+    for dirpath in dirpaths:
+        n_coins, n_days = migrate_ohlcvs_dir(dirpath, remove=not args.keep)
+        logging.info(f"{dirpath}: migrated {n_days} days for {n_coins} coins")
+
+
+if __name__ == "__main__":
+    main()
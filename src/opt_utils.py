@@ -1,3 +1,4 @@
+import os
 import json
 import logging
 import math
@@ -152,7 +153,13 @@ def load_results(filepath):
     """
     Generator that yields each full config by applying diffs.
     No need to distinguish between full configs and diffs.
+    A directory is read as a columnar results store (see results_store.py).
     """
+    if os.path.isdir(filepath):
+        from results_store import ResultsStore
+
+        yield from ResultsStore(filepath)
+        return
     with open(filepath, "rb") as f:
         unpacker = msgpack.Unpacker(f, raw=False)
         current = {}
@@ -28,12 +28,14 @@ import argparse
 import multiprocessing
 import mmap
 from multiprocessing import Queue, Process
+from multiprocessing.util import Finalize
 from collections import defaultdict
 from contextlib import nullcontext
 from backtest import (
     prepare_hlcvs_mss,
     prep_backtest_args,
     expand_analysis,
+    get_cache_hash,
 )
 from pure_funcs import (
     get_template_live_config,
@@ -69,10 +71,15 @@ import tempfile
 import time
 import math
 import fcntl
+import queue
+import random
+import pickle
 from tqdm import tqdm
 from optimizer_overrides import optimizer_overrides
 from opt_utils import make_json_serializable, generate_incremental_diff, round_floats
-from pareto_store import ParetoStore
+from pareto_store import ParetoStore, get_w_keys
+from results_store import ResultsStore
+from eval_cache import EvalCache, calc_eval_fingerprint, calc_extension_hash
 import msgpack
 from typing import Sequence, Tuple, List
 
@@ -157,14 +164,99 @@ def get_bound_keys_ignored():
 # ============================================================================
 
 
+class ResultsBatcher:
+    """
+    Collects compact result records in a pool worker and sends them to the results
+    writer in batches over a multiprocessing pipe.
+
+    A record is the individual plus the analysis values in a fixed key order; keys and
+    exchanges are sent once per batch. Full configs are rebuilt by the writer.
+    """
+
+    def __init__(self, queue, batch_size=32, max_delay=1.0):
+        self.queue = queue
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.header = None
+        self.records = []
+        self.first_ts = None
+
+    def add(self, individual, analyses, analyses_combined):
+        exchanges = list(analyses)
+        header = (
+            tuple(exchanges),
+            tuple(analyses[exchanges[0]]),
+            tuple(analyses_combined),
+        )
+        if header != self.header:
+            self.flush()
+            self.header = header
+        self.records.append(
+            (
+                [float(x) for x in individual],
+                [[to_plain_float(analyses[ex][k]) for k in header[1]] for ex in exchanges],
+                [to_plain_float(analyses_combined[k]) for k in header[2]],
+            )
+        )
+        if self.first_ts is None:
+            self.first_ts = time.time()
+        if len(self.records) >= self.batch_size or time.time() - self.first_ts >= self.max_delay:
+            self.flush()
+
+    def flush(self):
+        if not self.records:
+            return
+        exchanges, analysis_keys, combined_keys = self.header
+        self.queue.put(
+            {
+                "exchanges": exchanges,
+                "analysis_keys": analysis_keys,
+                "combined_keys": combined_keys,
+                "records": self.records,
+            }
+        )
+        self.records = []
+        self.first_ts = None
+
+
+def to_plain_float(x):
+    return float(x) if isinstance(x, (float, np.floating)) else x
+
+
+results_batcher = None
+
+
+def init_results_batcher(queue, batch_size=32, max_delay=1.0):
+    """Pool initializer: set up this worker's results batcher."""
+    global results_batcher
+    results_batcher = ResultsBatcher(queue, batch_size, max_delay)
+    # send the last partial batch when the worker exits (pool.close() + pool.join())
+    Finalize(None, results_batcher.flush, exitpriority=20)
+
+
+def iter_batch_results(batch):
+    """Yield (individual, analyses, analyses_combined) for each record of a batch."""
+    exchanges = batch["exchanges"]
+    analysis_keys = batch["analysis_keys"]
+    combined_keys = batch["combined_keys"]
+    for individual, analyses_values, combined_values in batch["records"]:
+        analyses = {
+            ex: dict(zip(analysis_keys, values)) for ex, values in zip(exchanges, analyses_values)
+        }
+        yield individual, analyses, dict(zip(combined_keys, combined_values))
+
+
 def results_writer_process(
     queue,
     results_dir,
     sig_digits,
     flush_interval,
+    config,
+    overrides_list,
     *,
     compress: bool = True,
     write_all_results: bool = True,
+    results_format: str = "msgpack",
 ):
     logging.basicConfig(
         level=logging.INFO,
@@ -178,52 +270,70 @@ def results_writer_process(
         log_name="optimizer.pareto",
     )
 
-    pareto_front = []
-    objectives_dict = {}
-    index_to_entry = {}
-    iteration = 0
-    n_objectives = None
-    scoring_keys = None
-
+    if results_format not in ("msgpack", "columnar"):
+        raise ValueError(f"unknown results_format {results_format}")
+    write_bin = write_all_results and results_format == "msgpack"
     results_filename = os.path.join(results_dir, "all_results.bin")
+    columnar_store = (
+        ResultsStore(os.path.join(results_dir, "all_results"))
+        if write_all_results and results_format == "columnar"
+        else None
+    )
+    # same order as the objective vectors in the Pareto store
+    w_keys = get_w_keys(f"w_{i}" for i in range(len(config["optimize"]["scoring"])))
 
     try:
-        with open(results_filename, "ab") if write_all_results else nullcontext() as f:
-            packer = msgpack.Packer(use_bin_type=True) if write_all_results else None
+        with open(results_filename, "ab") if write_bin else nullcontext() as f:
+            packer = msgpack.Packer(use_bin_type=True) if write_bin else None
             prev_data = None
             counter = 0
             while True:
-                data = queue.get()
-                if data == "DONE":
+                batch = queue.get()
+                if batch == "DONE":
                     store.flush_now()
                     break
-                if write_all_results:
-                    try:
-                        # Write raw results (diffed if compress enabled)
-                        if compress:
-                            if prev_data is None or counter % 100 == 0:
-                                output_data = make_json_serializable(data)
+                for individual, analyses, analyses_combined in iter_batch_results(batch):
+                    if not write_all_results and not store.is_candidate(
+                        [analyses_combined[k] for k in w_keys]
+                    ):
+                        # rejected on objectives alone; no need to rebuild the config
+                        continue
+                    data = {
+                        **individual_to_config(
+                            individual, optimizer_overrides, overrides_list, config
+                        ),
+                        "analyses_combined": analyses_combined,
+                        "analyses": analyses,
+                    }
+                    if columnar_store is not None:
+                        try:
+                            columnar_store.append(data)
+                        except Exception as e:
+                            logging.error(f"Error writing results: {e}")
+                    elif write_bin:
+                        try:
+                            # Write raw results (diffed if compress enabled)
+                            if compress:
+                                if prev_data is None or counter % 100 == 0:
+                                    output_data = make_json_serializable(data)
+                                else:
+                                    diff = generate_incremental_diff(prev_data, data)
+                                    output_data = make_json_serializable(diff)
+                                counter += 1
+                                prev_data = data
                             else:
-                                diff = generate_incremental_diff(prev_data, data)
-                                output_data = make_json_serializable(diff)
-                            counter += 1
-                            prev_data = data
-                        else:
-                            output_data = data
-
-                        if scoring_keys is None:
-                            scoring_keys = data["optimize"]["scoring"]
-                            n_objectives = len(scoring_keys)
-
-                        # --- Write to all_results.bin ---
-                        f.write(packer.pack(output_data))
-                        f.flush()
+                                output_data = data
+
+                            # --- Write to all_results.bin ---
+                            f.write(packer.pack(output_data))
+                        except Exception as e:
+                            logging.error(f"Error writing results: {e}")
+                    try:
+                        store.add_entry(data)
                     except Exception as e:
-                        logging.error(f"Error writing results: {e}")
-                try:
-                    store.add_entry(data)
-                except Exception as e:
-                    logging.error(f"ParetoStore error: {e}")
+                        logging.error(f"ParetoStore error: {e}")
+                if write_bin:
+                    f.flush()
 
     except Exception as e:
         logging.error(f"Results writer process error: {e}")
@@ -239,6 +349,11 @@ def results_writer_process(
         except Exception as e1:
             logging.error(f"Unable to flush Pareto front on shutdown: {e1}")
             traceback.print_exc()
+        if columnar_store is not None:
+            try:
+                columnar_store.close()
+            except Exception as e1:
+                logging.error(f"Unable to write remaining results on shutdown: {e1}")
 
 
 def create_shared_memory_file(hlcvs):
@@ -249,17 +364,18 @@ def create_shared_memory_file(hlcvs):
 
     try:
         total_size = hlcvs.nbytes
-        chunk_size = 1024 * 1024  # 1 MB chunks
-        hlcvs_bytes = hlcvs.tobytes()
+        chunk_size = 64 * 1024 * 1024  # 64 MB chunks
+        # write blocks of rows straight from the array; no full in-memory byte copy
+        rows_per_chunk = max(1, chunk_size // max(1, hlcvs[:1].nbytes))
 
         with open(shared_memory_file, "wb") as f:
             with tqdm(
                 total=total_size, unit="B", unit_scale=True, desc="Writing to shared memory"
             ) as pbar:
-                for i in range(0, len(hlcvs_bytes), chunk_size):
-                    chunk = hlcvs_bytes[i : i + chunk_size]
-                    f.write(chunk)
-                    pbar.update(len(chunk))
+                for i in range(0, len(hlcvs), rows_per_chunk):
+                    chunk = np.ascontiguousarray(hlcvs[i : i + rows_per_chunk])
+                    f.write(chunk.data)
+                    pbar.update(chunk.nbytes)
 
     except IOError as e:
         logging.error(f"Error writing to shared memory file: {e}")
@@ -268,6 +384,56 @@ def create_shared_memory_file(hlcvs):
     return shared_memory_file
 
 
+def get_shared_hlcvs_file(hlcvs, cache_dir):
+    """
+    Returns (path, data byte offset, is_temp_file) of a file holding hlcvs as raw C-ordered
+    data for the Rust backtester to map.
+
+    The uncompressed cache file <cache_dir>/hlcvs.npy is used in place when it matches
+    hlcvs, so no copy is written; otherwise a temp file is created.
+    """
+    if cache_dir:
+        npy_path = os.path.join(cache_dir, "hlcvs.npy")
+        if os.path.exists(npy_path):
+            try:
+                cached = np.load(npy_path, mmap_mode="r")
+                if (
+                    cached.shape == hlcvs.shape
+                    and cached.dtype == hlcvs.dtype
+                    and cached.flags.c_contiguous
+                ):
+                    logging.info(f"Using cached hlcvs file {npy_path} as shared memory file")
+                    return npy_path, cached.offset, False
+            except Exception as e:
+                logging.info(f"Unable to map cached hlcvs file {npy_path}: {e}")
+    required_space = hlcvs.nbytes * 1.1  # Add 10% buffer
+    check_disk_space(tempfile.gettempdir(), required_space)
+    return create_shared_memory_file(hlcvs), 0, True
+
+
+def build_hlcvs_indexes_file(shared_memory_file, hlcvs, hlcvs_offset, is_temp):
+    """
+    Builds the backtester's HLCV indexes (noisiness and volume prefix sums) once into a
+    file that every optimizer worker maps read-only, instead of each worker building its
+    own copy. Indexes of a cache file are kept next to it and reused by later runs.
+    """
+    if is_temp:
+        indexes_file = shared_memory_file + ".indexes"
+    else:
+        indexes_file = os.path.join(os.path.dirname(shared_memory_file), "hlcvs_indexes.bin")
+    if pbr.build_hlcvs_indexes(
+        shared_memory_file,
+        hlcvs.shape,
+        hlcvs.dtype.str,
+        indexes_file,
+        hlcvs_offset=hlcvs_offset,
+    ):
+        logging.info(f"Built HLCV indexes file {indexes_file}")
+    else:
+        logging.info(f"Using HLCV indexes file {indexes_file}")
+    return indexes_file
+
+
 def check_disk_space(path, required_space):
     total, used, free = shutil.disk_usage(path)
     logging.info(
@@ -392,10 +558,10 @@ def config_to_individual(config, bounds, sig_digits=None):
 
 
 @contextmanager
-def managed_mmap(filename, dtype, shape):
+def managed_mmap(filename, dtype, shape, offset=0):
     mmap = None
     try:
-        mmap = np.memmap(filename, dtype=dtype, mode="r", shape=shape)
+        mmap = np.memmap(filename, dtype=dtype, mode="r", shape=shape, offset=offset)
         yield mmap
     except FileNotFoundError:
         if shutdown_event.is_set():
@@ -407,11 +573,16 @@ def managed_mmap(filename, dtype, shape):
             del mmap
 
 
-def validate_array(arr, name):
-    if np.any(np.isnan(arr)):
-        raise ValueError(f"{name} contains NaN values")
-    if np.any(np.isinf(arr)):
-        raise ValueError(f"{name} contains inf values")
+def validate_array(arr, name, chunk_size=64 * 1024 * 1024):
+    # check in blocks so large (memory-mapped) arrays need no full-size temporaries
+    flat = arr.reshape(-1)
+    step = max(1, chunk_size // flat.itemsize)
+    for i in range(0, len(flat), step):
+        chunk = flat[i : i + step]
+        if np.any(np.isnan(chunk)):
+            raise ValueError(f"{name} contains NaN values")
+        if np.any(np.isinf(chunk)):
+            raise ValueError(f"{name} contains inf values")
 
 
 class Evaluator:
@@ -424,12 +595,14 @@ class Evaluator:
         btc_usd_dtypes,
         msss,
         config,
-        results_queue,
-        seen_hashes=None,
-        duplicate_counter=None,
+        eval_cache,
+        hlcvs_offsets=None,
+        hlcvs_indexes_files=None,
     ):
         logging.info("Initializing Evaluator...")
         self.shared_memory_files = shared_memory_files
+        self.hlcvs_offsets = hlcvs_offsets or {}
+        self.hlcvs_indexes_files = hlcvs_indexes_files or {}
         self.hlcvs_shapes = hlcvs_shapes
         self.hlcvs_dtypes = hlcvs_dtypes
         self.btc_usd_shared_memory_files = btc_usd_shared_memory_files
@@ -447,6 +620,7 @@ class Evaluator:
                 self.shared_memory_files[exchange],
                 self.hlcvs_dtypes[exchange],
                 self.hlcvs_shapes[exchange],
+                self.hlcvs_offsets.get(exchange, 0),
             )
             self.shared_hlcvs_np[exchange] = self.mmap_contexts[exchange].__enter__()
             _, self.exchange_params[exchange], self.backtest_params[exchange] = prep_backtest_args(
@@ -456,9 +630,8 @@ class Evaluator:
 
         self.config = config
         logging.info("Evaluator initialization complete.")
-        self.results_queue = results_queue
-        self.seen_hashes = seen_hashes if seen_hashes is not None else {}
-        self.duplicate_counter = duplicate_counter
+        self.eval_cache = eval_cache
+        self.n_duplicates = 0  # per worker; duplicate checks go through eval_cache only
         self.bounds = extract_bounds_tuple_list_from_config(self.config)
         self.sig_digits = config.get("optimize", {}).get("round_to_n_significant_digits", 6)
         self.scoring_weights = {
@@ -552,6 +725,7 @@ class Evaluator:
         }
 
         self.build_limit_checks()
+        self.analysis_keys = None  # layout is compiled from the first analyses seen
 
     def perturb_step_digits(self, individual, change_chance=0.5):
         perturbed = []
@@ -634,11 +808,13 @@ class Evaluator:
     def evaluate(self, individual, overrides_list):
         individual[:] = enforce_bounds(individual, self.bounds, self.sig_digits)
         config = individual_to_config(individual, optimizer_overrides, overrides_list, self.config)
-        individual_hash = calc_hash(individual)
-        if individual_hash in self.seen_hashes:
-            existing_score = self.seen_hashes[individual_hash]
-            self.duplicate_counter["count"] += 1
-            dup_ct = self.duplicate_counter["count"]
+        individual_hash = self.eval_cache.key(individual)
+        is_new, existing_score = self.eval_cache.claim(individual_hash)
+        if not is_new:
+            # evaluated or being evaluated already; explore a perturbed variant instead, and
+            # fall back to the cached objectives only if every variant is known too
+            self.n_duplicates += 1
+            dup_ct = self.n_duplicates
             perturbation_funcs = [
                 self.perturb_x_pct,
                 self.perturb_step_digits,
@@ -650,13 +826,12 @@ class Evaluator:
             for perturb_fn in perturbation_funcs:
                 perturbed = perturb_fn(individual)
                 perturbed = enforce_bounds(perturbed, self.bounds, self.sig_digits)
-                new_hash = calc_hash(perturbed)
-                if new_hash not in self.seen_hashes:
+                new_hash = self.eval_cache.key(perturbed)
+                if self.eval_cache.claim(new_hash)[0]:
                     logging.info(
                         f"[DUPLICATE {dup_ct}] resolved with {perturb_fn.__name__} Hash: {new_hash}"
                     )
                     individual[:] = perturbed
-                    self.seen_hashes[new_hash] = None
                     config = individual_to_config(
                         perturbed, optimizer_overrides, overrides_list, self.config
                     )
@@ -665,8 +840,6 @@ class Evaluator:
                 logging.info(f"[DUPLICATE {dup_ct}] All perturbations failed.")
                 if existing_score is not None:
                     return existing_score
-        else:
-            self.seen_hashes[individual_hash] = None
         analyses = {}
         for exchange in self.exchanges:
             bot_params, _, _ = prep_backtest_args(
@@ -685,45 +858,64 @@ class Evaluator:
                 bot_params,
                 self.exchange_params[exchange],
                 self.backtest_params[exchange],
+                analysis_only=True,
+                hlcvs_offset=self.hlcvs_offsets.get(exchange, 0),
+                hlcvs_indexes_file=self.hlcvs_indexes_files.get(exchange),
             )
             analyses[exchange] = expand_analysis(analysis_usd, analysis_btc, fills, config)
-        analyses_combined = self.combine_analyses(analyses)
-        objectives = self.calc_fitness(analyses_combined)
+        combined = self.combine_analyses(analyses)
+        objectives = self.calc_fitness(combined)
+        analyses_combined = dict(zip(self.combined_keys, combined.tolist()))
         for i, val in enumerate(objectives):
             analyses_combined[f"w_{i}"] = val
-        data = {
-            **config,
-            "analyses_combined": analyses_combined,
-            "analyses": analyses,
-        }
-        self.results_queue.put(data)
-        actual_hash = calc_hash(individual)
-        self.seen_hashes[actual_hash] = tuple(objectives)
+        results_batcher.add(individual, analyses, analyses_combined)
+        self.eval_cache.set(self.eval_cache.key(individual), objectives)
         return tuple(objectives)
 
     def combine_analyses(self, analyses):
-        analyses_combined = {}
-        keys = analyses[next(iter(analyses))].keys()
-        for key in keys:
-            values = [analysis[key] for analysis in analyses.values()]
-            if not values or any([x == np.inf for x in values]) or any([x is None for x in values]):
-                analyses_combined[f"{key}_mean"] = 0.0
-                analyses_combined[f"{key}_min"] = 0.0
-                analyses_combined[f"{key}_max"] = 0.0
-                analyses_combined[f"{key}_std"] = 0.0
-            else:
-                try:
-                    analyses_combined[f"{key}_mean"] = np.mean(values)
-                    analyses_combined[f"{key}_min"] = np.min(values)
-                    analyses_combined[f"{key}_max"] = np.max(values)
-                    analyses_combined[f"{key}_std"] = np.std(values)
-                except Exception as e:
-                    print("\n\n debug\n\n")
-                    print("key, values", key, values)
-                    print(e)
-                    traceback.print_exc()
-                    raise
-        return analyses_combined
+        """
+        Combine per-exchange analyses into {key}_mean/_min/_max/_std, returned as a float
+        vector in `self.combined_keys` order. The analyses become an (n_exchanges, n_keys)
+        matrix reduced along the exchange axis; keys with a None or inf value on any
+        exchange combine to 0.0.
+        """
+        keys = tuple(analyses[next(iter(analyses))])
+        if keys != self.analysis_keys:
+            self.compile_analysis_layout(keys)
+        rows = [[analysis[key] for key in keys] for analysis in analyses.values()]
+        matrix = np.array(rows, dtype=np.float64)  # None -> nan
+        invalid = (matrix == np.inf).any(axis=0)
+        if any(None in row for row in rows):
+            invalid |= np.array([[x is None for x in row] for row in rows]).any(axis=0)
+        with np.errstate(invalid="ignore"):  # inf columns are zeroed below
+            stats = np.stack(
+                [matrix.mean(axis=0), matrix.min(axis=0), matrix.max(axis=0), matrix.std(axis=0)],
+                axis=1,
+            )
+        stats[invalid] = 0.0
+        return stats.ravel()
+
+    def compile_analysis_layout(self, keys):
+        """Precompute combined key order plus index arrays for scoring and limit checks."""
+        self.analysis_keys = keys
+        self.combined_keys = [f"{key}_{stat}" for key in keys for stat in ["mean", "min", "max", "std"]]
+        positions = {key: i for i, key in enumerate(self.combined_keys)}
+        scoring_keys = [f"{sk}_mean" for sk in sorted(self.config["optimize"]["scoring"])]
+        self.scoring_complete = all(key in positions for key in scoring_keys)
+        self.scoring_idx = np.array(
+            [positions[key] for key in scoring_keys if key in positions], dtype=np.int64
+        )
+        self.scoring_weights_array = np.array(
+            [self.scoring_weights[sk] for sk in sorted(self.config["optimize"]["scoring"])],
+            dtype=np.float64,
+        )
+        checks = [check for check in self.limit_checks if check["metric_key"] in positions]
+        self.limit_idx = np.array([positions[c["metric_key"]] for c in checks], dtype=np.int64)
+        self.limit_bounds = np.array([c["bound"] for c in checks], dtype=np.float64)
+        self.limit_signs = np.array(
+            [1.0 if c["penalize_if"] == "greater" else -1.0 for c in checks], dtype=np.float64
+        )
+        self.limit_weights = np.array([c["penalty_weight"] for c in checks], dtype=np.float64)
 
     def build_limit_checks(self):
         self.limit_checks = []
@@ -757,27 +949,16 @@ class Evaluator:
                 }
             )
 
-    def calc_fitness(self, analyses_combined):
-        modifier = 0.0
-        for check in self.limit_checks:
-            val = analyses_combined.get(check["metric_key"])
-            if val is None:
-                continue
-
-            if check["penalize_if"] == "greater" and val > check["bound"]:
-                modifier += (val - check["bound"]) * (check["penalty_weight"])
-            elif check["penalize_if"] == "lower" and val < check["bound"]:
-                modifier += (check["bound"] - val) * (check["penalty_weight"])
-
-        scores = []
-        for sk in sorted(self.config["optimize"]["scoring"]):
-            val = analyses_combined.get(f"{sk}_mean")
-            if val is None:
-                val = analyses_combined.get(f"{sk}_mean")
-            if val is None:
-                return None
-            scores.append(val * self.scoring_weights[sk] + modifier)
-        return tuple(scores)
+    def calc_fitness(self, combined):
+        """Scores from a combine_analyses vector; None if a scoring key is missing."""
+        if not self.scoring_complete:
+            return None
+        # penalty for each violated limit: weight * distance beyond the bound
+        excess = (combined[self.limit_idx] - self.limit_bounds) * self.limit_signs
+        violated = excess > 0.0
+        modifier = sum((excess[violated] * self.limit_weights[violated]).tolist(), 0.0)
+        scores = combined[self.scoring_idx] * self.scoring_weights_array + modifier
+        return tuple(scores.tolist())
 
     def __del__(self):
         if hasattr(self, "mmap_contexts"):
@@ -800,6 +981,7 @@ class Evaluator:
                 self.shared_memory_files[exchange],
                 self.hlcvs_dtypes[exchange],
                 self.hlcvs_shapes[exchange],
+                self.hlcvs_offsets.get(exchange, 0),
             )
             self.shared_hlcvs_np[exchange] = self.mmap_contexts[exchange].__enter__()
             if self.shared_hlcvs_np[exchange] is None:
@@ -808,6 +990,178 @@ class Evaluator:
                 )
 
 
+worker_evaluator = None
+worker_overrides_list = None
+
+
+def init_optimizer_worker(results_queue, evaluator, overrides_list):
+    """Pool initializer: keep one Evaluator per worker instead of pickling it per task."""
+    global worker_evaluator, worker_overrides_list
+    init_results_batcher(results_queue)
+    worker_evaluator = evaluator
+    worker_overrides_list = overrides_list
+
+
+def evaluate_in_worker(individual):
+    # evaluate() may enforce bounds on or perturb the individual; send it back with its scores
+    objectives = worker_evaluator.evaluate(individual, worker_overrides_list)
+    return list(individual), objectives
+
+
+def ea_steady_state(
+    pool,
+    population,
+    toolbox,
+    mu,
+    cxpb,
+    mutpb,
+    n_offspring,
+    n_cpus,
+    stats=None,
+    halloffame=None,
+    merge_size=None,
+    max_in_flight=None,
+    checkpoint_fn=None,
+    checkpoint_interval=300.0,
+    resume_state=None,
+):
+    """
+    Asynchronous steady-state variant of DEAP's eaMuPlusLambda.
+
+    Instead of waiting for a whole generation, a new offspring (bred by varOr from the
+    current population) is submitted as soon as a worker frees up. Finished offspring
+    are merged into the population with toolbox.select every `merge_size` results, so
+    slow backtests no longer leave the other workers idle. Each merge is one logbook
+    entry.
+
+    If given, checkpoint_fn(state) is called with the loop state at most every
+    `checkpoint_interval` seconds and on exit; passing such a state back as
+    `resume_state` continues the run. Offspring in flight at checkpoint time are redone.
+    """
+    merge_size = merge_size or max(n_cpus, mu // 10)
+    max_in_flight = max_in_flight or 2 * n_cpus
+    if resume_state is None:
+        logbook = tools.Logbook()
+        logbook.header = ["gen", "evals"] + (stats.fields if stats else [])
+        gen, n_submitted, finished = 0, 0, []
+    else:
+        logbook = resume_state["logbook"]
+        gen = resume_state["gen"]
+        n_submitted = resume_state["n_done"]
+        finished = resume_state["finished"]
+    in_flight = 0
+    done = queue.Queue()
+
+    def submit(ind):
+        pool.apply_async(
+            evaluate_in_worker,
+            (ind,),
+            callback=lambda res, ind=ind: done.put((ind, res)),
+            error_callback=lambda exc, ind=ind: done.put((ind, exc)),
+        )
+
+    def receive():
+        ind, res = done.get()
+        if isinstance(res, BaseException):
+            raise res
+        ind[:], ind.fitness.values = res
+        return ind
+
+    def record(gen, evals):
+        if halloffame is not None:
+            halloffame.update(evals)
+        logbook.record(gen=gen, evals=len(evals), **(stats.compile(population) if stats else {}))
+
+    def save_state():
+        checkpoint_fn(
+            {
+                "population": population,
+                "halloffame": halloffame,
+                "logbook": logbook,
+                "gen": gen,
+                "n_done": n_submitted - in_flight,
+                "finished": finished,
+            }
+        )
+
+    last_checkpoint_ts = time.time()
+    try:
+        # evaluate the initial population (or what was left unevaluated when resuming)
+        invalid = [ind for ind in population if not ind.fitness.valid]
+        for ind in invalid:
+            submit(ind)
+        evaluated = [receive() for _ in invalid]
+        if resume_state is None:
+            record(0, evaluated)
+
+        while n_submitted < n_offspring or in_flight or finished:
+            while n_submitted < n_offspring and in_flight < max_in_flight:
+                submit(algorithms.varOr(population, toolbox, 1, cxpb, mutpb)[0])
+                n_submitted += 1
+                in_flight += 1
+            if in_flight:
+                finished.append(receive())
+                in_flight -= 1
+            if len(finished) >= merge_size or (in_flight == 0 and n_submitted >= n_offspring):
+                population[:] = toolbox.select(population + finished, mu)
+                gen += 1
+                record(gen, finished)
+                finished = []
+                if checkpoint_fn and time.time() - last_checkpoint_ts >= checkpoint_interval:
+                    save_state()
+                    last_checkpoint_ts = time.time()
+    finally:
+        if checkpoint_fn:
+            save_state()
+    return population, logbook
+
+
+CHECKPOINT_FILENAME = "checkpoint.pkl"
+
+
+def save_checkpoint(path, state):
+    """
+    Atomically write optimizer state (as plain lists) plus the RNG states.
+    Individuals are stored as (values, fitness values) pairs.
+    """
+
+    def dump_individuals(inds):
+        return [(list(ind), tuple(ind.fitness.values)) for ind in inds or []]
+
+    state = {
+        **state,
+        "version": 1,
+        "population": dump_individuals(state["population"]),
+        "halloffame": dump_individuals(state["halloffame"]),
+        "finished": dump_individuals(state["finished"]),
+        "random_state": random.getstate(),
+        "np_random_state": np.random.get_state(),
+    }
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path, individual_cls):
+    """Load a checkpoint written by save_checkpoint, rebuilding individuals."""
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+
+    def load_individuals(items):
+        inds = []
+        for values, fitness in items:
+            ind = individual_cls(values)
+            if fitness:
+                ind.fitness.values = fitness
+            inds.append(ind)
+        return inds
+
+    for key in ["population", "halloffame", "finished"]:
+        state[key] = load_individuals(state[key])
+    return state
+
+
 def add_extra_options(parser):
     parser.add_argument(
         "-t",
@@ -818,6 +1172,14 @@ def add_extra_options(parser):
         default=None,
         help="Start with given live configs. Single json file or dir with multiple json files",
     )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        required=False,
+        dest="resume",
+        default=None,
+        help="Continue the optimization checkpointed in given results dir. Config args are ignored",
+    )
 
 
 def extract_configs(path):
@@ -874,6 +1236,35 @@ def configs_to_individuals(cfgs, bounds, sig_digits=0):
     return list(inds.values())
 
 
+def create_initial_population(toolbox, config, args, bounds, sig_digits):
+    logging.info(f"Creating initial population...")
+
+    starting_individuals = configs_to_individuals(
+        get_starting_configs(args.starting_configs),
+        bounds,
+        sig_digits,
+    )
+    if (nstart := len(starting_individuals)) > (popsize := config["optimize"]["population_size"]):
+        logging.info(f"Number of starting configs greater than population size.")
+        logging.info(f"Increasing population size: {popsize} -> {nstart}")
+        config["optimize"]["population_size"] = nstart
+
+    population = toolbox.population(n=config["optimize"]["population_size"])
+    if starting_individuals:
+        for i in range(len(starting_individuals)):
+            population[i] = creator.Individual(starting_individuals[i])
+
+        # populate up to half of the population with duplicates of random choices within starting configs
+        # duplicates will be perturbed during runtime
+        for i in range(len(starting_individuals), len(population) // 2):
+            population[i] = deepcopy(population[np.random.choice(range(len(starting_individuals)))])
+    for i in range(len(population)):
+        population[i][:] = enforce_bounds(population[i], bounds, sig_digits)
+
+    logging.info(f"Initial population size: {len(population)}")
+    return population
+
+
 async def main():
     manage_rust_compilation()
     parser = argparse.ArgumentParser(prog="optimize", description="run optimizer")
@@ -894,20 +1285,32 @@ async def main():
     add_arguments_recursively(parser, template_config)
     add_extra_options(parser)
     args = parser.parse_args()
-    if args.config_path is None:
-        logging.info(f"loading default template config configs/template.json")
-        config = load_config("configs/template.json", verbose=True)
+    checkpoint_path = None
+    if args.resume is not None:
+        checkpoint_path = os.path.join(args.resume, CHECKPOINT_FILENAME)
+        if not os.path.exists(checkpoint_path):
+            raise FileNotFoundError(f"no checkpoint found in {args.resume}")
+        with open(checkpoint_path, "rb") as f:
+            config = pickle.load(f)["config"]
+        logging.info(f"resuming optimization from {args.resume} with its checkpointed config")
     else:
-        logging.info(f"loading config {args.config_path}")
-        config = load_config(args.config_path, verbose=True)
-    old_config = deepcopy(config)
-    update_config_with_args(config, args)
-    config = format_config(config, verbose=True)
-    await add_all_eligible_coins_to_config(config)
+        if args.config_path is None:
+            logging.info(f"loading default template config configs/template.json")
+            config = load_config("configs/template.json", verbose=True)
+        else:
+            logging.info(f"loading config {args.config_path}")
+            config = load_config(args.config_path, verbose=True)
+        old_config = deepcopy(config)
+        update_config_with_args(config, args)
+        config = format_config(config, verbose=True)
+        await add_all_eligible_coins_to_config(config)
     try:
         # Prepare data for each exchange
         hlcvs_dict = {}
         shared_memory_files = {}
+        hlcvs_offsets = {}
+        hlcvs_indexes_files = {}
+        cached_shared_memory_files = set()  # cache files used in place; never deleted
         hlcvs_shapes = {}
         hlcvs_dtypes = {}
         msss = {}
@@ -922,7 +1325,7 @@ async def main():
         if config["backtest"]["combine_ohlcvs"]:
             exchange = "combined"
             coins, hlcvs, mss, results_path, cache_dir, btc_usd_prices = await prepare_hlcvs_mss(
-                config, exchange
+                config, exchange, mmap_hlcvs=True
             )
             exchange_preference = defaultdict(list)
             for coin in coins:
@@ -934,12 +1337,17 @@ async def main():
             hlcvs_shapes[exchange] = hlcvs.shape
             hlcvs_dtypes[exchange] = hlcvs.dtype
             msss[exchange] = mss
-            required_space = hlcvs.nbytes * 1.1  # Add 10% buffer
-            check_disk_space(tempfile.gettempdir(), required_space)
             logging.info(f"Starting to create shared memory file for {exchange}...")
             validate_array(hlcvs, "hlcvs")
-            shared_memory_file = create_shared_memory_file(hlcvs)
+            shared_memory_file, hlcvs_offsets[exchange], is_temp = get_shared_hlcvs_file(
+                hlcvs, cache_dir
+            )
             shared_memory_files[exchange] = shared_memory_file
+            if not is_temp:
+                cached_shared_memory_files.add(shared_memory_file)
+            hlcvs_indexes_files[exchange] = build_hlcvs_indexes_file(
+                shared_memory_file, hlcvs, hlcvs_offsets[exchange], is_temp
+            )
             if config["backtest"].get("use_btc_collateral", False):
                 # Use the fetched array
                 btc_usd_data_dict[exchange] = btc_usd_prices
@@ -955,7 +1363,9 @@ async def main():
         else:
             tasks = {}
             for exchange in config["backtest"]["exchanges"]:
-                tasks[exchange] = asyncio.create_task(prepare_hlcvs_mss(config, exchange))
+                tasks[exchange] = asyncio.create_task(
+                    prepare_hlcvs_mss(config, exchange, mmap_hlcvs=True)
+                )
             for exchange in config["backtest"]["exchanges"]:
                 coins, hlcvs, mss, results_path, cache_dir, btc_usd_prices = await tasks[exchange]
                 config["backtest"]["coins"][exchange] = coins
@@ -963,12 +1373,17 @@ async def main():
                 hlcvs_shapes[exchange] = hlcvs.shape
                 hlcvs_dtypes[exchange] = hlcvs.dtype
                 msss[exchange] = mss
-                required_space = hlcvs.nbytes * 1.1  # Add 10% buffer
-                check_disk_space(tempfile.gettempdir(), required_space)
                 logging.info(f"Starting to create shared memory file for {exchange}...")
                 validate_array(hlcvs, "hlcvs")
-                shared_memory_file = create_shared_memory_file(hlcvs)
+                shared_memory_file, hlcvs_offsets[exchange], is_temp = get_shared_hlcvs_file(
+                    hlcvs, cache_dir
+                )
                 shared_memory_files[exchange] = shared_memory_file
+                if not is_temp:
+                    cached_shared_memory_files.add(shared_memory_file)
+                hlcvs_indexes_files[exchange] = build_hlcvs_indexes_file(
+                    shared_memory_file, hlcvs, hlcvs_offsets[exchange], is_temp
+                )
                 # Create the BTC array for this exchange
                 if config["backtest"].get("use_btc_collateral", False):
                     btc_usd_data_dict[exchange] = btc_usd_prices
@@ -983,44 +1398,63 @@ async def main():
                 logging.info(
                     f"Finished creating shared memory file for {exchange}: {shared_memory_file}"
                 )
-        exchanges = config["backtest"]["exchanges"]
-        exchanges_fname = "combined" if config["backtest"]["combine_ohlcvs"] else "_".join(exchanges)
-        date_fname = ts_to_date_utc(utc_ms())[:19].replace(":", "_")
-        coins = sorted(set([x for y in config["backtest"]["coins"].values() for x in y]))
-        coins_fname = "_".join(coins) if len(coins) <= 6 else f"{len(coins)}_coins"
-        hash_snippet = uuid4().hex[:8]
-        n_days = int(
-            round(
-                (
-                    date_to_ts(config["backtest"]["end_date"])
-                    - date_to_ts(config["backtest"]["start_date"])
+        if args.resume is not None:
+            results_dir = args.resume
+        else:
+            exchanges = config["backtest"]["exchanges"]
+            exchanges_fname = (
+                "combined" if config["backtest"]["combine_ohlcvs"] else "_".join(exchanges)
+            )
+            date_fname = ts_to_date_utc(utc_ms())[:19].replace(":", "_")
+            coins = sorted(set([x for y in config["backtest"]["coins"].values() for x in y]))
+            coins_fname = "_".join(coins) if len(coins) <= 6 else f"{len(coins)}_coins"
+            hash_snippet = uuid4().hex[:8]
+            n_days = int(
+                round(
+                    (
+                        date_to_ts(config["backtest"]["end_date"])
+                        - date_to_ts(config["backtest"]["start_date"])
+                    )
+                    / (1000 * 60 * 60 * 24)
                 )
-                / (1000 * 60 * 60 * 24)
             )
-        )
-        results_dir = make_get_filepath(
-            f"optimize_results/{date_fname}_{exchanges_fname}_{n_days}days_{coins_fname}_{hash_snippet}/"
-        )
+            results_dir = make_get_filepath(
+                f"optimize_results/{date_fname}_{exchanges_fname}_{n_days}days_{coins_fname}_{hash_snippet}/"
+            )
         os.makedirs(results_dir, exist_ok=True)
         config["results_dir"] = results_dir
         results_filename = os.path.join(results_dir, "all_results.bin")
         config["results_filename"] = results_filename
         overrides_list = config.get("optimize", {}).get("enable_overrides", [])
 
-        # Create results queue and start manager process
-        manager = multiprocessing.Manager()
-        results_queue = manager.Queue()
-        seen_hashes = manager.dict()
-        duplicate_counter = manager.dict()
-        duplicate_counter["count"] = 0
+        # Results go from the pool workers to the writer in batches over a plain pipe queue
+        results_queue = multiprocessing.Queue()
+        eval_cache = EvalCache(
+            os.path.join("caches", "optimize", "eval_cache.sqlite"),
+            calc_eval_fingerprint(
+                config,
+                [
+                    get_cache_hash(config, exchange)
+                    for exchange in (
+                        ["combined"]
+                        if config["backtest"]["combine_ohlcvs"]
+                        else config["backtest"]["exchanges"]
+                    )
+                ],
+                calc_extension_hash(pbr),
+            ),
+        )
+        eval_cache.clear_claims()
+        logging.info(f"Evaluation cache: {eval_cache.count()} cached results for this setup")
         flush_interval = 60  # or read from your config
         sig_digits = config["optimize"]["round_to_n_significant_digits"]
         writer_process = multiprocessing.Process(
             target=results_writer_process,
-            args=(results_queue, results_dir, sig_digits, flush_interval),
+            args=(results_queue, results_dir, sig_digits, flush_interval, config, overrides_list),
             kwargs={
                 "compress": config["optimize"]["compress_results_file"],
                 "write_all_results": config["optimize"].get("write_all_results", True),  # ← new
+                "results_format": config["optimize"].get("results_format", "msgpack"),
             },
         )
         writer_process.start()
@@ -1048,9 +1482,9 @@ async def main():
             btc_usd_dtypes=btc_usd_dtypes,
             msss=msss,
             config=config,
-            results_queue=results_queue,
-            seen_hashes=seen_hashes,
-            duplicate_counter=duplicate_counter,
+            eval_cache=eval_cache,
+            hlcvs_offsets=hlcvs_offsets,
+            hlcvs_indexes_files=hlcvs_indexes_files,
         )
 
         logging.info(f"Finished initializing evaluator...")
@@ -1074,9 +1508,6 @@ async def main():
         toolbox.register("individual", create_individual)
         toolbox.register("population", tools.initRepeat, list, toolbox.individual)
 
-        # Register the evaluation function
-        toolbox.register("evaluate", evaluator.evaluate, overrides_list=overrides_list)
-
         # Register genetic operators
         toolbox.register(
             "mate",
@@ -1097,38 +1528,24 @@ async def main():
 
         # Parallelization setup
         logging.info(f"Initializing multiprocessing pool. N cpus: {config['optimize']['n_cpus']}")
-        pool = multiprocessing.Pool(processes=config["optimize"]["n_cpus"])
-        toolbox.register("map", pool.map)
-        logging.info(f"Finished initializing multiprocessing pool.")
-
-        # Create initial population
-        logging.info(f"Creating initial population...")
-
-        starting_individuals = configs_to_individuals(
-            get_starting_configs(args.starting_configs),
-            bounds,
-            sig_digits,
+        pool = multiprocessing.Pool(
+            processes=config["optimize"]["n_cpus"],
+            initializer=init_optimizer_worker,
+            initargs=(results_queue, evaluator, overrides_list),
         )
-        if (nstart := len(starting_individuals)) > (popsize := config["optimize"]["population_size"]):
-            logging.info(f"Number of starting configs greater than population size.")
-            logging.info(f"Increasing population size: {popsize} -> {nstart}")
-            config["optimize"]["population_size"] = nstart
-
-        population = toolbox.population(n=config["optimize"]["population_size"])
-        if starting_individuals:
-            for i in range(len(starting_individuals)):
-                population[i] = creator.Individual(starting_individuals[i])
-
-            # populate up to half of the population with duplicates of random choices within starting configs
-            # duplicates will be perturbed during runtime
-            for i in range(len(starting_individuals), len(population) // 2):
-                population[i] = deepcopy(
-                    population[np.random.choice(range(len(starting_individuals)))]
-                )
-        for i in range(len(population)):
-            population[i][:] = enforce_bounds(population[i], bounds, sig_digits)
+        logging.info(f"Finished initializing multiprocessing pool.")
 
-        logging.info(f"Initial population size: {len(population)}")
+        checkpoint = None
+        if args.resume is not None:
+            checkpoint = load_checkpoint(checkpoint_path, creator.Individual)
+            population = checkpoint["population"]
+            logging.info(
+                f"Resumed population of {len(population)} at {checkpoint['n_done']}/"
+                f"{checkpoint['n_offspring']} offspring"
+            )
+        else:
+            population = create_initial_population(toolbox, config, args, bounds, sig_digits)
+        checkpoint_path = os.path.join(results_dir, CHECKPOINT_FILENAME)
 
         # Set up statistics and hall of fame
         stats = tools.Statistics(lambda ind: ind.fitness.values)
@@ -1137,25 +1554,38 @@ async def main():
         stats.register("min", np.min, axis=0)
         stats.register("max", np.max, axis=0)
 
-        logbook = tools.Logbook()
-        # logbook.header = "gen", "evals", "std", "min", "avg", "max"
-        logbook.header = "gen", "evals", "min", "max"
-
         hof = tools.ParetoFront()
 
+        if checkpoint is not None:
+            hof.update(checkpoint["halloffame"])
+            random.setstate(checkpoint["random_state"])
+            np.random.set_state(checkpoint["np_random_state"])
+            n_offspring = checkpoint["n_offspring"]
+        else:
+            # same evaluation budget as the former generational loop: ngen * lambda offspring
+            n_offspring = (
+                max(1, int(config["optimize"]["iters"] / len(population)))
+                * config["optimize"]["population_size"]
+            )
+
+        def checkpoint_fn(state):
+            save_checkpoint(checkpoint_path, {**state, "config": config, "n_offspring": n_offspring})
+
         # Run the optimization
         logging.info(f"Starting optimize...")
-        population, logbook = algorithms.eaMuPlusLambda(
+        population, logbook = ea_steady_state(
+            pool,
             population,
             toolbox,
             mu=config["optimize"]["population_size"],
-            lambda_=config["optimize"]["population_size"],
             cxpb=config["optimize"]["crossover_probability"],
             mutpb=config["optimize"]["mutation_probability"],
-            ngen=max(1, int(config["optimize"]["iters"] / len(population))),
+            n_offspring=n_offspring,
+            n_cpus=config["optimize"]["n_cpus"],
             stats=stats,
             halloffame=hof,
-            verbose=False,
+            checkpoint_fn=checkpoint_fn,
+            resume_state=checkpoint,
         )
 
         # Print statistics
@@ -1163,29 +1593,41 @@ async def main():
 
         logging.info(f"Optimization complete.")
 
+        # let the workers exit cleanly so they send their last partial batches
+        pool.close()
+        pool.join()
+
     except Exception as e:
         logging.error(f"An error occurred: {e}")
         traceback.print_exc()
     finally:
-        # Signal the writer process to shut down and wait for it
-        if "results_queue" in locals():
-            results_queue.put("DONE")
-            writer_process.join()
         if "pool" in locals():
             logging.info("Closing and terminating the process pool...")
             pool.close()
             pool.terminate()
             pool.join()
+        # Signal the writer process to shut down and wait for it
+        if "writer_process" in locals():
+            results_queue.put("DONE")
+            writer_process.join()
 
         # Remove shared memory files (including BTC/USD)
         if "shared_memory_files" in locals():
             for shared_memory_file in shared_memory_files.values():
+                if shared_memory_file in cached_shared_memory_files:
+                    continue
                 if shared_memory_file and os.path.exists(shared_memory_file):
                     logging.info(f"Removing shared memory file: {shared_memory_file}")
                     try:
                         os.unlink(shared_memory_file)
                     except Exception as e:
                         logging.error(f"Error removing shared memory file: {e}")
+                indexes_file = f"{shared_memory_file}.indexes"
+                if os.path.exists(indexes_file):
+                    try:
+                        os.unlink(indexes_file)
+                    except Exception as e:
+                        logging.error(f"Error removing HLCV indexes file: {e}")
         if "btc_usd_shared_memory_file" in locals():
             if btc_usd_shared_memory_file and os.path.exists(btc_usd_shared_memory_file):
                 logging.info(f"Removing BTC/USD shared memory file: {btc_usd_shared_memory_file}")
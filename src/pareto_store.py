@@ -4,16 +4,125 @@ import json
 import hashlib
 from typing import Dict
 import glob
-import math
 import time
 import numpy as np
 import threading
 import logging
 import passivbot_rust as pbr
-from opt_utils import calc_normalized_dist, round_floats, dominates
+from opt_utils import calc_normalized_dist, round_floats
 from pure_funcs import calc_hash
 
 
+class ParetoArchive:
+    """
+    Non-dominated set of objective vectors (all minimized), stored as a NumPy matrix so
+    dominance checks against the whole front are a few vectorized comparisons.
+    Rows are kept contiguous; each row has a key (the entry hash).
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._capacity = capacity
+        self._objs = None  # (capacity, n_objectives) float64, rows [0, n) valid
+        self._keys = np.empty(capacity, dtype=object)
+        self._n = 0
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def keys(self) -> np.ndarray:
+        return self._keys[: self._n]
+
+    @property
+    def objectives(self) -> np.ndarray:
+        if self._objs is None:
+            return np.empty((0, 0))
+        return self._objs[: self._n]
+
+    def is_dominated(self, obj) -> bool:
+        """True if any member dominates obj."""
+        if not self._n:
+            return False
+        front = self.objectives
+        obj = np.asarray(obj, dtype=np.float64)
+        return bool(np.any(np.all(front <= obj, axis=1) & np.any(front < obj, axis=1)))
+
+    def add(self, obj, key) -> list:
+        """
+        Insert obj (assumed not dominated), dropping the members it dominates.
+        Returns the keys of the dropped members.
+        """
+        obj = np.asarray(obj, dtype=np.float64)
+        if self._objs is None:
+            self._objs = np.empty((self._capacity, len(obj)), dtype=np.float64)
+        removed = []
+        if self._n:
+            front = self.objectives
+            dominated = np.all(obj <= front, axis=1) & np.any(obj < front, axis=1)
+            if dominated.any():
+                removed = list(self._keys[: self._n][dominated])
+                keep = ~dominated
+                n_keep = int(keep.sum())
+                self._objs[:n_keep] = front[keep]
+                self._keys[:n_keep] = self._keys[: self._n][keep]
+                self._keys[n_keep : self._n] = None
+                self._n = n_keep
+        if self._n == self._capacity:
+            self._capacity *= 2
+            objs = np.empty((self._capacity, self._objs.shape[1]), dtype=np.float64)
+            objs[: self._n] = self._objs[: self._n]
+            self._objs = objs
+            keys = np.empty(self._capacity, dtype=object)
+            keys[: self._n] = self._keys[: self._n]
+            self._keys = keys
+        self._objs[self._n] = obj
+        self._keys[self._n] = key
+        self._n += 1
+        return removed
+
+    def load(self, objectives: np.ndarray, keys) -> None:
+        """Replace the contents with a known non-dominated set (no dominance checks)."""
+        n = len(keys)
+        self._capacity = max(self._capacity, n)
+        self._objs = np.empty((self._capacity, objectives.shape[1]), dtype=np.float64)
+        self._objs[:n] = objectives
+        self._keys = np.empty(self._capacity, dtype=object)
+        self._keys[:n] = list(keys)
+        self._n = n
+
+
+SIDECAR_FILENAME = "index.npz"
+
+
+def get_w_keys(keys) -> list[str]:
+    """Objective keys w_0, w_1, ... among `keys`, in objective order (w_2 before w_10)."""
+    return sorted((k for k in keys if k.startswith("w_")), key=lambda k: int(k[2:]))
+
+
+def write_pareto_sidecar(path: str, hashes, objectives, w_keys, scoring_keys) -> None:
+    """Atomically write the binary front summary: member hashes and objective matrix."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(
+            f,
+            hashes=np.array(list(hashes), dtype="U64"),
+            objectives=np.asarray(objectives, dtype=np.float64),
+            w_keys=np.array(list(w_keys or []), dtype=str),
+            scoring=np.array(list(scoring_keys or []), dtype=str),
+        )
+    os.replace(tmp, path)
+
+
+def load_pareto_sidecar(path: str) -> dict:
+    with np.load(path) as data:
+        return {
+            "hashes": [str(h) for h in data["hashes"]],
+            "objectives": data["objectives"].reshape(len(data["hashes"]), -1),
+            "w_keys": [str(k) for k in data["w_keys"]],
+            "scoring": [str(k) for k in data["scoring"]],
+        }
+
+
 class ParetoStore:
     def __init__(
         self,
@@ -29,16 +138,23 @@ class ParetoStore:
         self.flush_interval = flush_interval  # seconds
         os.makedirs(os.path.join(self.directory, "pareto"), exist_ok=True)
         # --- in‑memory structures -----------------------------------------
-        self._entries: dict[str, dict] = {}  # hash -> full entry
+        self._entries: dict[str, dict] = {}  # hash -> full entry; lazy-loaded after bootstrap
         self._objectives: dict[str, tuple] = {}  # hash -> objective vector
-        self._front: list[str] = []  # list of hashes (Pareto set)
+        self._archive = ParetoArchive()  # Pareto set: objective matrix + hashes
         self._objective_lookup: dict[tuple, str] = {}  # objective vector ➜ hash
+        # --- on-disk state, tracked so flushes only touch what changed ------
+        self.index_path = os.path.join(self.directory, "index.json")
+        self.sidecar_path = os.path.join(self.directory, SIDECAR_FILENAME)
+        self._files: dict[str, str] = {}  # hash -> member file written to pareto/
+        self._stale_files: list[str] = []  # files of removed members, deleted on flush
+        self._index_dirty = False
         # ------------------------------------------------------------------
         self.n_iters = 0
         self._last_flush_ts = time.time()
         self._lock = threading.RLock()
 
         self.scoring_keys = None
+        self._w_keys = None
 
         # bootstrap from disk if any
         self._bootstrap_from_disk()
@@ -48,41 +164,45 @@ class ParetoStore:
         Add a new entry, update Pareto front in‑memory.
         Return True if the store actually changed.
         """
+        return self._add_entry(entry) is not None
+
+    def _add_entry(self, entry: dict) -> str | None:
+        """add_entry returning the hash of the accepted entry, or None."""
         self.n_iters += 1
         if self.scoring_keys is None:
             self.scoring_keys = entry["optimize"]["scoring"]
-        rounded = round_floats(entry, self.sig_digits)
-        h = calc_hash(rounded)
+        # objective vector = w_i keys in objective order, rounded like the stored entry will be
+        w_keys = get_w_keys(entry["analyses_combined"])
+        if self._w_keys is None:
+            self._w_keys = w_keys
+        obj = tuple(round_floats([entry["analyses_combined"][k] for k in w_keys], self.sig_digits))
         with self._lock:
-            if h in self._entries:  # fast‑dedupe
-                return False
-
-            # objective vector = sorted w_i keys
-            w_keys = sorted(k for k in rounded["analyses_combined"] if k.startswith("w_"))
-            obj = tuple(rounded["analyses_combined"][k] for k in w_keys)
-
             # ───────────── NEW: dedupe on the objective vector ──────────────
             # identical after rounding  → nothing new to store or write
             if obj in self._objective_lookup:
                 self._log.info(f"Dropping candidate whose obj score is already present: {obj}")
-                return False
+                return None
             # ────────────────────────────────────────────────────────────────
 
             # discard if dominated by current front
-            if any(dominates(self._objectives[idx], obj) for idx in self._front):
-                return False
+            if self._archive.is_dominated(obj):
+                return None
 
-            # remove dominated members
-            dominated = [idx for idx in self._front if dominates(obj, self._objectives[idx])]
-            for idx in dominated:
-                del self._objective_lookup[self._objectives[idx]]
-                self._front.remove(idx)
+            # accepted: only now round and hash the full entry
+            rounded = round_floats(entry, self.sig_digits)
+            h = calc_hash(rounded)
 
-            # add new member
+            # add new member, removing the ones it dominates
+            dominated = self._archive.add(obj, h)
+            for idx in dominated:
+                del self._objective_lookup[self._objectives.pop(idx)]
+                self._entries.pop(idx, None)
+                if idx in self._files:
+                    self._stale_files.append(self._files.pop(idx))
             self._entries[h] = rounded
             self._objectives[h] = obj
-            self._front.append(h)
             self._objective_lookup[obj] = h
+            self._index_dirty = True
 
             self._log_front_state(
                 added=1,
@@ -92,83 +212,168 @@ class ParetoStore:
             # maybe flush
             self._maybe_flush()
 
-            return True
+            return h
+
+    def is_candidate(self, objectives) -> bool:
+        """
+        Cheap pre-check on the objective vector alone: False if `add_entry` would
+        certainly reject an entry with these objectives.
+        """
+        obj = tuple(round_floats(list(objectives), self.sig_digits))
+        with self._lock:
+            if obj in self._objective_lookup:
+                return False
+            return not self._archive.is_dominated(obj)
 
     def get_front(self) -> list[dict]:
         with self._lock:
-            return [self._entries[h] for h in self._front]
+            return [self._get_entry(h) for h in self._archive.keys]
+
+    def _get_entry(self, h: str) -> dict:
+        if h not in self._entries:
+            with open(self._files[h]) as f:
+                self._entries[h] = json.load(f)
+        return self._entries[h]
 
     def flush_now(self) -> None:
         """Force a write of the current in‑memory set to disk."""
         with self._lock:
-            self._write_all_to_disk()
+            self._flush_to_disk()
             self._last_flush_ts = time.time()
 
     def _maybe_flush(self) -> None:
         if time.time() - self._last_flush_ts >= self.flush_interval:
-            self._write_all_to_disk()
+            self._flush_to_disk()
             self._last_flush_ts = time.time()
 
-    def _write_all_to_disk(self) -> None:
+    def _flush_to_disk(self) -> None:
         """
-        Flush the current Pareto front to disk.
-
-        * For every hash in ``self._front`` an up‑to‑date
-          ``"<dist>_<hash>.json"`` file is created if it does not already exist.
-        * After writing, every ``*.json`` file whose hash is **not** in
-          the front is removed.  The directory therefore mirrors the
-          in‑memory set 1‑to‑1.
+        Bring the pareto/ directory and the index up to date, touching only what changed.
+
+        * Each member is written once, as ``pareto/<hash>.json``, on the first flush
+          after it joined the front.
+        * Files of members that left the front are deleted (tracked in memory; no
+          directory scan).
+        * ``index.json`` lists the members ranked by normalized distance to the ideal
+          point. Distances shift as the front changes, so they live only in this one
+          file, rewritten atomically when the front changed.
         """
-        if not self._front:
-            return
-
-        # ── distance normalisation ------------------------------------------------
-        obj_matrix = [self._objectives[h] for h in self._front]
-        mins = [min(col) for col in zip(*obj_matrix)]
-        maxs = [max(col) for col in zip(*obj_matrix)]
-
-        live_files: set[str] = set()
-
-        for h in self._front:
-            obj = self._objectives[h]
-            norm = [(v - mi) / (ma - mi) if ma > mi else 0.0 for v, mi, ma in zip(obj, mins, maxs)]
-            dist = math.sqrt(sum(v * v for v in norm))
-            path = os.path.join(self.pareto_dir, f"{dist:08.4f}_{h}.json")
-            live_files.add(path)
-
-            if not os.path.exists(path):
+        for fp in self._stale_files:
+            try:
+                os.remove(fp)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self._log.warning("Could not remove obsolete Pareto file %s: %s", fp, e)
+        self._stale_files = []
+
+        for h in self._archive.keys:
+            if h not in self._files:
+                path = os.path.join(self.pareto_dir, f"{h}.json")
                 tmp = path + ".tmp"
                 with open(tmp, "w") as f:
                     json.dump(self._entries[h], f, separators=(",", ":"), indent=4)
                 os.replace(tmp, path)
-
-        # ── one‑pass purge of everything that is *not* in the front --------------
-        for fp in glob.glob(os.path.join(self.pareto_dir, "*.json")):
-            if fp not in live_files:
-                try:
-                    os.remove(fp)
-                except OSError as e:
-                    self._log.warning("Could not remove obsolete Pareto file %s: %s", fp, e)
+                self._files[h] = path
+
+        if self._index_dirty:
+            self._write_index()
+            self._index_dirty = False
+
+    def _write_index(self) -> None:
+        members = []
+        if len(self._archive):
+            # ── distance normalisation --------------------------------------------
+            obj_matrix = self._archive.objectives
+            mins = obj_matrix.min(axis=0)
+            maxs = obj_matrix.max(axis=0)
+            spans = maxs - mins
+            norm = np.divide(
+                obj_matrix - mins, spans, out=np.zeros_like(obj_matrix), where=spans > 0.0
+            )
+            dists = np.sqrt((norm * norm).sum(axis=1))
+            for i in np.argsort(dists, kind="stable"):
+                h = self._archive.keys[i]
+                members.append(
+                    {
+                        "hash": h,
+                        "file": os.path.relpath(self._files[h], self.directory),
+                        "distance": round(float(dists[i]), 6),
+                        "objectives": list(self._objectives[h]),
+                    }
+                )
+        index = {"scoring": self.scoring_keys, "members": members}
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp, self.index_path)
+        write_pareto_sidecar(
+            self.sidecar_path,
+            self._archive.keys,
+            self._archive.objectives,
+            self._w_keys,
+            self.scoring_keys,
+        )
 
     def _bootstrap_from_disk(self) -> None:
         """
         Read existing *.json files once at start so we don’t lose old results
         when the new optimizer run appends.
+
+        Members listed in the binary sidecar are restored from it directly (hashes and
+        objectives only; entries are read from disk when requested). Only files missing
+        from the sidecar go through add_entry.
         """
-        for fp in glob.glob(os.path.join(self.pareto_dir, "*.json")):
+        paths = glob.glob(os.path.join(self.pareto_dir, "*.json"))
+        if os.path.exists(self.sidecar_path):
+            try:
+                paths = self._bootstrap_from_sidecar(paths)
+            except Exception as e:
+                self._log.warning("Unable to load %s, reading all files: %s", self.sidecar_path, e)
+        for fp in paths:
             try:
                 with open(fp) as f:
                     entry = json.load(f)
-                self.add_entry(entry)  # uses the normal path
+                h = self._add_entry(entry)  # uses the normal path
             except Exception as e:
                 print(f"bootstrap skip {fp}: {e}")
+                continue
+            if h is None:
+                self._stale_files.append(fp)
+            else:
+                # already on disk; files named <dist>_<hash>.json by older versions are
+                # rewritten under the current name on the next flush
+                if os.path.basename(fp) == f"{h}.json":
+                    self._files[h] = fp
+                else:
+                    self._stale_files.append(fp)
+
+    def _bootstrap_from_sidecar(self, paths: list[str]) -> list[str]:
+        """Restore the front from the sidecar; return the paths it does not cover."""
+        sidecar = load_pareto_sidecar(self.sidecar_path)
+        by_name = {os.path.basename(fp): fp for fp in paths}
+        rows = [i for i, h in enumerate(sidecar["hashes"]) if f"{h}.json" in by_name]
+        hashes = [sidecar["hashes"][i] for i in rows]
+        objectives = sidecar["objectives"][rows]
+        self._archive.load(objectives, hashes)
+        for h, obj in zip(hashes, objectives):
+            obj = tuple(float(x) for x in obj)
+            self._objectives[h] = obj
+            self._objective_lookup[obj] = h
+            self._files[h] = by_name[f"{h}.json"]
+        self.scoring_keys = sidecar["scoring"] or None
+        self._w_keys = sidecar["w_keys"] or None
+        if len(hashes) != len(sidecar["hashes"]):
+            self._index_dirty = True
+        covered = set(self._files.values())
+        return [fp for fp in paths if fp not in covered]
 
     def _log_front_state(self, *, added: int, removed: int) -> None:
         """Emit a compact one‑liner with min / max / spread per objective."""
-        objs = [self._objectives[idx] for idx in self._front]
+        objs = self._archive.objectives
 
-        mins = [min(col) for col in zip(*objs)]
-        maxs = [max(col) for col in zip(*objs)]
+        mins = objs.min(axis=0)
+        maxs = objs.max(axis=0)
 
         metrics = []
         for i, key in enumerate(self.scoring_keys):
@@ -178,7 +383,7 @@ class ParetoStore:
 
         line = " | ".join(metrics)
         self._log.info(
-            f"Iter: {self.n_iters} | Pareto ↑ | +{added}/-{removed} | size:{len(self._front)} | {line}"
+            f"Iter: {self.n_iters} | Pareto ↑ | +{added}/-{removed} | size:{len(self._archive)} | {line}"
         )
 
 
@@ -303,13 +508,31 @@ def main():
             except Exception as e:
                 print(f"Skipping invalid limit expression '{expr}': {e}")
 
-    for entry_path in entries:
+    # without limit filters only objectives are needed: take them from the binary sidecar
+    # and read just the member files it does not cover
+    sidecar_path = os.path.join(os.path.dirname(os.path.abspath(pareto_dir)), SIDECAR_FILENAME)
+    if not limit_checks and os.path.exists(sidecar_path):
+        sidecar = load_pareto_sidecar(sidecar_path)
+        names = {os.path.basename(fp) for fp in entries}
+        w_keys = sidecar["w_keys"]
+        metric_names = sidecar["scoring"]
+        metric_name_map = {f"w_{i}": name for i, name in enumerate(metric_names)}
+        for h, obj in zip(sidecar["hashes"], sidecar["objectives"]):
+            if f"{h}.json" in names:
+                points.append((*obj, h))
+                filenames[h] = f"{h}.json"
+        covered = set(filenames.values())
+        entries_to_read = [fp for fp in entries if os.path.basename(fp) not in covered]
+    else:
+        entries_to_read = entries
+
+    for entry_path in entries_to_read:
         try:
             with open(entry_path) as f:
                 entry = json.load(f)
             h = os.path.splitext(os.path.basename(entry_path))[0].split("_")[-1]
             if not w_keys:
-                w_keys = sorted(k for k in entry.get("analyses_combined", {}) if k.startswith("w_"))
+                w_keys = get_w_keys(entry.get("analyses_combined", {}))
             if metric_names is None:
                 metric_names = entry.get("optimize", {}).get("scoring", [])
                 metric_name_map = {f"w_{i}": name for i, name in enumerate(metric_names)}
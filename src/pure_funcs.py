@@ -508,10 +508,12 @@ def get_template_live_config(passivbot_mode="v7"):
                 "combine_ohlcvs": True,
                 "compress_cache": True,
                 "end_date": "now",
+                "equity_resolution_minutes": 60,
                 "exchanges": ["binance", "bybit", "gateio", "bitget"],
                 "gap_tolerance_ohlcvs_minutes": 120.0,
                 "start_date": "2021-04-01",
                 "starting_balance": 100000.0,
+                "stream_hlcvs": False,
                 "use_btc_collateral": False,
             },
             "bot": {
@@ -665,6 +667,7 @@ def get_template_live_config(passivbot_mode="v7"):
                 "mutation_probability": 0.45,
                 "n_cpus": 5,
                 "population_size": 1000,
+                "results_format": "msgpack",
                 "round_to_n_significant_digits": 5,
                 "scoring": ["adg", "sharpe_ratio"],
                 "write_all_results": True,
@@ -0,0 +1,259 @@
+from __future__ import annotations
+import os
+import json
+import logging
+from typing import Any, Iterable, Iterator, Sequence
+
+import numpy as np
+
+META_FILENAME = "meta.json"
+FORMAT_VERSION = 1
+
+
+def flatten_record(record: dict, prefix: tuple = ()) -> Iterator[tuple[tuple, Any]]:
+    """Yield (key path, leaf value) for every leaf of a nested dict."""
+    for k, v in record.items():
+        if isinstance(v, dict) and v:
+            yield from flatten_record(v, prefix + (k,))
+        else:
+            yield prefix + (k,), v
+
+
+def is_numeric(x) -> bool:
+    return x is None or isinstance(x, (bool, int, float, np.number, np.bool_))
+
+
+def value_kind(x) -> str:
+    if isinstance(x, (bool, np.bool_)):
+        return "bool"
+    if isinstance(x, (int, np.integer)):
+        return "int"
+    return "float"
+
+
+def get_path(record: dict, path: Sequence[str]):
+    for k in path:
+        record = record[k]
+    return record
+
+
+def set_path(record: dict, path: Sequence[str], value) -> None:
+    for k in path[:-1]:
+        record = record.setdefault(k, {})
+    record[path[-1]] = value
+
+
+class ResultsStore:
+    """
+    Columnar store for optimizer results, an alternative to `all_results.bin`.
+
+    Every numeric leaf of a result (bot parameters, analyses, ...) becomes a float64
+    column named by its dotted key path, e.g. `bot.long.ema_span_0` or
+    `analyses_combined.adg_mean`. Non-numeric leaves (coin lists, bounds, scoring keys)
+    are assumed constant within a run and stored once in `meta.json`.
+
+    Rows are written in chunks, one `chunk_NNNNNN.npy` per chunk, in column-major order
+    so each column is contiguous on disk. Chunks are memory-mapped on read, giving
+    random access to any row and vectorized filtering on whole columns. None is stored
+    as NaN and restored as None for columns that contained None.
+
+    Usage:
+        store = ResultsStore(path)
+        mask = store.column("analyses_combined.adg_mean") > 0.001
+        configs = [store.get(i) for i in np.flatnonzero(mask)]
+    """
+
+    def __init__(self, path: str, chunk_size: int = 10000):
+        self.path = path
+        self.chunk_size = chunk_size
+        self._paths = None
+        self._kinds = None
+        self._nullable = None
+        self._static = None
+        self._chunk_rows = []
+        self._buffer = []
+        self._chunks = {}
+        if os.path.exists(os.path.join(self.path, META_FILENAME)):
+            self._load_meta()
+
+    # --- writing ------------------------------------------------------------
+
+    def append(self, record: dict) -> None:
+        if self._paths is None:
+            self._init_schema(record)
+        row = np.empty(len(self._paths), dtype=np.float64)
+        for i, path in enumerate(self._paths):
+            val = get_path(record, path)
+            if val is None:
+                row[i] = np.nan
+                self._nullable[i] = True
+            else:
+                row[i] = val
+        self._buffer.append(row)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, records: Iterable[dict]) -> None:
+        for record in records:
+            self.append(record)
+
+    def flush(self) -> None:
+        """Write buffered rows as a new chunk and update the metadata."""
+        if not self._buffer:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        chunk = np.asfortranarray(np.vstack(self._buffer))
+        np.save(self._chunk_filename(len(self._chunk_rows)), chunk)
+        self._chunk_rows.append(len(chunk))
+        self._buffer = []
+        self._write_meta()
+
+    def close(self) -> None:
+        self.flush()
+
+    def _init_schema(self, record: dict) -> None:
+        self._paths, self._kinds, self._static = [], [], {}
+        for path, val in flatten_record(record):
+            if is_numeric(val):
+                self._paths.append(path)
+                self._kinds.append(value_kind(val))
+            else:
+                set_path(self._static, path, val)
+        self._nullable = [False] * len(self._paths)
+
+    def _write_meta(self) -> None:
+        meta = {
+            "version": FORMAT_VERSION,
+            "columns": [list(p) for p in self._paths],
+            "kinds": self._kinds,
+            "nullable": self._nullable,
+            "static": self._static,
+            "chunk_rows": self._chunk_rows,
+        }
+        tmp = os.path.join(self.path, META_FILENAME + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(self.path, META_FILENAME))
+
+    def _load_meta(self) -> None:
+        with open(os.path.join(self.path, META_FILENAME)) as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported results store version {meta.get('version')}")
+        self._paths = [tuple(p) for p in meta["columns"]]
+        self._kinds = meta["kinds"]
+        self._nullable = meta["nullable"]
+        self._static = meta["static"]
+        self._chunk_rows = meta["chunk_rows"]
+
+    def _chunk_filename(self, idx: int) -> str:
+        return os.path.join(self.path, f"chunk_{idx:06d}.npy")
+
+    # --- reading ------------------------------------------------------------
+
+    @property
+    def columns(self) -> list[str]:
+        return [".".join(p) for p in self._paths or []]
+
+    def __len__(self) -> int:
+        return sum(self._chunk_rows) + len(self._buffer)
+
+    def _chunk(self, idx: int) -> np.ndarray:
+        if idx not in self._chunks:
+            self._chunks[idx] = np.load(self._chunk_filename(idx), mmap_mode="r")
+        return self._chunks[idx]
+
+    def _column_index(self, name: str) -> int:
+        try:
+            return self.columns.index(name)
+        except ValueError:
+            raise KeyError(f"unknown column {name}") from None
+
+    def column(self, name: str) -> np.ndarray:
+        """All values of one column as a float64 array (None is NaN)."""
+        ci = self._column_index(name)
+        parts = [self._chunk(i)[:, ci] for i in range(len(self._chunk_rows))]
+        if self._buffer:
+            parts.append(np.array([row[ci] for row in self._buffer]))
+        return np.concatenate(parts) if parts else np.empty(0)
+
+    def row(self, idx: int) -> np.ndarray:
+        """Raw float64 values of one row, in `columns` order."""
+        n = len(self)
+        if idx < 0:
+            idx += n
+        if not 0 <= idx < n:
+            raise IndexError(f"row {idx} out of range for {n} rows")
+        offsets = np.cumsum(self._chunk_rows)
+        chunk_idx = int(np.searchsorted(offsets, idx, side="right"))
+        if chunk_idx == len(self._chunk_rows):
+            return self._buffer[idx - (int(offsets[-1]) if len(offsets) else 0)]
+        start = int(offsets[chunk_idx - 1]) if chunk_idx > 0 else 0
+        return np.asarray(self._chunk(chunk_idx)[idx - start])
+
+    def get(self, idx: int) -> dict:
+        """Rebuild the full nested result dict of one row."""
+        record = json.loads(json.dumps(self._static))
+        for path, kind, nullable, val in zip(
+            self._paths, self._kinds, self._nullable, self.row(idx)
+        ):
+            if nullable and np.isnan(val):
+                set_path(record, path, None)
+            elif kind == "int":
+                set_path(record, path, int(val))
+            elif kind == "bool":
+                set_path(record, path, bool(val))
+            else:
+                set_path(record, path, float(val))
+        return record
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self)):
+            yield self.get(i)
+
+
+def convert_bin_to_columnar(bin_path: str, out_path: str, chunk_size: int = 10000) -> int:
+    """Convert an `all_results.bin` msgpack diff stream into a ResultsStore."""
+    from opt_utils import load_results
+
+    store = ResultsStore(out_path, chunk_size=chunk_size)
+    if len(store):
+        raise ValueError(f"{out_path} already contains results")
+    n = 0
+    for record in load_results(bin_path):
+        store.append(record)
+        n += 1
+        if n % 100000 == 0:
+            logging.info(f"converted {n} results...")
+    store.close()
+    return n
+
+
+def main():
+    import argparse
+
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%dT%H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(
+        description="Convert optimizer all_results.bin into a columnar results store"
+    )
+    parser.add_argument("bin_path", type=str, help="Path to all_results.bin")
+    parser.add_argument(
+        "out_path",
+        type=str,
+        nargs="?",
+        default=None,
+        help="Output directory. Default: all_results/ next to the input file",
+    )
+    parser.add_argument("--chunk_size", type=int, default=10000, help="Rows per chunk file")
+    args = parser.parse_args()
+    out_path = args.out_path or os.path.join(os.path.dirname(args.bin_path), "all_results")
+    n = convert_bin_to_columnar(args.bin_path, out_path, args.chunk_size)
+    logging.info(f"Wrote {n} results to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import sys
+import os
+from time import perf_counter
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from downloader import deduplicate_rows, deduplicate_rows_py
+
+
+def make_candles(n_days, dup_frac, seed=0):
+    """Sorted 1m candles with a fraction of rows repeated right after themselves."""
+    rng = np.random.default_rng(seed)
+    n = n_days * 1440
+    ts = 1.7e12 + np.arange(n) * 60000.0
+    arr = np.column_stack([ts, rng.random((n, 5))])
+    if dup_frac > 0.0:
+        dup_idxs = np.sort(rng.choice(n, int(n * dup_frac), replace=False))
+        arr = np.insert(arr, dup_idxs + 1, arr[dup_idxs], axis=0)
+    return arr
+
+
+def bench(func, arr, n_repeats):
+    times = []
+    for _ in range(n_repeats):
+        start = perf_counter()
+        res = func(arr)
+        times.append(perf_counter() - start)
+    return min(times), res
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="benchmark_deduplicate_rows",
+        description="benchmark downloader.deduplicate_rows against the pure Python version",
+    )
+    parser.add_argument("--n_days", type=int, default=30, help="Days of 1m candles. Default=30")
+    parser.add_argument("--n_repeats", type=int, default=3, help="Repeats per case. Default=3")
+    args = parser.parse_args()
+
+    for label, dup_frac in [("no duplicates", 0.0), ("1% duplicates", 0.01)]:
+        arr = make_candles(args.n_days, dup_frac)
+        t_py, res_py = bench(deduplicate_rows_py, arr, args.n_repeats)
+        t_np, res_np = bench(deduplicate_rows, arr, args.n_repeats)
+        assert np.array_equal(res_py, res_np), "results differ"
+        print(
+            f"{label:>14}: {len(arr):>9} rows -> {len(res_np):>9} | "
+            f"python {t_py * 1000:9.2f} ms | numpy {t_np * 1000:8.2f} ms | "
+            f"speedup {t_py / t_np:7.1f}x"
+        )
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+from ohlcv_store import OHLCVStore
+
+
+def make_day(day_ts, n=3):
+    ts = day_ts + np.arange(n) * 60000.0
+    return np.column_stack([ts, np.ones((n, 5))])
+
+
+def test_read_range_accepts_datetime_strings(tmp_path):
+    store = OHLCVStore(str(tmp_path))
+    day0 = 1617235200000.0  # 2021-04-01
+    store.write_days({"2021-04-01": make_day(day0), "2021-04-02": make_day(day0 + 86400000)})
+    expected = store.read_range("2021-04-01", "2021-04-02")
+    assert len(expected) == 6
+    assert np.array_equal(store.read_range("2021-04-01T00:00:00", "2021-04-02"), expected)
+    assert np.array_equal(store.read_range("2021-04-01T12:34:00", "2021-04-02T00:00:00"), expected)
+    assert len(store.read_range("2021-04-02T00:00:00", "2021-04-02")) == 3
+
+
+def _write_days_worker(dirpath, days, day_ts0):
+    store = OHLCVStore(dirpath)  # index loaded before the other writers append
+    for i, day in enumerate(days):
+        store.write_day(day, make_day(day_ts0 + i * 86400000, n=100))
+
+
+def test_concurrent_writers(tmp_path):
+    import multiprocessing
+
+    day0 = 1617235200000.0
+    all_days = [f"2021-04-{d:02d}" for d in range(1, 29)]
+    chunks = [all_days[i::4] for i in range(4)]
+    ctx = multiprocessing.get_context("fork")
+    procs = [
+        ctx.Process(
+            target=_write_days_worker,
+            args=(str(tmp_path), chunk, day0 + all_days.index(chunk[0]) * 86400000),
+        )
+        for chunk in chunks
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+    store = OHLCVStore(str(tmp_path))
+    assert store.days == all_days
+    for chunk in chunks:
+        ts0 = day0 + all_days.index(chunk[0]) * 86400000
+        for i, day in enumerate(chunk):
+            assert np.array_equal(store.read_days([day]), make_day(ts0 + i * 86400000, n=100))